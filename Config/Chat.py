@@ -37,4 +37,13 @@ else:
 
 CONFIG["IGNORE_PHRASES"] = [clean_phrase(p) for p in CONFIG["IGNORE_PHRASES"]]
 
+# The detail levels of HB3/Perception/lib/get_image.py
+VISION_IMAGE_DETAILS = ("low", "medium", "high")
+if CONFIG["VISION_IMAGE_DETAIL"] not in VISION_IMAGE_DETAILS:
+    log.warning(
+        f"Unknown VISION_IMAGE_DETAIL {CONFIG['VISION_IMAGE_DETAIL']!r}, expected one of "
+        f"{VISION_IMAGE_DETAILS}. Using \"high\"."
+    )
+    CONFIG["VISION_IMAGE_DETAIL"] = "high"
+
 CONFIG["INTERACTION_HIDDEN_SYS_MSG"] = CONFIG["INTERACTION_HIDDEN_SYS_MSG"]
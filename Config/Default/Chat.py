@@ -66,6 +66,22 @@ BACKEND_SPECIALIZED_PRONUNCIATIONS: dict[str, SpecializedPronunciation] = {
 
 DISABLE_ASR_WHILE_SPEAKING: bool = False
 
+# Start the LLM's response as soon as speech is heard, before the final speech recognition
+# result, and keep it if the result matches the text heard this closely (0 to 1)
+SPECULATIVE_RESPONSES: bool = False
+SPECULATIVE_MIN_SIMILARITY: float = 0.9
+
+# Reply to speech from a cache of the LLM's replies to similar speech (0 to 1), for up to
+# RESPONSE_CACHE_TTL_S seconds after the reply was made
+RESPONSE_CACHE: bool = False
+RESPONSE_CACHE_MIN_SIMILARITY: float = 0.92
+RESPONSE_CACHE_TTL_S: float = 3600
+RESPONSE_CACHE_MAX_SIZE: int = 256
+
+# Detail level of camera images sent to vision models: "low" (512 px), "medium" (1024 px)
+# or "high" (full resolution)
+VISION_IMAGE_DETAIL: str = "high"
+
 ENABLE_TIMED_INTERACTION_REFRESH: bool = False
 INTERACTION_REFRESH_INACTIVITY_THRESHOLD = 5  # In minutes.
 
@@ -80,6 +96,9 @@ IGNORE_PHRASES = {
 }
 
 SERVICE_PROXY_LLM_URL_OVERRIDE: Optional[str] = None
+# Tell the service proxy to stop LLM requests whose responses are no longer wanted. Only
+# enable this if the service proxy accepts {"type": "cancel", "item_id": ...} messages.
+SERVICE_PROXY_LLM_SEND_CANCELLATIONS: bool = False
 
 INTERACTION_HIDDEN_SYS_MSG = """
 Say 'Doctor' instead of 'Dr.'
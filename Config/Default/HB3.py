@@ -39,6 +39,9 @@ NEUTRAL_FACE_POSE: str = "EXP_neutral"
 # Face recognition address. Set to None to disable face recognition
 FACE_REC_SERVER_ADDRESS: Optional[str] = None
 PROFILES_SERVER_ADDRESS: Optional[str] = None
+# Send crops of tracked faces to the face recognition and profiles servers to identify them.
+# This sends camera images off the robot, so is off unless enabled here.
+FACE_CROP_UPLOADS: bool = False
 
 # Flappy mouth lipsync is where the robot automatically moves it's mouth based on the volume of
 # some audio output streams (such as Telepresence audio). Sometimes depending on the microphone and
@@ -51,3 +54,8 @@ FLAPPY_GAIN: float = 30
 # The robot will automatically move it's arms in reaction to audio similarly to the flappy mouth.
 # This offers an effect of the robot gesturing automatically as a Telepresence operator speaks.
 ARM_MOVE_GAIN: float = FLAPPY_GAIN / 3
+
+# Profile the tick and message handlers of the HB3 scripts. Results are reported through
+# probes and dumped as JSON to /var/opt/tritium/profiles/hb3_profile.json.
+# Profiling can also be toggled at runtime with {"enabled": bool} on the "hb3_profiler" channel.
+PROFILER_ENABLED: bool = False
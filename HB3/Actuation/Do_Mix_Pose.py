@@ -5,6 +5,7 @@ from collections import namedtuple
 from ea.util.number import lerp, clamp
 
 CONFIG = system.import_library("../../Config/HB3.py").CONFIG
+profiler = system.import_library("../lib/profiler.py")
 
 # N.B. HB3 MUST CONTROL EVERYTHING ON THE ROBOT CONSTANTLY
 # This is so that after a sequence we reset any leftover positions.
@@ -321,6 +322,7 @@ class Activity:
         return clamp(value, min, max)
 
     @system.tick(fps=60)
+    @profiler.profiled_tick(__file__, fps=60)
     def on_tick(self):
         values = self.hub.get_values()
 
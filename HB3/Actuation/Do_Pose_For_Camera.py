@@ -1,6 +1,7 @@
 from time import monotonic
 
 HB3_CONFIG = system.import_library("../../Config/HB3.py").CONFIG
+profiler = system.import_library("../lib/profiler.py")
 contributor = system.import_library("../lib/contributor.py")
 robot_state = system.import_library("../robot_state.py").state
 
@@ -83,6 +84,7 @@ class Activity:
         else:
             self.stop_camera_tracking()
 
+    @profiler.profiled_messages(__file__)
     def on_message(self, channel, message):
         if self.consumer:
             self.consumer.on_message(channel, message)
@@ -108,6 +110,7 @@ class Activity:
             mix_pose.clear_filters(SELF_IDENTIFIER)
 
     @system.tick(fps=10)
+    @profiler.profiled_tick(__file__, fps=10)
     def on_tick(self):
         track_time_elapsed = (
             monotonic() - self.tracking_started_at
@@ -3,6 +3,7 @@ from typing import List, Optional
 from collections import deque
 
 CONFIG = system.import_library("../../Config/Static.py")
+profiler = system.import_library("../lib/profiler.py")
 MAX_QUEUED_SEQUENCES = 20
 
 
@@ -12,6 +13,7 @@ class Activity:
     def on_start(self):
         self.buffer: deque = deque(maxlen=MAX_QUEUED_SEQUENCES)
 
+    @profiler.profiled_messages(__file__)
     def on_message(self, channel: str, message: str):
         if channel == "play_sequence":
             self.buffer.append(message)
@@ -57,6 +59,7 @@ class Activity:
         )
 
     @system.tick(fps=5)
+    @profiler.profiled_tick(__file__, fps=5)
     def on_tick(self):
         if not self.buffer:
             return
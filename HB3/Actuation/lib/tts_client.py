@@ -21,6 +21,8 @@ INTERACTION_HISTORY = system.import_library(
     "../../chat/knowledge/interaction_history.py"
 )
 TYPES = system.import_library("../../lib/types.py")
+latency_tracer = system.import_library("../../lib/latency_tracer.py")
+TRACER = latency_tracer.TRACER
 
 
 @dataclass
@@ -126,18 +128,23 @@ class TextToSpeechNodeClient(StateEngineClientMixin, Client):
         else:
             log.warning(f"Unexpected tts event message format. Got {msg}")
 
-    def on_tts_item_play_started(self, tts_item_id, msg):
-        audio_start_time = msg.get("audio_start_time", unix_time())
-
-        event = None
+    @staticmethod
+    def _find_event(tts_item_id) -> Optional[INTERACTION_HISTORY.TTSEvent]:
         for client_item in TextToSpeechNodeClient.tts_by_activity.values():
             if client_item.tts_item_id == tts_item_id:
-                event = client_item.event
-                break
+                return client_item.event
+        return None
 
+    def on_tts_item_play_started(self, tts_item_id, msg):
+        audio_start_time = msg.get("audio_start_time", unix_time())
+        event = self._find_event(tts_item_id)
         self.on_item_playback_started_callback(tts_item_id, event, audio_start_time)
 
     def on_tts_item_synthesis_complete(self, tts_item_id, msg):
+        if TRACER.enabled and (event := self._find_event(tts_item_id)):
+            TRACER.mark(
+                event.speech_item.parent_item_id, latency_tracer.TTS_FIRST_CHUNK
+            )
         duration = float(msg["duration"])
         if duration == 0:
             self.on_tts_item_play_finished(tts_item_id, {})
@@ -89,6 +89,7 @@ class Activity:
     def on_stop(self):
         system.messaging.post("tts_stop", False)
         default_voice_reset_evt.emit(__file__)
+        VOICE_ID_UTIL.flush_save()
         for script_path in SCRIPTS:
             UTILS.stop_other_script(system, script_path)
         self.mode_name = None
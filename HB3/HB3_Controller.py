@@ -1,5 +1,8 @@
+import asyncio
+
 CONFIG = system.import_library("../Config/HB3.py").CONFIG
 UTILS = system.import_library("./utils.py")
+profiler = system.import_library("./lib/profiler.py")
 
 
 if CONFIG["ROBOT_TYPE"] in [
@@ -55,7 +58,11 @@ default_voice_reset_evt = system.event("default_voice_reset")
 
 
 class Activity:
+    profiler_task = None
+
     async def on_start(self):
+        profiler.PROFILER.enable(CONFIG["PROFILER_ENABLED"])
+        self.profiler_task = asyncio.create_task(profiler.PROFILER.monitor(probe))
         await llm_interface.start()
         for script_path in SCRIPTS:
             UTILS.start_other_script(system, script_path)
@@ -65,6 +72,17 @@ class Activity:
         for script_path in reversed(SCRIPTS):
             UTILS.stop_other_script(system, script_path)
         llm_interface.stop()
+        if self.profiler_task:
+            self.profiler_task.cancel()
+        if profiler.PROFILER.enabled:
+            profiler.PROFILER.dump()
+
+    def on_message(self, channel, message):
+        if channel == "hb3_profiler" and isinstance(message, dict):
+            if "enabled" in message:
+                profiler.PROFILER.enable(message["enabled"])
+            if message.get("dump"):
+                profiler.PROFILER.dump()
 
 
 def _resolve_path(path, my_path):
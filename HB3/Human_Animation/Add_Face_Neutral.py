@@ -3,6 +3,7 @@ import random
 from ea.animation.poses import Pose
 
 contributor = system.import_library("../lib/contributor.py")
+profiler = system.import_library("../lib/profiler.py")
 
 SELF_IDENTIFIER = "ADD_FACE_NEUTRAL"
 
@@ -148,6 +149,7 @@ class Activity:
                 SELF_IDENTIFIER, ctrl, value + random.random() * 0.01
             )
 
+    @profiler.profiled_messages(__file__)
     def on_message(self, channel, message):
         if self.consumer:
             self.consumer.on_message(channel, message)
@@ -155,6 +157,7 @@ class Activity:
     _last_active = 0
 
     @system.tick(fps=15)  # All *STABILITY settings will be affected by this rate
+    @profiler.profiled_tick(__file__, fps=15)
     def on_tick(self):
         c = self.consumer.object()
         # avoid glances causing expression resets
@@ -1,10 +1,17 @@
-from math import pow, sqrt
+from math import pow, hypot
 from time import monotonic as now
+from dataclasses import dataclass
 
 from ea.util.number import lerp, clamp, remap, remap_keyframes
 from ea.animation.poses import Pose
 
 custom_types = system.import_library("../lib/types.py")
+profiler = system.import_library("../lib/profiler.py")
+perception_state = system.import_library(
+    "../Perception/perception_state.py"
+).perception_state
+spatial_index = system.import_library("../Perception/lib/spatial_index.py")
+Scene = system.import_library("../Perception/lib/perception_scheduler.py").Scene
 
 """
 A script adding proximity recoil to recognised faces.
@@ -25,22 +32,73 @@ RECOIL_EXPRESSION = Pose(
     },
 )
 NEUTRAL_FACE_POSE = CONFIG["NEUTRAL_FACE_POSE"]
+# How long a close face which is no longer tracked keeps the recoil going
 TIMEOUT: int = 3
+# The smoothing amounts below are per tick at this rate
+BASE_FPS = 20
+# Target tick rates by scene. Ticks run at BASE_FPS and skip down to these.
+TICK_RATES = {Scene.EMPTY: 2, Scene.PRESENT: BASE_FPS, Scene.SPEAKING: BASE_FPS}
+
+# A face closer than this (where the expression starts to change) triggers the recoil,
+# which then holds until it is further than the release radius
+TRIGGER_RADIUS_M = 0.8
+RELEASE_RADIUS_M = 0.9
+# Face positions are predicted from their velocity up to this far past the last update
+MAX_PREDICTION_S = 0.5
+# Faces further away than this cannot reach the release radius within the prediction
+MAX_APPROACH_SPEED_M_S = 2.0
+NEAR_ZONE_M = RELEASE_RADIUS_M + MAX_APPROACH_SPEED_M_S * MAX_PREDICTION_S
+# Below this the recoil has relaxed, and ticks do nothing until a face comes close
+SETTLED_RECOIL = 0.01
+
+
+def smoothing(amount: float, dt: float) -> float:
+    """The lerp amount giving the same smoothing over dt as amount does each BASE_FPS tick."""
+    return 1 - pow(1 - amount, dt * BASE_FPS)
+
+
+@dataclass
+class NearCandidate:
+    """A published face in the near zone, with its horizontal velocity."""
+
+    identifier: int
+    x: float
+    y: float
+    vx: float = 0
+    vy: float = 0
+
+
+def predicted_distance(face: NearCandidate, horizon_s: float) -> float:
+    """Horizontal distance of a face from the robot, predicted horizon_s past its last update."""
+    return hypot(face.x + face.vx * horizon_s, face.y + face.vy * horizon_s)
+
+
+@dataclass
+class NearTrack:
+    """A face inside the trigger radius."""
+
+    distance: float
+    last_seen: float
 
 
 class Activity:
     threshold_curve = [(0, -40), (0.3, -30), (0.7, 0), (0.8, 0)]
 
-    face_visible: bool = False
-
     distance_from_origin: float = float("inf")
     last: float = 0
     recoil_shadow: float = 0
-    time_last_visible: float = 0
-
-    current_face: custom_types.DetectedFace3D | None = None
+    settled: bool = False
 
     async def on_start(self):
+        self.stage = perception_state.scheduler.stage("proximity_recoil", TICK_RATES)
+        self.last = now()
+        # Published faces in the near zone, as of the last face update
+        self.candidates: list[NearCandidate] = []
+        self.candidates_time = self.last
+        # Face id -> the face as last published, to estimate velocities from
+        self.last_faces: dict[int, custom_types.DetectedFace3D] = {}
+        # Face id -> tracks which have triggered the recoil
+        self.near_tracks: dict[int, NearTrack] = {}
         # Get faces from world
         async with system.world.query_features(name="faces") as sub:
             async for s in sub.async_iter():
@@ -48,44 +106,87 @@ class Activity:
                     self.on_face_recognise(s)
 
     def on_face_recognise(self, faces: list[custom_types.DetectedFace3D]):
-        # Look at faces and set closest face to active face
-        for face in faces:
-            if face is not None:
-                if (
-                    self.current_face is None
-                    or face.position.x < self.current_face.position.x
-                ):
-                    self.current_face = face
-
-        # If face visible
-        if self.current_face is not None:
-            self.face_visible = True
-
-            # Find distance using x and y values
-            self.distance_from_origin = sqrt(
-                pow(self.current_face.position.x, 2)
-                + pow(self.current_face.position.y, 2)
-            )
-
-            # Update time a face was last visible
-            self.time_last_visible = now()
-
-            # Clear current face
-            self.current_face = None
-        else:
-            self.face_visible = False
+        # Only mature faces are published
+        faces = [face for face in faces if face is not None]
+        index = spatial_index.SpatialIndex(faces)
+        self.candidates = [
+            self._candidate(face) for face in index.within_range(NEAR_ZONE_M)
+        ]
+        self.candidates_time = now()
+        self.last_faces = {face.identifier: face for face in faces}
+        # Tracks which are still published but have left the near zone are released.
+        # Those which are no longer published are held until they time out.
+        candidate_ids = {face.identifier for face in self.candidates}
+        for face_id in list(self.near_tracks):
+            if face_id not in candidate_ids and face_id in self.last_faces:
+                del self.near_tracks[face_id]
+
+    def _candidate(self, face: custom_types.DetectedFace3D) -> NearCandidate:
+        x, y = face.position[0], face.position[1]
+        previous = self.last_faces.get(face.identifier)
+        if previous is None or face.time_ns <= previous.time_ns:
+            return NearCandidate(face.identifier, x, y)
+        dt = (face.time_ns - previous.time_ns) / 1e9
+        return NearCandidate(
+            face.identifier,
+            x,
+            y,
+            (x - previous.position[0]) / dt,
+            (y - previous.position[1]) / dt,
+        )
+
+    def _update_near_tracks(self, t: float):
+        horizon = min(t - self.candidates_time, MAX_PREDICTION_S)
+        for face in self.candidates:
+            distance = predicted_distance(face, horizon)
+            track = self.near_tracks.get(face.identifier)
+            if track is not None:
+                if distance > RELEASE_RADIUS_M:
+                    del self.near_tracks[face.identifier]
+                else:
+                    track.distance = distance
+                    track.last_seen = t
+            elif distance < TRIGGER_RADIUS_M:
+                self.near_tracks[face.identifier] = NearTrack(distance, t)
+
+        for face_id, track in list(self.near_tracks.items()):
+            if t - track.last_seen > TIMEOUT:
+                del self.near_tracks[face_id]
 
     def on_stop(self):
         if hasattr(system.unstable.owner, "mix_pose"):
             system.unstable.owner.mix_pose.clean(SELF_IDENTIFIER)
 
-    @system.tick(fps=20)
+    @system.tick(fps=BASE_FPS)
+    @profiler.profiled_tick(__file__, fps=BASE_FPS)
     def on_tick(self):
-        # If no face has been visible for over timeout
-        if self.face_visible is False and (now() - self.time_last_visible) > TIMEOUT:
+        if not self.stage.due():
+            return
+        with self.stage.measure():
+            self._update()
+
+    def _update(self):
+        t = now()
+        # Don't jump after a stall
+        dt, self.last = min(t - self.last, 1 / self.stage.min_rate), t
+        if self.candidates or self.near_tracks:
+            self._update_near_tracks(t)
+
+        if not self.near_tracks:
+            self.distance_from_origin = float("inf")
+            if self.settled:
+                return
+            if abs(self.recoil_shadow) < SETTLED_RECOIL:
+                # Nobody is close. Stop contributing until somebody is.
+                self.recoil_shadow = 0
+                self.settled = True
+                if getattr(system.unstable.owner, "mix_pose", None) is not None:
+                    system.unstable.owner.mix_pose.clean(SELF_IDENTIFIER)
+                self.show_debug()
+                return
 
             # Interpolate between current position and 0
-            self.recoil_shadow = lerp(self.recoil_shadow, 0, 0.3)
+            self.recoil_shadow = lerp(self.recoil_shadow, 0, smoothing(0.3, dt))
 
             # Reset head position
             if getattr(system.unstable.owner, "mix_pose", None) is not None:
@@ -97,14 +198,19 @@ class Activity:
             self.show_debug()
             return
 
+        self.settled = False
+        self.distance_from_origin = min(
+            track.distance for track in self.near_tracks.values()
+        )
+
         # Remap distance to recoil curve
         recoil = remap_keyframes(self.distance_from_origin, self.threshold_curve)
 
         # Set forward movement to be smoother than backwards movement
         if recoil > self.recoil_shadow:
-            self.recoil_shadow = lerp(self.recoil_shadow, recoil, 0.1)
+            self.recoil_shadow = lerp(self.recoil_shadow, recoil, smoothing(0.1, dt))
         else:
-            self.recoil_shadow = lerp(self.recoil_shadow, recoil, 0.4)
+            self.recoil_shadow = lerp(self.recoil_shadow, recoil, smoothing(0.4, dt))
 
         if getattr(system.unstable.owner, "mix_pose", None) is not None:
             # Move "Neck Forwards" along recoil curve
@@ -137,8 +243,7 @@ class Activity:
         self.show_debug()
 
     def show_debug(self):
-        probe("face_visible", self.face_visible)
-        probe("timeFromLastSeen", now() - self.time_last_visible)
+        probe("near_tracks", len(self.near_tracks))
         probe("distance", self.distance_from_origin)
         probe("recoil_amount", self.recoil_shadow)
         probe("lean_threshold", self.threshold_curve[3][0])
@@ -5,6 +5,7 @@ Plays a thinking animation while preparing response
 import random
 
 STATIC_CONFIG = system.import_library("../../Config/Static.py").BASE_CONTENT_PATH
+profiler = system.import_library("../lib/profiler.py")
 CONFIG = system.import_library("../../Config/Chat.py").CONFIG
 robot_state = system.import_library("../robot_state.py").state
 
@@ -29,6 +30,7 @@ class Activity:
     def on_stop(self):
         self.stop_thinking()
 
+    @profiler.profiled_messages(__file__)
     def on_message(self, channel, message):
         if channel == "is_thinking":
             if message:
@@ -2,6 +2,7 @@ import random
 from time import monotonic
 
 CONFIG = system.import_library("../../Config/HB3.py").CONFIG
+profiler = system.import_library("../lib/profiler.py")
 
 FLAPPY_GAIN = CONFIG["FLAPPY_GAIN"]
 FLAPPY_SILENCE_THRESHOLD = CONFIG["FLAPPY_SILENCE_THRESHOLD"]
@@ -172,6 +173,7 @@ class Activity:
         return max_val, max_val_source
 
     @system.tick(fps=60)
+    @profiler.profiled_tick(__file__, fps=60)
     def on_tick(self):
         peak_level, peak_level_source = self.get_max_audio_source()
         probe("peak", peak_level)
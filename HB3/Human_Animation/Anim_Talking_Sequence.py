@@ -1,4 +1,5 @@
 import os
+import asyncio
 
 CONFIG = system.import_library("../../Config/HB3.py").CONFIG
 
@@ -13,6 +14,9 @@ IGNORE = []
 
 class Activity:
     playing_sequence = None
+    # The speech item being spoken, and the expression playing for it
+    saying = None
+    expression = None
 
     def on_start(self):
         self.exp_decider = EXPRESSION_DECIDER.TTSFaceExpression.from_animation_dir(
@@ -25,18 +29,38 @@ class Activity:
     async def on_message(self, channel, message):
         if channel == "tts_saying":
             # NOTE: Different to tts_say
-            selected_exp = await self.exp_decider.determine_tts_face_expression(
-                message.speech,
-                parent_item_id=message.item_id,
+            self.saying = message
+            # Don't wait for the LLM to start an expression, but let it correct an
+            # ambiguous one while the speech is still going
+            classification = self.exp_decider.classify(
+                message.speech, message.language_code
             )
-            if selected_exp and selected_exp not in IGNORE:
-                self.play_sequence(selected_exp)
-            else:
-                log.warning(f"Invalid expression `{selected_exp}` ignored")
+            self.play_expression(classification.expression)
+            if classification.ambiguous:
+                asyncio.create_task(self.refine_expression(message, classification))
 
         elif channel == "tts_idle":
+            self.saying = None
+            self.expression = None
             self.stop_all_talking_anims()
 
+    async def refine_expression(self, message, classification):
+        selected_exp = await self.exp_decider.determine_tts_face_expression(
+            message.speech,
+            parent_item_id=message.item_id,
+            language_code=message.language_code,
+            classification=classification,
+        )
+        if self.saying is message and selected_exp != self.expression:
+            self.play_expression(selected_exp)
+
+    def play_expression(self, selected_exp):
+        if selected_exp and selected_exp not in IGNORE:
+            self.expression = selected_exp
+            self.play_sequence(selected_exp)
+        else:
+            log.warning(f"Invalid expression `{selected_exp}` ignored")
+
     def stop_all_talking_anims(self):
         to_stop = []
         for anim in self.exp_decider.expressions:
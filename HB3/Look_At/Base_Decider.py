@@ -4,6 +4,7 @@ from random import uniform
 from typing import Dict, Callable, Iterable, Optional
 
 contributor = system.import_library("../lib/contributor.py")
+profiler = system.import_library("../lib/profiler.py")
 
 LOOKAT_CONFIG = system.import_library("../../Config/LookAt.py").CONFIG
 
@@ -23,12 +24,14 @@ class Activity:
             ],
         )
 
+    @profiler.profiled_messages(__file__)
     def on_message(self, t, d):
         if self.decider:
             self.decider.on_message(t, d)
 
 
 class TypeScorer(contributor.MapScorer):
+    STATIC = True
     _unknown_contributors = set()
 
     def score(self, consumer: contributor.Consumer, item, probe_fn: Optional[Callable]):
@@ -44,7 +47,7 @@ class TypeScorer(contributor.MapScorer):
         return score or 0
 
 
-class AngleScorer(contributor.MapScorer):
+class AngleScorer(contributor.ListScorer):
     """
     Reject items that are too far out of a sensible range.
     """
@@ -55,21 +58,10 @@ class AngleScorer(contributor.MapScorer):
     def score(
         self,
         consumer: contributor.Consumer,
-        item: contributor.LookAtItem,
+        items: Iterable[contributor.LookAtItem],
         probe_fn: Optional[Callable],
     ):
         now = monotonic()
-        v_global = self.convert(item, system.world.ROBOT_SPACE)
-        v_head = self.convert(item, "Head")
-        if v_global is None or v_head is None:
-            return 0
-        x, y, z = v_global.elements
-        # Account for the height of the robot's head
-        z = v_head.elements[2]
-        r = sqrt(x * x + y * y + z * z)
-
-        theta = asin(z / r)
-        phi = atan2(y, x)
 
         # remove targets off cooldown
         self.rejected_time_by_item = {
@@ -78,19 +70,37 @@ class AngleScorer(contributor.MapScorer):
             if now - time < self.rejection_cooldown
         }
 
-        # add target on cooldown if outside acceptable range
-        if (
-            abs(theta) > LOOKAT_CONFIG["ANGLE_MAX_THETA"]
-            or abs(phi) > LOOKAT_CONFIG["ANGLE_MAX_PHI"]
-        ):
-            self.rejected_time_by_item[item.identifier] = now
+        scores = []
+        v_globals = self.convert_many(items, system.world.ROBOT_SPACE)
+        v_heads = self.convert_many(items, "Head")
+        for item, v_global, v_head in zip(items, v_globals, v_heads):
+            if v_global is None or v_head is None:
+                scores.append(0)
+                continue
+            x, y, z = v_global.elements
+            # Account for the height of the robot's head
+            z = v_head.elements[2]
+            r = sqrt(x * x + y * y + z * z)
+
+            theta = asin(z / r)
+            phi = atan2(y, x)
+
+            # add target on cooldown if outside acceptable range
+            if (
+                abs(theta) > LOOKAT_CONFIG["ANGLE_MAX_THETA"]
+                or abs(phi) > LOOKAT_CONFIG["ANGLE_MAX_PHI"]
+            ):
+                self.rejected_time_by_item[item.identifier] = now
+
+            if self.rejected_time_by_item.get(item.identifier):
+                scores.append(LOOKAT_CONFIG["ANGLE_OVER_MAX_SCORE"])
+            else:
+                scores.append(LOOKAT_CONFIG["Priority"].NONE)
 
         if probe_fn:
             probe_fn("rejected targets", self.rejected_time_by_item)
 
-        if self.rejected_time_by_item.get(item.identifier):
-            return LOOKAT_CONFIG["ANGLE_OVER_MAX_SCORE"]
-        return LOOKAT_CONFIG["Priority"].NONE
+        return scores
 
 
 class BoredScorer(contributor.ListScorer):
@@ -1,4 +1,5 @@
 contributor = system.import_library("../../lib/contributor.py")
+profiler = system.import_library("../../lib/profiler.py")
 robot_state = system.import_library("../../robot_state.py").state
 
 
@@ -48,6 +49,7 @@ class Activity:
                 ]
             )
 
+    @profiler.profiled_messages(__file__)
     def on_message(self, channel, message):
         if self.contrib:
             self.contrib.on_message(channel, message)
\ No newline at end of file
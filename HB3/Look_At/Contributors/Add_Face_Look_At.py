@@ -1,10 +1,24 @@
+import asyncio
+
 from tritium.world.geom import Point3
 
 contributor = system.import_library("../../lib/contributor.py")
+profiler = system.import_library("../../lib/profiler.py")
+perception_state = system.import_library(
+    "../../Perception/perception_state.py"
+).perception_state
+perception_scheduler = system.import_library(
+    "../../Perception/lib/perception_scheduler.py"
+)
+Scene = perception_scheduler.Scene
+
+# Target rates at which faces are passed on to the look at consumer, by scene
+UPDATE_RATES = {Scene.EMPTY: 5, Scene.PRESENT: 15, Scene.SPEAKING: 20}
 
 
 class Activity:
     contributor = None
+    update_coroutine = None
 
     async def on_start(self):
         self.contributor = contributor.Contributor(
@@ -13,12 +27,27 @@ class Activity:
             reference_frame=system.world.ROBOT_SPACE,
         )
 
+        self.stage = perception_state.scheduler.stage("face_look_at", UPDATE_RATES)
+        self._latest = perception_scheduler.LatestQueue(self.stage)
+        self.update_coroutine = asyncio.create_task(self._update_latest())
+
         async with system.world.query_features(name="faces") as sub:
             async for s in sub.async_iter():
                 if s is not None:
-                    self.update_contributor(s)
+                    self._latest.put(s)
+
+    async def _update_latest(self):
+        while True:
+            faces = await self._latest.get_when_due()
+            try:
+                with self.stage.measure():
+                    self.update_contributor(faces)
+            except Exception:
+                log.exception("Unexpected error occurred updating face look at")
 
     def on_stop(self):
+        if self.update_coroutine:
+            self.update_coroutine.cancel()
         if self.contributor:  # async on_start so we check this
             self.contributor.clear()
 
@@ -54,6 +83,7 @@ class Activity:
                 ]
             )
 
+    @profiler.profiled_messages(__file__)
     def on_message(self, channel, message):
         if self.contributor:
             self.contributor.on_message(channel, message)
\ No newline at end of file
@@ -9,6 +9,7 @@ from tritium.world.geom import Point3
 stash = system.unstable.stash
 
 contributor = system.import_library("../../lib/contributor.py")
+profiler = system.import_library("../../lib/profiler.py")
 LOOKAT_CONFIG = system.import_library("../../../Config/LookAt.py").CONFIG
 
 ActiveSensor = system.import_library("../../robot_state/ActiveSensor.py").ActiveSensor
@@ -57,6 +58,7 @@ class Activity:
         z = next(Z_RANGE)
         return Point3([x, y, z])
 
+    @profiler.profiled_messages(__file__)
     def on_message(self, t, d):
         if self.consumer:
             self.consumer.on_message(t, d)
@@ -64,6 +66,7 @@ class Activity:
             self.contributor.on_message(t, d)
 
     @system.tick(fps=6)
+    @profiler.profiled_tick(__file__, fps=6)
     async def on_tick(self):
         c = self.consumer.object()
         if c is None:
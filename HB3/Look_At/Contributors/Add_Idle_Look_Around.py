@@ -7,6 +7,7 @@ from ea.util.random import random_generator
 from tritium.world.geom import Point3
 
 contributor = system.import_library("../../lib/contributor.py")
+profiler = system.import_library("../../lib/profiler.py")
 
 LOOKAT_CONFIG = system.import_library("../../../Config/LookAt.py").CONFIG
 
@@ -75,11 +76,13 @@ class Activity:
 
         return Point3([x, y, z])
 
+    @profiler.profiled_messages(__file__)
     def on_message(self, t, d):
         if self.contributor:
             self.contributor.on_message(t, d)
 
     @system.tick(fps=5)
+    @profiler.profiled_tick(__file__, fps=5)
     async def on_tick(self):
         t = monotonic()
         if t > self.next_item_time:
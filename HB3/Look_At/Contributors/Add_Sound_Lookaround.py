@@ -6,6 +6,7 @@ from itertools import count
 from tritium.world.geom import Point3
 
 LOOKAT_CONFIG = system.import_library("../../../Config/LookAt.py").CONFIG
+profiler = system.import_library("../../lib/profiler.py")
 
 VAD = system.import_library("../../Perception/VAD_subscription.py").VAD
 
@@ -41,6 +42,7 @@ class Activity:
                 self.look_at()
         self.vad = data["detected"]
 
+    @profiler.profiled_messages(__file__)
     def on_message(self, t, d):
         if self.contributor:
             self.contributor.on_message(t, d)
@@ -73,6 +75,7 @@ class Activity:
             )
 
     @system.tick(fps=1)
+    @profiler.profiled_tick(__file__, fps=1)
     def on_tick(self):
         probe("sound_history", self.sound_history)
 
@@ -3,6 +3,7 @@ from time import time_ns as time_unix_ns
 from tritium.world.geom import Rect, Point2
 
 contributor = system.import_library("../../lib/contributor.py")
+profiler = system.import_library("../../lib/profiler.py")
 
 ActiveSensor = system.import_library("../../robot_state/ActiveSensor.py").ActiveSensor
 
@@ -36,6 +37,7 @@ class Activity:
             distance=10,
         )
 
+    @profiler.profiled_messages(__file__)
     def on_message(self, channel, message):
         if self.contributor:
             self.contributor.on_message(channel, message)
@@ -7,6 +7,7 @@ from ea.util.number import clamp, step_towards
 from ea.util.random import random_generator
 
 contributor = system.import_library("../lib/contributor.py")
+profiler = system.import_library("../lib/profiler.py")
 
 eye_yaw_left = system.control("Eye Yaw Left", "Mesmer Eyes 1", acquire=["min", "max"])
 eye_yaw_right = system.control("Eye Yaw Right", "Mesmer Eyes 1", acquire=["min", "max"])
@@ -80,6 +81,7 @@ class Activity:
             self.last_changed_saccade = t
             self.next_saccade_interval = next(SACCADE_INTERVAL)
 
+    @profiler.profiled_messages(__file__)
     def on_message(self, t, d):
         if self.looks:
             self.looks.on_message(t, d)
@@ -98,6 +100,7 @@ class Activity:
     _num = 0
 
     @system.tick(fps=40)
+    @profiler.profiled_tick(__file__, fps=40)
     def on_tick(self):
         # Run updates at a lower rate but in sync with look-at tick
         # We slew the positions and perform the geometry at the higher rate
@@ -11,6 +11,7 @@ from ea.util.number import clamp
 from tritium.world.geom import Point3
 
 contributor = system.import_library("../lib/contributor.py")
+profiler = system.import_library("../lib/profiler.py")
 """
 Given a look at target. Have the head look at it.
 """
@@ -80,6 +81,7 @@ class Activity:
         self.consumer = contributor.ConsumerRef("look")
         self.look_at_target = Point3([0.5, 0, 1.5])
 
+    @profiler.profiled_messages(__file__)
     def on_message(self, channel, message):
         if self.consumer:
             self.consumer.on_message(channel, message)
@@ -134,6 +136,7 @@ class Activity:
             probe("dmd_pitch", dmd_pitch)
 
     @system.tick(fps=20)
+    @profiler.profiled_tick(__file__, fps=20)
     def on_tick(self):
         target, changed, consumer = self.consumer.get_private_target(tag="neck")
 
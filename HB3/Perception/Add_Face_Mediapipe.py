@@ -1,6 +1,7 @@
 from tritium.world.geom import Rect, Vector2
 
 custom_types = system.import_library("../lib/types.py")
+mediapipe_decoding = system.import_library("./lib/mediapipe_decoding.py")
 
 ActiveSensor = system.import_library("../robot_state/ActiveSensor.py").ActiveSensor
 
@@ -15,7 +16,8 @@ class Activity:
         self._mp_socket = system.unstable.owner.subscribe_to(
             "ipc:///run/tritium/sockets/mediapipe_data",
             self._on_mediapipe_data,
-            expect_json=True,
+            # Parsed in mediapipe_decoding, with orjson when it is installed
+            expect_json=False,
             description="mediapipe events",
             conflate=True,
         )
@@ -31,7 +33,10 @@ class Activity:
             "face_detections", FaceDetection, sensor.name
         )
 
-    def _on_mediapipe_data(self, data):
+    def _on_mediapipe_data(self, raw):
+        data = mediapipe_decoding.decode(raw)
+        if data is None:
+            return
         fds = data.get("face_detections", [])
         faces = []
         if fds and isinstance(fds[0], list):
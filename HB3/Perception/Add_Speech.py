@@ -9,6 +9,7 @@ SpeechRecognitionClient = system.import_library(
     "./lib/asr_client.py"
 ).SpeechRecognitionClient
 VOICE_ID_UTIL = system.import_library("./lib/voice_id_util.py")
+TRACER = system.import_library("../lib/latency_tracer.py").TRACER
 
 ROBOT_STATE = system.import_library("../robot_state.py")
 robot_state = ROBOT_STATE.state
@@ -115,6 +116,7 @@ class Activity:
                         if speaker_name := VOICE_ID_UTIL.process_voice_id(voice_ids):
                             event["speaker"] = speaker_name
 
+                TRACER.start(event.get("id"))
                 system.messaging.post("speech_recognized", event)
         self.last_send_speech_time_stamp = timestamp
 
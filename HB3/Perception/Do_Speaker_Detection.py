@@ -1,5 +1,6 @@
 import math
 from time import monotonic
+from typing import Optional
 from itertools import count
 from collections import defaultdict
 
@@ -11,6 +12,9 @@ MATCHING_FACE_ANGLE = 20
 MATCHING_FACE_COSINE_THRESH = math.cos(math.radians(MATCHING_FACE_ANGLE))
 
 perception_state = system.import_library("./perception_state.py").perception_state
+profiler = system.import_library("../lib/profiler.py")
+doa_histogram = system.import_library("./lib/doa_histogram.py")
+Scene = system.import_library("./lib/perception_scheduler.py").Scene
 TYPES = system.import_library("../lib/types.py")
 microphone = system.control(
     "Microphone Array", None, acquire=["direction", "voice_activity"]
@@ -19,6 +23,10 @@ microphone = system.control(
 
 MYSTERY_SPEAKER_HEIGHT = 1.8
 MYSTERY_SPEECH_LIFETIME_S = 5
+# Maximum number of people who can be attributed speech at once
+MAX_SIMULTANEOUS_SPEAKERS = 3
+# Target tick rates by scene. Ticks run at the highest rate and skip down to these.
+TICK_RATES = {Scene.EMPTY: 1, Scene.PRESENT: 2, Scene.SPEAKING: 4}
 speech_publisher = system.world.publish(
     "mystery_speakers", TYPES.SpeechBubble, display="speak"
 )
@@ -26,25 +34,31 @@ speech_publisher = system.world.publish(
 
 class Activity:
     _person_speaking: bool = False
-    _doa_bin: defaultdict[int, int] = defaultdict(lambda: 0)
+    _doa_histogram = doa_histogram.DOAHistogram()
     _speaker_votes = defaultdict(lambda: 0)
     _mystery_speakers: list[float, TYPES.SpeechBubble] = []
 
     def on_start(self):
         self._person_speaking = False
-        self._doa_bin.clear()
+        self._doa_histogram.clear()
         self._speaker_votes.clear()
         self._mystery_speakers = []
+        self.stage = perception_state.scheduler.stage("speaker_detection", TICK_RATES)
 
+    def _set_person_speaking(self, speaking: bool):
+        self._person_speaking = speaking
+        perception_state.scheduler.update_speaking(speaking)
+
+    @profiler.profiled_messages(__file__)
     def on_message(self, channel, message):
         match channel:
             case "speech_heard" | "no_speech_heard":
-                self._person_speaking = False
+                self._set_person_speaking(False)
                 for face in perception_state.world_faces:
                     if face.said == "...":
                         face.said = None
             case "speech_recognized":
-                self._person_speaking = False
+                self._set_person_speaking(False)
                 if self._speaker_votes:
                     speaker = max(
                         self._speaker_votes.items(),
@@ -67,47 +81,64 @@ class Activity:
                     )
             case "speech_started":
                 self._speaker_votes.clear()
-                self._person_speaking = True
+                self._set_person_speaking(True)
+
+    def _decay_doa_histogram(self, t: Optional[float] = None):
+        self._doa_histogram.decay(
+            monotonic() if t is None else t,
+            (
+                doa_histogram.SPEAKING_DECAY_S
+                if self._person_speaking
+                else doa_histogram.SILENT_DECAY_S
+            ),
+        )
 
     @system.watch(microphone)
     def on_change(self, changed):
-        if microphone.voice_activity and microphone.direction is not None:
-            doa = 90 - microphone.direction
-            self._doa_bin[doa] += 1
-        elif not self._person_speaking:
-            self._doa_bin.clear()
+        self._add_doa_sample(microphone.direction, microphone.voice_activity)
+
+    def _add_doa_sample(
+        self,
+        direction: Optional[float],
+        voice_activity: bool,
+        t: Optional[float] = None,
+    ):
+        self._decay_doa_histogram(t)
+        if voice_activity and direction is not None:
+            self._doa_histogram.add(90 - direction)
+
+    def get_speakers(self) -> list[tuple[object, float]]:
+        """Faces which sound is coming from, with the weight of the sound, loudest first."""
+        peaks = self._doa_histogram.peaks(MAX_SIMULTANEOUS_SPEAKERS)
+        if not peaks:
+            return []
+        face_index = perception_state.face_index
+        matches = face_index.nearest_to_angles(
+            [angle for angle, _ in peaks], MATCHING_FACE_ANGLE
+        )
+        return [
+            (face_index.objects[index], weight)
+            for index, (_, weight) in zip(matches, peaks)
+            if index is not None
+        ]
 
     def get_speaker(self):
-        # Just take the mode of the doa's for now
-        # The speaker seems to hear itself / it's motors at position of 0 doa. We just drop this
-        doas_sans_0 = {
-            doa: occurrences
-            for doa, occurrences in self._doa_bin.items()
-            if not doa == 0
-        }
-        if not doas_sans_0:
-            return None
-        mode_doa = max(
-            doas_sans_0.items(),
-            key=lambda item: item[1],
-        )[0]
-        best_possible_match = None
-        for face in perception_state.world_faces:
-            face_angle = math.degrees(math.atan2(face.position.y, face.position.x))
-            distance = abs(face_angle - mode_doa)
-            if distance < MATCHING_FACE_ANGLE:
-                if not best_possible_match or distance < best_possible_match[0]:
-                    best_possible_match = (distance, face)
-        if best_possible_match:
-            return best_possible_match[1]
-        else:
-            return None
+        speakers = self.get_speakers()
+        return speakers[0][0] if speakers else None
 
     @system.tick(fps=4)
+    @profiler.profiled_tick(__file__, fps=4)
     def on_tick(self):
+        if not self.stage.due():
+            return
+        with self.stage.measure():
+            self._update()
+
+    def _update(self):
+        self._decay_doa_histogram()
         if self._person_speaking:
-            if speaker := self.get_speaker():
-                self._speaker_votes[speaker] += 1
+            for speaker, weight in self.get_speakers():
+                self._speaker_votes[speaker] += weight
 
                 if not speaker.said:
                     speaker.said = "..."
@@ -127,22 +158,15 @@ class Activity:
         )
 
     def get_mystery_speaker_position(self):
-        doas_sans_0 = {
-            doa: occurrences
-            for doa, occurrences in self._doa_bin.items()
-            if not doa == 0
-        }
-        if not doas_sans_0:
+        peaks = self._doa_histogram.peaks(1)
+        if not peaks:
             return None
-        mode_doa = max(
-            doas_sans_0.items(),
-            key=lambda item: item[1],
-        )[0]
+        peak_doa = peaks[0][0]
 
         return Point3(
             [
-                math.cos(math.radians(mode_doa)),
-                math.sin(math.radians(mode_doa)),
+                math.cos(math.radians(peak_doa)),
+                math.sin(math.radians(peak_doa)),
                 MYSTERY_SPEAKER_HEIGHT,
             ]
-        )
\ No newline at end of file
+        )
@@ -1,4 +1,9 @@
+import asyncio
+
+CONFIG = system.import_library("../../Config/HB3.py").CONFIG
+
 match_detections = system.import_library("./lib/match_detections.py")
+profiler = system.import_library("../lib/profiler.py")
 
 custom_types = system.import_library("../lib/types.py")
 
@@ -7,6 +12,9 @@ DetectedFace = custom_types.DetectedFace
 
 perception_state = system.import_library("./perception_state.py").perception_state
 
+perception_scheduler = system.import_library("./lib/perception_scheduler.py")
+Scene = perception_scheduler.Scene
+
 world_object = system.import_library("./lib/world_object.py")
 WorldObject = world_object.WorldObject
 
@@ -24,6 +32,9 @@ SUB_NAME = "face_detections"
 PUB_NAME_2D = "face_detections_filtered"
 PUB_NAME_3D = "faces"
 
+# Target rates at which face detections are processed, by scene
+PROCESSING_RATES = {Scene.EMPTY: 5, Scene.PRESENT: 15, Scene.SPEAKING: 30}
+
 
 class Activity:
     world_faces = set()
@@ -57,10 +68,26 @@ class Activity:
             ],
         )
 
+        self.stage = perception_state.scheduler.stage("faces", PROCESSING_RATES)
+        # Detections which arrive while a frame is being processed are coalesced
+        self._latest = perception_scheduler.LatestQueue(self.stage)
+        self.processing_coroutine = asyncio.create_task(self._process_latest())
+
         async with system.world.query_features(name=SUB_NAME) as sub:
             async for s in sub.async_iter():
                 if s is not None:
-                    self.process_camera_observations(s)
+                    self._latest.put(s)
+
+    async def _process_latest(self):
+        while True:
+            camera_observation = await self._latest.get_when_due()
+            try:
+                with self.stage.measure():
+                    self.process_camera_observations(camera_observation)
+            except Exception:
+                log.exception("Unexpected error occurred processing faces")
+            perception_state.scheduler.update_people(len(perception_state.world_faces))
+            probe("scheduler", perception_state.scheduler.stats())
 
     @ActiveSensor.subscribe()
     def on_sensor_updated(self, sensor) -> None:
@@ -70,13 +97,17 @@ class Activity:
         # Make sure all the update tasks are cancelled
         if self.processing_coroutine:
             self.processing_coroutine.cancel()
+        # Write any pending changes to the local face identity index
+        world_face.profiles_client.index.flush_save()
+
+    def converter(self, from_frame, to_frame):
+        # Overridden when replaying recordings without a robot (Tests/Replay_Perception.py)
+        return system.world.converter(from_frame, to_frame)
 
     def _get_filtered_observations(self, camera_observation):
         sample_time_ns = camera_observation.time_ns
 
-        converter = system.world.converter(
-            camera_observation.frame, system.world.ROBOT_SPACE
-        )
+        converter = self.converter(camera_observation.frame, system.world.ROBOT_SPACE)
         world_object_observations = []
         for detection in camera_observation.detections:
             if detection.confidence > MIN_FACE_DETECTION_CONFIDENCE:
@@ -101,6 +132,8 @@ class Activity:
     ):
         observation_indexes = set(range(len(world_object_observations)))
         observations_filtered = []
+        # Only decode the camera frame if a face wants a crop of it
+        frame = None
         for face, observation_index in arrangement:
             if observation_index is not None:
                 world_object_observation = world_object_observations[observation_index]
@@ -108,6 +141,13 @@ class Activity:
                 # A face has been detected. Update it
                 observation_indexes.remove(observation_index)
                 face.update(world_object_observation, sample_time_s)
+                if CONFIG["FACE_CROP_UPLOADS"] and face.wants_image(detection):
+                    if frame is None:
+                        frame = perception_state.frames.closest(
+                            int(sample_time_s * 1e9)
+                        )
+                    if frame is not None:
+                        face.add_image(detection, frame)
 
                 observations_filtered.append(
                     DetectedFace(
@@ -198,7 +238,7 @@ class Activity:
         # Match the detections to the faces
         arrangement, out_of_frame_faces = match_detections.match_observations_to_faces(
             sample_time_ns,
-            system.world.converter(system.world.ROBOT_SPACE, camera_observation.frame),
+            self.converter(system.world.ROBOT_SPACE, camera_observation.frame),
             world_object_observations,
         )
 
@@ -207,6 +247,7 @@ class Activity:
         )
 
         self._update_faces_after_observations(sample_time_s)
+        perception_state.rebuild_face_index()
 
         if self.pub_2d:
             self.pub_2d.write(
@@ -222,6 +263,7 @@ class Activity:
             ]
         )
 
+    @profiler.profiled_messages(__file__)
     def on_message(self, channel, message):
         if channel == "remember_name":
             print(f"REMEMBER NAME of {message}")
@@ -239,4 +281,4 @@ class Activity:
                 f"Cannot work out who to name: there are {len(unknown_people)} unknown people in front of me."
             )
         else:
-            unknown_people[0].remember_name(name)
\ No newline at end of file
+            unknown_people[0].remember_name(name)
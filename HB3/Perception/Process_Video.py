@@ -1,5 +1,4 @@
 from time import time_ns as time_unix_ns
-from collections import deque
 
 custom_types = system.import_library("../lib/types.py")
 
@@ -21,10 +20,7 @@ class Activity:
 
     async def on_start(self):
 
-        self.frame_buffer_bytes = deque([None] * 3, 3)
-
-        perception_state.last_image_bytes = None
-        perception_state.last_good_image_bytes = None
+        perception_state.frames.clear()
 
         # Find active camera from mediapipe node
         self.mediapipe_checker = stash.subscribe(
@@ -101,12 +97,11 @@ class Activity:
                 log.error("No video sensor found")
 
     def _on_video_capture_data(self, data):
-        time_ns = time_unix_ns()
-        self.frame_buffer_bytes.appendleft((time_ns, data))
-        perception_state.last_image_bytes = data
-
-        if not robot_state.is_thinking and not robot_state.blinking:
-            perception_state.last_good_image_bytes = data
+        perception_state.frames.push(
+            time_unix_ns(),
+            data,
+            good=not robot_state.is_thinking and not robot_state.blinking,
+        )
 
     def reset_zmq_socket(self):
         try:
@@ -1,9 +1,12 @@
 from ea.util.event import WeakEvent
 
+TRACER = system.import_library("../lib/latency_tracer.py").TRACER
+
 
 class VAD_subscription:
 
     def __init__(self):
+        self._detected = False
         self._vad_socket = system.unstable.owner.subscribe_to(
             "ipc:///run/tritium/sockets/speech_recognition_vad",
             self._on_asr_vad,
@@ -15,6 +18,10 @@ class VAD_subscription:
         self.executed_functions = WeakEvent()
 
     def _on_asr_vad(self, data: dict):
+        if self._detected and not data.get("detected"):
+            TRACER.vad_end()
+        self._detected = data.get("detected", False)
+
         # Call the functions the dependant scripts require
         self.executed_functions.fire(data)
 
@@ -0,0 +1,130 @@
+"""A decaying histogram of microphone direction of arrival (DOA) estimates.
+
+Angles are in degrees in the robot reference frame, with 0 straight ahead and positive
+to the robot's left (the same convention as atan2(y, x) on a world face position).
+"""
+
+from math import exp
+from typing import Optional
+
+import numpy as np
+
+N_BINS = 360
+
+# Time constants of the exponential decay of the histogram while someone is speaking,
+# and while nobody is
+SPEAKING_DECAY_S = 4.0
+SILENT_DECAY_S = 0.3
+
+# The microphone hears the robot itself / its motors straight ahead. Drop these bins.
+IGNORED_BINS = (0,)
+
+# Standard deviation (in degrees) of the gaussian used to smooth the histogram
+SMOOTHING_SIGMA_DEG = 4.0
+
+# A peak must hold at least this fraction of the highest peak, and be backed by at least
+# this many (decayed) DOA samples
+MIN_PEAK_FRACTION = 0.3
+MIN_PEAK_WEIGHT = 1.0
+
+# Peaks closer together than this are treated as the same speaker
+MIN_PEAK_SEPARATION_DEG = 25
+
+
+def wrap_degrees(angles):
+    """Wrap angles into [-180, 180)."""
+    return (np.asarray(angles) + 180) % 360 - 180
+
+
+def _smoothing_kernel(sigma: float) -> np.ndarray:
+    half_width = int(3 * sigma)
+    x = np.arange(-half_width, half_width + 1)
+    kernel = np.exp(-0.5 * (x / sigma) ** 2)
+    return kernel / kernel.sum()
+
+
+class DOAHistogram:
+    # Rescale the stored bins once the decay scale drops below this, to keep precision
+    MIN_SCALE = 1e-6
+
+    def __init__(self):
+        # The histogram is self._bins * self._scale, so decaying only touches the scale
+        self._bins = np.zeros(N_BINS)
+        self._scale = 1.0
+        self._ignored = np.zeros(N_BINS, dtype=bool)
+        self._ignored[list(IGNORED_BINS)] = True
+        self._kernel = _smoothing_kernel(SMOOTHING_SIGMA_DEG)
+        self._last_decay_time: Optional[float] = None
+
+    @property
+    def bins(self) -> np.ndarray:
+        return self._bins * self._scale
+
+    def clear(self):
+        self._bins[:] = 0
+        self._scale = 1.0
+        self._last_decay_time = None
+
+    def decay(self, t: float, time_constant: float):
+        """Decay the histogram up to time t (in seconds)."""
+        if self._last_decay_time is not None and t > self._last_decay_time:
+            self._scale *= exp(-(t - self._last_decay_time) / time_constant)
+            if self._scale < self.MIN_SCALE:
+                self._bins *= self._scale
+                self._scale = 1.0
+        self._last_decay_time = t
+
+    def add(self, doa: float, weight: float = 1.0):
+        self._bins[int(round(doa)) % N_BINS] += weight / self._scale
+
+    def smoothed(self) -> np.ndarray:
+        bins = np.where(self._ignored, 0.0, self.bins)
+        pad = len(self._kernel) // 2
+        # Circular convolution, as the histogram wraps around the robot
+        wrapped = np.concatenate([bins[-pad:], bins, bins[:pad]])
+        return np.convolve(wrapped, self._kernel, mode="valid")
+
+    def peaks(self, max_peaks: int = 3) -> list[tuple[float, float]]:
+        """The strongest directions sound is coming from as (angle in [-180, 180), weight), strongest first."""
+        smoothed = self.smoothed()
+        top = smoothed.max()
+        if top <= 0:
+            return []
+        threshold = max(top * MIN_PEAK_FRACTION, MIN_PEAK_WEIGHT * self._kernel.max())
+        is_peak = (
+            (smoothed >= np.roll(smoothed, 1))
+            & (smoothed > np.roll(smoothed, -1))
+            & (smoothed >= threshold)
+        )
+        candidates = np.flatnonzero(is_peak)
+        candidates = candidates[np.argsort(-smoothed[candidates])]
+
+        peaks = []
+        for angle in candidates:
+            if all(
+                abs(wrap_degrees(angle - other)) >= MIN_PEAK_SEPARATION_DEG
+                for other, _ in peaks
+            ):
+                peaks.append((float(angle), float(smoothed[angle])))
+                if len(peaks) >= max_peaks:
+                    break
+        return [(float(wrap_degrees(angle)), weight) for angle, weight in peaks]
+
+
+def match_peaks_to_angles(
+    peaks: list[tuple[float, float]], angles, max_angle: float
+) -> list[Optional[int]]:
+    """For each peak, the index of the closest angle within max_angle degrees, or None."""
+    angles = np.asarray(angles, dtype=float)
+    if len(peaks) == 0:
+        return []
+    if angles.size == 0:
+        return [None] * len(peaks)
+    peak_angles = np.array([angle for angle, _ in peaks])
+    # peaks x angles
+    differences = np.abs(wrap_degrees(angles[None, :] - peak_angles[:, None]))
+    closest = differences.argmin(axis=1)
+    return [
+        int(index) if differences[i, index] < max_angle else None
+        for i, index in enumerate(closest)
+    ]
@@ -0,0 +1,123 @@
+"""Cheap quality scoring of face crops so only the best ones are sent for embedding."""
+
+import heapq
+from math import cos, sqrt
+from itertools import count
+from typing import Optional
+
+import numpy as np
+from PIL.Image import Image
+
+types = system.import_library("../../lib/types.py")
+DetectedFace = types.DetectedFace
+
+# Face size (sqrt of normalised bbox area) below which a crop is useless, and above which it is ideal
+MIN_FACE_SIZE_NORM = 0.04
+GOOD_FACE_SIZE_NORM = 0.15
+
+# Variance of the Laplacian at which a crop scores 0.5 for sharpness
+SHARPNESS_HALF_SCORE = 100.0
+
+# Crops are downscaled to at most this size (in pixels) before measuring sharpness
+SHARPNESS_SAMPLE_SIZE = 64
+
+
+def _clamp(value: float, lower: float = 0.0, upper: float = 1.0) -> float:
+    return max(lower, min(upper, value))
+
+
+def size_score(detection: DetectedFace) -> float:
+    _, _, w, h = detection.rect
+    size = sqrt(max(0.0, w * h))
+    return _clamp(
+        (size - MIN_FACE_SIZE_NORM) / (GOOD_FACE_SIZE_NORM - MIN_FACE_SIZE_NORM)
+    )
+
+
+def yaw_score(yaw: float) -> float:
+    """1 for a front-on face, falling to 0 for a face in profile."""
+    return _clamp(cos(yaw)) ** 2
+
+
+def visibility_score(detection: DetectedFace) -> float:
+    """The fraction of keypoints inside the bounding box, as a proxy for occlusion."""
+    if not detection.keypoints:
+        return 0.0
+    l, t, w, h = detection.rect
+    inside = sum(
+        1 for kp in detection.keypoints if l <= kp.x <= l + w and t <= kp.y <= t + h
+    )
+    return inside / len(detection.keypoints)
+
+
+def geometry_score(detection: DetectedFace, yaw: float) -> float:
+    """Score a detection without looking at any pixels."""
+    return (
+        size_score(detection)
+        * yaw_score(yaw)
+        * visibility_score(detection)
+        * _clamp(detection.confidence)
+    )
+
+
+def sharpness_score(image: Image) -> float:
+    """Variance of the Laplacian of a downscaled greyscale copy, mapped to [0, 1)."""
+    grey = image.convert("L")
+    grey.thumbnail((SHARPNESS_SAMPLE_SIZE, SHARPNESS_SAMPLE_SIZE))
+    pixels = np.asarray(grey, dtype=np.float32)
+    if pixels.shape[0] < 3 or pixels.shape[1] < 3:
+        return 0.0
+    laplacian = (
+        pixels[:-2, 1:-1]
+        + pixels[2:, 1:-1]
+        + pixels[1:-1, :-2]
+        + pixels[1:-1, 2:]
+        - 4 * pixels[1:-1, 1:-1]
+    )
+    variance = float(laplacian.var())
+    return variance / (variance + SHARPNESS_HALF_SCORE)
+
+
+class BestCropBuffer:
+    """Keeps the k highest scoring crops seen so far."""
+
+    def __init__(self, size: int):
+        self.size = size
+        # Min-heap of (score, insertion order, crop) so the worst crop is always at the top
+        self._heap: list[tuple[float, int, Image]] = []
+        self._counter = count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    @property
+    def full(self) -> bool:
+        return len(self._heap) >= self.size
+
+    @property
+    def best_score(self) -> Optional[float]:
+        return max(self._heap)[0] if self._heap else None
+
+    def would_accept(self, score: float) -> bool:
+        return not self.full or score > self._heap[0][0]
+
+    def push(self, score: float, crop: Image) -> bool:
+        if not self.would_accept(score):
+            return False
+        entry = (score, next(self._counter), crop)
+        if self.full:
+            heapq.heapreplace(self._heap, entry)
+        else:
+            heapq.heappush(self._heap, entry)
+        return True
+
+    def pop_best(self) -> Optional[tuple[float, Image]]:
+        if not self._heap:
+            return None
+        best = max(self._heap)
+        self._heap.remove(best)
+        heapq.heapify(self._heap)
+        return best[0], best[2]
+
+    def clear(self):
+        self._heap.clear()
@@ -0,0 +1,271 @@
+"""An on-robot nearest neighbour index of known profile face embeddings.
+
+Embeddings are stored L2 normalised as rows of one contiguous float32 matrix so
+a query is a single matrix-vector product followed by a partial sort.
+Distances are cosine distances (1 - cosine similarity).
+"""
+
+import os
+import json
+import asyncio
+from typing import Optional
+
+import numpy as np
+
+INDEX_DIR: str = "/var/opt/tritium/personal_data/face_identity_index"
+"""Directory where the index is stored on disk"""
+
+EMBEDDINGS_FILE_NAME: str = "embeddings.npy"
+PROFILES_FILE_NAME: str = "profiles.json"
+
+SAVE_DEBOUNCE_S: float = 2.0
+"""Delay before writing the index to disk, so bursts of updates are saved once"""
+
+
+def parse_embedding(face_embedding) -> Optional[np.ndarray]:
+    """Convert an embedding as returned by the face embedding server to a float32 vector."""
+    if isinstance(face_embedding, str):
+        try:
+            face_embedding = json.loads(face_embedding)
+        except ValueError:
+            face_embedding = face_embedding.strip("[]").split(",")
+    try:
+        vector = np.asarray(face_embedding, dtype=np.float32).ravel()
+    except (TypeError, ValueError):
+        return None
+    if vector.size == 0:
+        return None
+    return vector
+
+
+def _normalise(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def _stack_rows(rows, row_profile_ids) -> tuple[np.ndarray, np.ndarray]:
+    """The index matrix of the embedding rows, and the profile id of each row."""
+    if len(rows) == 0:
+        return np.zeros((0, 0), dtype=np.float32), np.zeros((0,), dtype=np.int64)
+    return (
+        np.ascontiguousarray(_normalise(np.vstack(rows).astype(np.float32))),
+        np.asarray(row_profile_ids, dtype=np.int64),
+    )
+
+
+class FaceIdentityIndex:
+    def __init__(self, index_dir: Optional[str] = INDEX_DIR, mmap: bool = True):
+        self.index_dir = index_dir
+        self.mmap = mmap
+
+        self._embeddings = np.zeros((0, 0), dtype=np.float32)
+        # The profile id of each row of self._embeddings
+        self._row_profile_ids = np.zeros((0,), dtype=np.int64)
+        self._profiles: dict[int, dict] = {}
+
+        # True once the index holds a full set of profiles, either from disk or from the server
+        self.ready = False
+        self._save_handle: Optional[asyncio.TimerHandle] = None
+
+    def __len__(self):
+        return len(self._profiles)
+
+    @property
+    def dimension(self) -> int:
+        return self._embeddings.shape[1]
+
+    def load(self) -> bool:
+        """Load the index from disk, memory-mapping the embedding matrix if requested."""
+        if self.index_dir is None:
+            return False
+        embeddings_path = os.path.join(self.index_dir, EMBEDDINGS_FILE_NAME)
+        profiles_path = os.path.join(self.index_dir, PROFILES_FILE_NAME)
+        try:
+            with open(profiles_path, "r") as f:
+                cache = json.load(f)
+            embeddings = np.load(
+                embeddings_path,
+                mmap_mode="r" if self.mmap else None,
+                allow_pickle=False,
+            )
+        except (IOError, ValueError) as e:
+            log.warning(f"No face identity index loaded: {e}")
+            return False
+        try:
+            row_profile_ids = np.asarray(cache["row_profile_ids"], dtype=np.int64)
+            profiles = {int(k): v for k, v in cache["profiles"].items()}
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            log.warning(f"Face identity index on disk is corrupt. Ignoring it: {e}")
+            return False
+        if len(row_profile_ids) != len(embeddings):
+            log.warning("Face identity index on disk is inconsistent. Ignoring it.")
+            return False
+        self._embeddings = embeddings
+        self._row_profile_ids = row_profile_ids
+        self._profiles = profiles
+        self.ready = True
+        log.info(f"{len(self._profiles)} face profiles loaded")
+        return True
+
+    def flush_save(self):
+        """Save the index now if a save is pending, such as when stopping."""
+        if self._save_handle is not None:
+            self.save()
+
+    def _schedule_save(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.save()
+            return
+        if self._save_handle is None:
+            self._save_handle = loop.call_later(SAVE_DEBOUNCE_S, self.save)
+
+    def save(self):
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+        if self.index_dir is None:
+            return
+        os.makedirs(self.index_dir, exist_ok=True)
+        embeddings_path = os.path.join(self.index_dir, EMBEDDINGS_FILE_NAME)
+        profiles_path = os.path.join(self.index_dir, PROFILES_FILE_NAME)
+
+        # Write to temporary files and swap them in so a memory-mapped reader never sees a partial file
+        np.save(embeddings_path + ".tmp.npy", np.ascontiguousarray(self._embeddings))
+        with open(profiles_path + ".tmp", "w") as f:
+            json.dump(
+                {
+                    "row_profile_ids": self._row_profile_ids.tolist(),
+                    "profiles": self._profiles,
+                },
+                f,
+            )
+        os.replace(embeddings_path + ".tmp.npy", embeddings_path)
+        os.replace(profiles_path + ".tmp", profiles_path)
+
+        if self.mmap:
+            self._embeddings = np.load(embeddings_path, mmap_mode="r")
+
+    def replace_all(self, profiles: list[dict]):
+        """Rebuild the index from a full list of profiles.
+
+        Each profile is a dict with "id", "info" and "embeddings" keys.
+        """
+        rows = []
+        row_profile_ids = []
+        new_profiles = {}
+        for profile in profiles:
+            profile_id = int(profile["id"])
+            new_profiles[profile_id] = {"id": profile_id, "info": profile.get("info")}
+            for embedding in profile.get("embeddings", []):
+                vector = parse_embedding(embedding)
+                if vector is None:
+                    continue
+                rows.append(vector)
+                row_profile_ids.append(profile_id)
+
+        embeddings, row_profile_ids = _stack_rows(rows, row_profile_ids)
+        self.ready = True
+        if (
+            new_profiles == self._profiles
+            and np.array_equal(row_profile_ids, self._row_profile_ids)
+            and np.array_equal(embeddings, self._embeddings)
+        ):
+            # Nothing changed since the last sync, so there is nothing to write
+            return
+        self._profiles = new_profiles
+        self._embeddings, self._row_profile_ids = embeddings, row_profile_ids
+        self._schedule_save()
+
+    def add(self, profile_id: int, face_embeddings: list, info: Optional[dict] = None):
+        """Add embeddings (and optionally info) for a single profile."""
+        profile_id = int(profile_id)
+        profile = self._profiles.setdefault(
+            profile_id, {"id": profile_id, "info": None}
+        )
+        if info is not None:
+            profile["info"] = info
+
+        vectors = [v for v in map(parse_embedding, face_embeddings) if v is not None]
+        if vectors:
+            rows = list(self._embeddings) + vectors
+            row_profile_ids = self._row_profile_ids.tolist() + [profile_id] * len(
+                vectors
+            )
+            self._set_rows(rows, row_profile_ids)
+        self._schedule_save()
+
+    def update_info(self, profile_id: int, info: dict):
+        profile_id = int(profile_id)
+        if profile_id in self._profiles and self._profiles[profile_id]["info"] != info:
+            self._profiles[profile_id]["info"] = info
+            self._schedule_save()
+
+    def remove(self, profile_id: int):
+        profile_id = int(profile_id)
+        if self._profiles.pop(profile_id, None) is None:
+            return
+        keep = self._row_profile_ids != profile_id
+        self._set_rows(list(self._embeddings[keep]), self._row_profile_ids[keep])
+        self._schedule_save()
+
+    def _set_rows(self, rows, row_profile_ids):
+        self._embeddings, self._row_profile_ids = _stack_rows(rows, row_profile_ids)
+
+    def query(
+        self, face_embedding, max_n: int, max_distance: float
+    ) -> Optional[list[dict]]:
+        """Find the profiles closest to the given embedding.
+
+        Returns up to `max_n` distinct profiles within `max_distance` (cosine distance)
+        ordered by distance, or None if the embedding cannot be compared to the index.
+        """
+        vector = parse_embedding(face_embedding)
+        if vector is None:
+            return None
+        if len(self._row_profile_ids) == 0:
+            return []
+        if vector.shape[0] != self.dimension:
+            log.warning(
+                f"Face embedding dimension {vector.shape[0]} does not match index dimension {self.dimension}"
+            )
+            return None
+
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        distances = 1 - self._embeddings @ (vector / norm)
+
+        # Several rows can belong to the same profile, so take a few candidates per profile
+        # and only fall back to a full sort if they do not fill max_n profiles
+        n_rows = len(distances)
+        k = min(n_rows, max_n * max(1, n_rows // max(1, len(self._profiles))))
+        candidates = np.argpartition(distances, k - 1)[:k] if k < n_rows else None
+        results = self._collect(distances, candidates, max_n, max_distance)
+        if results is None:
+            results = self._collect(distances, None, max_n, max_distance)
+        return results
+
+    def _collect(self, distances, candidates, max_n, max_distance):
+        """Gather distinct profiles from candidate rows, or None if the candidates ran out early."""
+        exhaustive = candidates is None
+        if exhaustive:
+            candidates = np.arange(len(distances))
+        candidates = candidates[np.argsort(distances[candidates], kind="stable")]
+
+        results = []
+        seen = set()
+        for row in candidates:
+            distance = float(distances[row])
+            if distance > max_distance:
+                return results
+            profile_id = int(self._row_profile_ids[row])
+            if profile_id in seen:
+                continue
+            seen.add(profile_id)
+            results.append({**self._profiles[profile_id], "distance": distance})
+            if len(results) >= max_n:
+                return results
+        return results if exhaustive else None
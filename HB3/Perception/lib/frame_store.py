@@ -0,0 +1,156 @@
+"""A shared store of recent camera frames.
+
+Frames are kept as the raw MJPEG bytes received from the camera and are only decoded
+(or base64 encoded) the first time someone asks, after which the result is memoized
+on the frame. However many subsystems look at a frame, it is decoded at most once.
+"""
+
+import io
+import base64
+from typing import Iterator, Optional
+
+import numpy as np
+from PIL import Image
+
+FRAME_STORE_SIZE = 3
+
+
+class FrameRegion:
+    """A view onto a rectangular region of a frame, in normalised image coordinates."""
+
+    __slots__ = ("frame", "rect", "_image")
+
+    def __init__(self, frame: "Frame", rect):
+        self.frame = frame
+        self.rect = rect
+        self._image = None
+
+    @property
+    def box(self) -> tuple[int, int, int, int]:
+        """The region as a (left, top, right, bottom) pixel box, clipped to the frame."""
+        image_width, image_height = self.frame.size
+        l, t, w, h = self.rect
+        left = min(max(0, int(l * image_width)), image_width)
+        top = min(max(0, int(t * image_height)), image_height)
+        right = min(max(left, int((l + w) * image_width)), image_width)
+        bottom = min(max(top, int((t + h) * image_height)), image_height)
+        return left, top, right, bottom
+
+    @property
+    def array(self) -> np.ndarray:
+        """A view into the frame's pixel array. No pixels are copied."""
+        left, top, right, bottom = self.box
+        return self.frame.array[top:bottom, left:right]
+
+    @property
+    def image(self) -> Image.Image:
+        if self._image is None:
+            self._image = self.frame.image.crop(self.box)
+        return self._image
+
+
+class Frame:
+    __slots__ = ("time_ns", "data", "good", "_image", "_array", "_b64", "_encoded")
+
+    def __init__(self, time_ns: int, data: bytes, good: bool = True):
+        self.time_ns = time_ns
+        self.data = data
+        self.good = good
+        self._image = None
+        self._array = None
+        self._b64 = None
+        self._encoded: dict[tuple[int, int], str] = {}
+
+    @property
+    def image(self) -> Image.Image:
+        """The decoded frame. Treat as read only, it is shared by every consumer."""
+        if self._image is None:
+            image = Image.open(io.BytesIO(self.data))
+            image.load()
+            self._image = image
+        return self._image
+
+    @property
+    def size(self) -> tuple[int, int]:
+        return self.image.size
+
+    @property
+    def array(self) -> np.ndarray:
+        """The decoded frame as a read only (height, width, channels) array."""
+        if self._array is None:
+            array = np.asarray(self.image)
+            array.flags.writeable = False
+            self._array = array
+        return self._array
+
+    @property
+    def b64(self) -> str:
+        """The frame as a base64 JPEG data URL."""
+        if self._b64 is None:
+            self._b64 = (
+                f"data:image/jpeg;base64,{base64.b64encode(self.data).decode('utf-8')}"
+            )
+        return self._b64
+
+    def encoded_b64(self, max_size: Optional[int], quality: int) -> str:
+        """The frame downscaled to fit within max_size and recompressed, as a base64 JPEG data URL.
+
+        Falls back to the original bytes when no max_size is given.
+        """
+        if max_size is None:
+            return self.b64
+        key = (max_size, quality)
+        if (encoded := self._encoded.get(key)) is None:
+            image = self.image
+            if max(image.size) > max_size:
+                image = image.copy()
+                image.thumbnail((max_size, max_size))
+            arr = io.BytesIO()
+            image.convert("RGB").save(arr, format="JPEG", quality=quality)
+            encoded = f"data:image/jpeg;base64,{base64.b64encode(arr.getvalue()).decode('utf-8')}"
+            self._encoded[key] = encoded
+        return encoded
+
+    def crop(self, rect) -> FrameRegion:
+        return FrameRegion(self, rect)
+
+
+class FrameStore:
+    """A fixed size ring buffer of the most recent frames, newest first."""
+
+    def __init__(self, size: int = FRAME_STORE_SIZE):
+        self.size = size
+        self._frames: list[Optional[Frame]] = [None] * size
+        self._head = -1
+        # The newest good frame is held onto even once it has left the ring
+        self._last_good: Optional[Frame] = None
+
+    def __iter__(self) -> Iterator[Frame]:
+        for i in range(self.size):
+            frame = self._frames[(self._head - i) % self.size]
+            if frame is None:
+                return
+            yield frame
+
+    def clear(self):
+        self._frames = [None] * self.size
+        self._head = -1
+        self._last_good = None
+
+    def push(self, time_ns: int, data: bytes, good: bool = True) -> Frame:
+        frame = Frame(time_ns, data, good)
+        self._head = (self._head + 1) % self.size
+        self._frames[self._head] = frame
+        if good:
+            self._last_good = frame
+        return frame
+
+    def latest(self) -> Optional[Frame]:
+        return self._frames[self._head] if self._head >= 0 else None
+
+    def latest_good(self) -> Optional[Frame]:
+        return self._last_good
+
+    def closest(self, time_ns: int) -> Optional[Frame]:
+        """The stored frame captured closest to the given time."""
+        return min(self, key=lambda frame: abs(frame.time_ns - time_ns), default=None)
@@ -1,8 +1,44 @@
+from typing import Optional
+
 perception_state = system.import_library("../perception_state.py").perception_state
 
+CONFIG = system.import_library("../../../Config/Chat.py").CONFIG
+
+# Longest image side (None for full resolution) and JPEG quality for each detail level
+IMAGE_DETAIL_LEVELS: dict[str, tuple[Optional[int], int]] = {
+    "low": (512, 70),
+    "medium": (1024, 80),
+    "high": (None, 90),
+}
+
+# The image sent most recently, so every call in the same turn sees the same frame
+_last_turn_image: Optional[tuple[str, str, str]] = None
+
+
+async def get_good_frame(
+    detail: Optional[str] = None, turn_id: Optional[str] = None
+) -> str:
+    """Get the last good camera frame as a base64 JPEG data URL.
+
+    Args:
+        detail: one of IMAGE_DETAIL_LEVELS. Defaults to VISION_IMAGE_DETAIL in the chat config.
+        turn_id: calls sharing a turn_id reuse the same encoded image.
+    """
+    global _last_turn_image
+
+    detail = CONFIG["VISION_IMAGE_DETAIL"] if detail is None else detail
+    if (
+        turn_id is not None
+        and _last_turn_image is not None
+        and _last_turn_image[:2] == (turn_id, detail)
+    ):
+        return _last_turn_image[2]
+
+    if (frame := perception_state.frames.latest_good()) is None:
+        raise Exception("Error finding image.")
+    max_size, quality = IMAGE_DETAIL_LEVELS[detail]
+    image_b64 = frame.encoded_b64(max_size, quality)
 
-async def get_good_frame():
-    if (image_b64 := perception_state.last_good_image_b64) is not None:
-        return image_b64
-    else:
-        raise Exception("Error finding image.")
\ No newline at end of file
+    if turn_id is not None:
+        _last_turn_image = (turn_id, detail, image_b64)
+    return image_b64
@@ -1,8 +1,11 @@
 """Match a set of detections of faces to world faces"""
 
+import numpy as np
+
 WORLD_FACE_MODULE = system.import_library("./world_face.py")
 
 perception_state = system.import_library("../perception_state.py").perception_state
+spatial_index = system.import_library("./spatial_index.py")
 
 FACE_SIZE_PIX_NORM = 0.1  # Size of a face in normalised pixels at 1 m
 MIN_JOINT_PROB = 0  # Minimum joint_probability probability to consider a face + observation match valid
@@ -10,40 +13,40 @@ PROB_NEW_OBSERVATION = 0.01  # The probability of a new face.
 
 
 def get_probs(sample_time_ns, inverse_converter, world_object_observations):
-    # Check which faces are behind other faces so cannot be detected
-    face_in_image_locations = {
-        face: inverse_converter.convert(face.position, sample_time_ns)
-        for face in perception_state.world_faces
-    }
-    sorted_faces = sorted(perception_state.world_faces, key=lambda face: face.distance)
-    overlapped_faces = set()
-    for i, face in enumerate(sorted_faces):
-        overlap_distance = FACE_SIZE_PIX_NORM / face.distance
-        for other_face in sorted_faces[i + 1 :]:
-            if (other_face not in overlapped_faces) and (
-                (
-                    face_in_image_locations[other_face] - face_in_image_locations[face]
-                ).length
-                < overlap_distance
-            ):
-                overlapped_faces.add(other_face)
+    # Index the faces at their predicted positions
+    index = spatial_index.SpatialIndex(perception_state.world_faces)
+    faces = index.objects
+    locations = index.image_locations(inverse_converter, sample_time_ns)
+
+    # Check which faces are behind other faces so cannot be detected.
+    # A face is overlapped by any closer face whose image location is within its overlap distance.
+    order = index.range_order
+    sorted_locations = locations[order]
+    separations = np.linalg.norm(
+        sorted_locations[:, None, :] - sorted_locations[None, :, :], axis=2
+    )
+    overlap_distances = FACE_SIZE_PIX_NORM / index.ranges[order]
+    with np.errstate(invalid="ignore"):
+        overlaps = np.triu(separations < overlap_distances[:, None], k=1)
+    overlapped = np.zeros(len(faces), dtype=bool)
+    overlapped[order] = overlaps.any(axis=0)
+
+    joint_probabilities = WORLD_FACE_MODULE.WorldFace.joint_probabilities(
+        faces, world_object_observations
+    )
 
     # Get the probability that each face has been detected
-    joint_probs = {face: {} for face in perception_state.world_faces}
+    joint_probs = {face: {} for face in faces}
     face_observed_probs = {}
     out_of_frame_faces = set()
-    for face in perception_state.world_faces:
-        if face in overlapped_faces:
+    for i, face in enumerate(faces):
+        if overlapped[i]:
             # If the face is overlapped, we reduce the probability that it is detected
             face_observed_probs[face] = 0.1 * face.confidence
         else:
-            try:
-                x_location, y_location = (
-                    face_in_image_locations[face].x,
-                    face_in_image_locations[face].y,
-                )
-            except AttributeError as e:
-                log.warning(f"Face location can't be determined: {e}")
+            x_location, y_location = locations[i]
+            if np.isnan(x_location):
+                log.warning("Face location can't be determined")
                 out_of_frame_faces.add(face)
                 continue
             min_distance_from_edge = min(
@@ -64,8 +67,9 @@ def get_probs(sample_time_ns, inverse_converter, world_object_observations):
                 [0, min([0.9, 0.1 + 4 * min_distance_from_edge])]
             )
 
-        for observation_index, detection in enumerate(world_object_observations):
-            joint_probability = face.joint_probability(detection)
+        for observation_index, joint_probability in enumerate(
+            joint_probabilities[i].tolist()
+        ):
             if joint_probability > MIN_JOINT_PROB:
                 joint_probs[face][observation_index] = joint_probability
 
@@ -0,0 +1,25 @@
+"""Parse face detection messages from the mediapipe node, with orjson when it is installed."""
+
+import json
+from typing import Optional
+
+try:
+    import orjson
+
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+
+def decode(raw) -> Optional[dict]:
+    """The parsed message, or None if it cannot be parsed."""
+    try:
+        # orjson.JSONDecodeError is a ValueError too
+        data = _loads(raw)
+    except (ValueError, TypeError) as e:
+        log.warning(f"Unable to decode mediapipe data: {e}")
+        return None
+    if not isinstance(data, dict) or data.get("time_ns") is None:
+        log.warning("Unable to decode mediapipe data: no time_ns")
+        return None
+    return data
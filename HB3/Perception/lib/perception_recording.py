@@ -0,0 +1,238 @@
+"""Record the inputs of the perception pipeline, and stand in for system.world when replaying them.
+
+A recording is a gzipped JSON lines file. Every line holds the unix time it was received in
+nanoseconds ("t") and its kind ("k"):
+    faces    a face_detections sample: its sample time ("s"), camera frame ("f") and
+             detections ("d"), each [x, y, w, h, confidence, 12 keypoint coordinates]. The
+             camera pose ("c") is included whenever it has moved. Ground truth labels ("l"),
+             one per detection, may be added by hand to measure ID switches exactly.
+    doa      a microphone sample: direction ("d") and voice activity ("v")
+    message  a speech message posted on channel ("c")
+
+The camera pose is stored as the origin and the rays through the centre, right edge and
+bottom edge of the image, as converted by system.world while recording. On replay a
+ReplayCamera fits a pinhole camera to them and stands in for the system.world converters,
+so the pipeline can be run without a robot.
+"""
+
+import os
+import gzip
+import json
+from time import time, time_ns
+from typing import Iterator, Optional
+
+import numpy as np
+from tritium.world.geom import Point2, Point3, Rect, Vector2, Vector3
+
+types = system.import_library("../../lib/types.py")
+DetectedFace = types.DetectedFace
+FaceDetection = types.FaceDetection
+
+RECORDING_DIRECTORY = "/var/opt/tritium/recordings"
+
+FACES = "faces"
+DOA = "doa"
+MESSAGE = "message"
+
+# Image points whose rays describe the camera pose
+CAMERA_POSE_POINTS = ((0.5, 0.5), (1.0, 0.5), (0.5, 1.0))
+
+# The camera pose is only recorded again once it has changed by more than this
+CAMERA_POSE_TOLERANCE = 1e-4
+
+# Decimal places kept when recording coordinates
+PRECISION = 5
+
+
+def _rounded(values) -> list[float]:
+    return [round(float(v), PRECISION) for v in values]
+
+
+def camera_pose(converter, sample_time_ns: int) -> Optional[list[float]]:
+    """The pose of the camera described by a camera to robot space converter."""
+    rays = [converter.convert(Point2(p), sample_time_ns) for p in CAMERA_POSE_POINTS]
+    if any(r is None for r in rays):
+        return None
+    origin = rays[0].point(0).elements
+    return _rounded(
+        [*origin, *(r.direction[i] for r in rays for i in range(3))],
+    )
+
+
+def encode_detection(detection) -> list[float]:
+    coordinates = [c for kp in detection.keypoints for c in (kp.x, kp.y)]
+    return [
+        *_rounded(detection.rect.elements),
+        round(float(detection.confidence), PRECISION),
+        *_rounded(coordinates),
+    ]
+
+
+def decode_faces(record: dict) -> FaceDetection:
+    detections = []
+    for i, values in enumerate(record["d"]):
+        values = np.asarray(values, dtype=float)
+        detections.append(
+            DetectedFace(
+                i,
+                Rect(values[:4].tolist()),
+                float(values[4]),
+                [Vector2(kp) for kp in values[5:].reshape(-1, 2).tolist()],
+            )
+        )
+    return FaceDetection(detections, record["f"], record["s"])
+
+
+class RecordingWriter:
+    def __init__(self, path: Optional[str] = None):
+        if path is None:
+            path = os.path.join(
+                RECORDING_DIRECTORY, f"perception_{int(time())}.jsonl.gz"
+            )
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.n_records = 0
+        self._file = gzip.open(path, "wt")
+        self._last_pose: Optional[list[float]] = None
+
+    def _write(self, record: dict):
+        self._file.write(json.dumps(record, separators=(",", ":")))
+        self._file.write("\n")
+        self.n_records += 1
+
+    def write_faces(self, face_detection, pose: Optional[list[float]]):
+        record = {
+            "t": time_ns(),
+            "k": FACES,
+            "s": face_detection.time_ns,
+            "f": face_detection.frame,
+            "d": [encode_detection(d) for d in face_detection.detections],
+        }
+        if pose is not None and (
+            self._last_pose is None
+            or max(abs(a - b) for a, b in zip(pose, self._last_pose))
+            > CAMERA_POSE_TOLERANCE
+        ):
+            record["c"] = pose
+            self._last_pose = pose
+        self._write(record)
+
+    def write_doa(self, direction: Optional[float], voice_activity: bool):
+        self._write(
+            {"t": time_ns(), "k": DOA, "d": direction, "v": bool(voice_activity)}
+        )
+
+    def write_message(self, channel: str):
+        self._write({"t": time_ns(), "k": MESSAGE, "c": channel})
+
+    def close(self):
+        self._file.close()
+
+
+def latest_recording() -> Optional[str]:
+    try:
+        names = [
+            name
+            for name in os.listdir(RECORDING_DIRECTORY)
+            if name.endswith(".jsonl.gz")
+        ]
+    except OSError:
+        return None
+    if not names:
+        return None
+    return max(
+        (os.path.join(RECORDING_DIRECTORY, name) for name in names),
+        key=os.path.getmtime,
+    )
+
+
+def read_recording(path: str) -> Iterator[dict]:
+    with gzip.open(path, "rt") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class PinholeCamera:
+    """A distortion free camera fitted to a pose recorded by camera_pose."""
+
+    def __init__(self, pose: list[float]):
+        pose = np.asarray(pose, dtype=float)
+        self.origin = pose[:3]
+        centre, right, bottom = (v / np.linalg.norm(v) for v in pose[3:].reshape(3, 3))
+        self.forward = centre
+        # Image axes perpendicular to the optical axis, and the tangent of half the field
+        # of view along each
+        self.x_axis, self.tan_x = self._axis(right)
+        self.y_axis, self.tan_y = self._axis(bottom)
+
+    def _axis(self, edge: np.ndarray) -> tuple[np.ndarray, float]:
+        along = edge.dot(self.forward)
+        across = edge - along * self.forward
+        length = np.linalg.norm(across)
+        return across / length, length / along
+
+    def direction(self, x: float, y: float) -> np.ndarray:
+        d = (
+            self.forward
+            + (2 * x - 1) * self.tan_x * self.x_axis
+            + (2 * y - 1) * self.tan_y * self.y_axis
+        )
+        return d / np.linalg.norm(d)
+
+    def project(self, p: np.ndarray) -> Optional[tuple[float, float]]:
+        """Normalised image coordinates of a point in robot space, or None if behind the camera."""
+        relative = p - self.origin
+        depth = relative.dot(self.forward)
+        if depth <= 0:
+            return None
+        return (
+            0.5 + relative.dot(self.x_axis) / (2 * depth * self.tan_x),
+            0.5 + relative.dot(self.y_axis) / (2 * depth * self.tan_y),
+        )
+
+
+class _Ray:
+    """The parts of a Ray3 used by the perception pipeline."""
+
+    __slots__ = ("_origin", "_direction", "direction")
+
+    def __init__(self, origin: np.ndarray, direction: np.ndarray):
+        self._origin = origin
+        self._direction = direction
+        self.direction = Vector3(direction.tolist())
+
+    def point(self, distance: float) -> Point3:
+        return Point3((self._origin + distance * self._direction).tolist())
+
+
+class _Converter:
+    def __init__(self, camera: "ReplayCamera", to_robot: bool):
+        self._camera = camera
+        self._to_robot = to_robot
+
+    def convert(self, item, sample_time_ns: Optional[int] = None):
+        camera = self._camera.camera
+        if camera is None:
+            return None
+        if self._to_robot:
+            return _Ray(camera.origin, camera.direction(item.x, item.y))
+        location = camera.project(np.asarray(item.elements, dtype=float))
+        return Point2(location) if location is not None else None
+
+
+class ReplayCamera:
+    """Stands in for system.world.converter between the recorded camera and robot space."""
+
+    def __init__(self):
+        self.camera: Optional[PinholeCamera] = None
+        self.to_robot = _Converter(self, to_robot=True)
+        self.from_robot = _Converter(self, to_robot=False)
+
+    def set_pose(self, pose: list[float]):
+        self.camera = PinholeCamera(pose)
+
+    def converter(self, from_frame, to_frame):
+        if from_frame == system.world.ROBOT_SPACE:
+            return self.from_robot
+        return self.to_robot
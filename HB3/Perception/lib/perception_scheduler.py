@@ -0,0 +1,197 @@
+"""Adaptive rate scheduling for the perception pipeline.
+
+Each stage (face processing, speaker detection, ...) declares the rate it would like to run
+at for each state of the scene. The scheduler slows stages down when the room is empty and
+speeds them up when people are present and speaking. A stage's rate is further limited so
+that it never uses more than its share of the CPU, measured from how long it has recently
+taken to run. When the machine is busy each run takes longer, and the stage degrades to a
+lower rate instead of falling behind.
+
+Stages fed by a stream of messages should put them through a LatestQueue, so that messages
+which arrive while a frame is being processed are coalesced and only the newest is handled.
+"""
+
+import asyncio
+from enum import IntEnum
+from time import monotonic, perf_counter
+from contextlib import contextmanager
+from typing import Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class Scene(IntEnum):
+    EMPTY = 0
+    PRESENT = 1
+    SPEAKING = 2
+
+
+# Fraction of one CPU core a single stage may use before its rate is reduced
+DEFAULT_CPU_BUDGET = 0.15
+
+# Smoothing of the measured per run cost of a stage
+COST_EMA_ALPHA = 0.1
+
+# Run a stage when this fraction of its period has passed, to absorb tick jitter
+PERIOD_TOLERANCE = 0.9
+
+# How long the scene must stay quieter before the rates are lowered
+SCENE_HOLD_S = 2.0
+
+
+class Stage:
+    def __init__(
+        self,
+        scheduler: "PerceptionScheduler",
+        name: str,
+        rates: dict[Scene, float],
+        cpu_budget: float = DEFAULT_CPU_BUDGET,
+    ):
+        self._scheduler = scheduler
+        self.name = name
+        self.rates = rates
+        self.cpu_budget = cpu_budget
+        # The stage never slows below the rate it runs at in an empty room
+        self.min_rate = min(rates.values())
+        self.cost_s = 0.0
+        self.last_run: Optional[float] = None
+        self.n_run = 0
+        self.n_skipped = 0
+        self.n_dropped = 0
+
+    @property
+    def target_rate(self) -> float:
+        return self.rates[self._scheduler.scene]
+
+    @property
+    def rate(self) -> float:
+        rate = self.target_rate
+        if self.cost_s > 0:
+            rate = min(rate, self.cpu_budget / self.cost_s)
+        return max(rate, self.min_rate)
+
+    def time_until_due(self, t: Optional[float] = None) -> float:
+        if self.last_run is None:
+            return 0.0
+        if t is None:
+            t = monotonic()
+        return max(0.0, self.last_run + PERIOD_TOLERANCE / self.rate - t)
+
+    def due(self, t: Optional[float] = None) -> bool:
+        """Whether the stage should run now. Counts a skipped run if not."""
+        if self.time_until_due(t) > 0:
+            self.n_skipped += 1
+            return False
+        return True
+
+    @contextmanager
+    def measure(self):
+        """Time a run of the stage."""
+        self.last_run = monotonic()
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            cost = perf_counter() - start
+            self.cost_s += COST_EMA_ALPHA * (cost - self.cost_s)
+            self.n_run += 1
+
+    def stats(self) -> dict:
+        return {
+            "rate": self.rate,
+            "target_rate": self.target_rate,
+            "cost_ms": self.cost_s * 1e3,
+            "run": self.n_run,
+            "skipped": self.n_skipped,
+            "dropped": self.n_dropped,
+        }
+
+
+class LatestQueue(Generic[T]):
+    """A queue holding only the newest item. Items replaced before being taken are dropped."""
+
+    def __init__(self, stage: Stage):
+        self._stage = stage
+        self._item: Optional[T] = None
+        self._event = asyncio.Event()
+
+    def put(self, item: T):
+        if self._item is not None:
+            self._stage.n_dropped += 1
+        self._item = item
+        self._event.set()
+
+    def get_nowait(self) -> Optional[T]:
+        item, self._item = self._item, None
+        self._event.clear()
+        return item
+
+    async def get(self) -> T:
+        while self._item is None:
+            await self._event.wait()
+        return self.get_nowait()
+
+    async def get_when_due(self) -> T:
+        """Wait for an item and for the stage to be due, then take the newest item."""
+        item = await self.get()
+        if (wait := self._stage.time_until_due()) > 0:
+            self._stage.n_skipped += 1
+            await asyncio.sleep(wait)
+            if (newer := self.get_nowait()) is not None:
+                self._stage.n_dropped += 1
+                item = newer
+        return item
+
+
+class PerceptionScheduler:
+    def __init__(self):
+        self.stages: dict[str, Stage] = {}
+        self._scene = Scene.EMPTY
+        self._scene_changed_at = monotonic()
+        self._n_people = 0
+        self._speaking = False
+
+    @property
+    def scene(self) -> Scene:
+        return self._scene
+
+    def stage(
+        self,
+        name: str,
+        rates: dict[Scene, float],
+        cpu_budget: float = DEFAULT_CPU_BUDGET,
+    ) -> Stage:
+        """Create the named stage, replacing the one left by any previous run of the script."""
+        stage = Stage(self, name, rates, cpu_budget)
+        self.stages[name] = stage
+        return stage
+
+    def update_people(self, n_people: int):
+        self._n_people = n_people
+        self._update_scene()
+
+    def update_speaking(self, speaking: bool):
+        self._speaking = speaking
+        self._update_scene()
+
+    def _update_scene(self):
+        if self._n_people == 0:
+            scene = Scene.EMPTY
+        elif self._speaking:
+            scene = Scene.SPEAKING
+        else:
+            scene = Scene.PRESENT
+        t = monotonic()
+        # Speed up straight away, but only slow down once the scene has calmed for a while
+        if scene > self._scene or (
+            scene < self._scene and t - self._scene_changed_at > SCENE_HOLD_S
+        ):
+            self._scene = scene
+        if scene >= self._scene:
+            self._scene_changed_at = t
+
+    def stats(self) -> dict:
+        return {
+            "scene": self._scene.name,
+            **{name: stage.stats() for name, stage in self.stages.items()},
+        }
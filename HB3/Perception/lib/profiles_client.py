@@ -4,6 +4,7 @@ from typing import Optional
 import aiohttp
 
 CONFIG = system.import_library("../../../Config/HB3.py").CONFIG
+face_identity_index = system.import_library("./face_identity_index.py")
 
 PROFILES_SERVER_ADDRESS = CONFIG["PROFILES_SERVER_ADDRESS"]
 
@@ -12,16 +13,82 @@ class ProfilesClient:
     MAX_N = 5
     MAX_DISTANCE = 1.0
 
+    # How often the local face identity index is refreshed from the profiles server
+    INDEX_SYNC_INTERVAL_S = 60
+    INDEX_SYNC_PATH = "/profiles/embeddings"
+
     def __init__(self):
         try:
             self.server = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=2))
         except Exception:
             self.server = None
 
+        self.index = face_identity_index.FaceIdentityIndex()
+        if PROFILES_SERVER_ADDRESS is not None:
+            self.index.load()
+        self._index_sync_task = None
+
+    def _pick_profile(self, response: list[dict]) -> Optional[dict]:
+        if len(response) == 0:
+            return None
+        if len(response) == 1:
+            return response[0]
+        else:
+            print(f"Ambiguous person: {response}")
+            return None
+
+    def _ensure_index_sync(self):
+        if self._index_sync_task is not None or self.server is None:
+            return
+        try:
+            loop = asyncio.get_event_loop()
+        except RuntimeError:
+            return
+        self._index_sync_task = loop.create_task(self._sync_index_forever())
+
+    async def _sync_index_forever(self):
+        try:
+            while self.server is not None:
+                await self.sync_index()
+                await asyncio.sleep(self.INDEX_SYNC_INTERVAL_S)
+        finally:
+            self._index_sync_task = None
+
+    async def sync_index(self) -> bool:
+        """Replace the local face identity index with the profiles known to the server."""
+        if self.server is None or PROFILES_SERVER_ADDRESS is None:
+            return False
+        try:
+            async with self.server.get(
+                PROFILES_SERVER_ADDRESS + self.INDEX_SYNC_PATH
+            ) as resp:
+                if resp.status != 200:
+                    log.warning(f"Unable to sync face identity index: {resp.status}")
+                    return False
+                profiles = await resp.json()
+        except (
+            aiohttp.client_exceptions.ClientError,
+            asyncio.exceptions.TimeoutError,
+        ) as e:
+            log.warning(f"Unable to sync face identity index: {e}")
+            return False
+        self.index.replace_all(profiles)
+        return True
+
     async def get_profile_from_face_embedding(
         self, face_embedding: str
     ) -> Optional[dict]:
-        if self.server is None or PROFILES_SERVER_ADDRESS is None:
+        if PROFILES_SERVER_ADDRESS is None:
+            return None
+        self._ensure_index_sync()
+
+        # Answer locally if possible
+        if self.index.ready:
+            response = self.index.query(face_embedding, self.MAX_N, self.MAX_DISTANCE)
+            if response is not None:
+                return self._pick_profile(response)
+
+        if self.server is None:
             return None
         try:
             # Get the face embedding
@@ -41,14 +108,9 @@ class ProfilesClient:
             print(e)
             print("Couldn't connect to server. Disconnecting.")
             self.server = None
-        print(response)
-        if len(response) == 0:
-            return None
-        if len(response) == 1:
-            return response[0]
-        else:
-            print(f"Ambiguous person: {response}")
             return None
+        print(response)
+        return self._pick_profile(response)
 
     async def add_profile(self, face_embeddings: list[str], info: dict) -> bool:
         if self.server is None or PROFILES_SERVER_ADDRESS is None:
@@ -70,6 +132,8 @@ class ProfilesClient:
             self.server = None
             return False
 
+        self.index.add(profile_id, face_embeddings)
+
         # Associate the info with the newly created profile
         return await self.update_profile_info(profile_id, info)
 
@@ -90,6 +154,7 @@ class ProfilesClient:
             print("Couldn't connect to server. Disconnecting.")
             self.server = None
             return False
+        self.index.update_info(profile_id, info)
         return True
 
     async def delete_profile(self, profile_id: int) -> bool:
@@ -109,4 +174,5 @@ class ProfilesClient:
             print("Couldn't connect to server. Disconnecting.")
             self.server = None
             return False
+        self.index.remove(profile_id)
         return True
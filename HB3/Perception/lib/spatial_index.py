@@ -0,0 +1,122 @@
+"""A spatial index over tracked world objects, rebuilt once per perception update.
+
+Positions are in the robot reference frame. Objects are kept sorted by azimuth (degrees,
+0 straight ahead and positive to the robot's left, as atan2(y, x)) and by horizontal range
+from the robot, so that angle and distance queries are binary searches. Projections into a
+camera image are computed at most once per converter and sample time.
+"""
+
+from typing import Callable, Generic, Iterable, Iterator, Optional, TypeVar
+
+import numpy as np
+
+T = TypeVar("T")
+
+
+def _wrap_degrees(angles):
+    return (np.asarray(angles) + 180) % 360 - 180
+
+
+class SpatialIndex(Generic[T]):
+    def __init__(self, objects: Iterable[T] = ()):
+        """Index objects by their current .position."""
+        self.objects: list[T] = list(objects)
+        self.positions = np.array(
+            [tuple(obj.position.elements) for obj in self.objects], dtype=float
+        ).reshape(-1, 3)
+        self.azimuths = np.degrees(
+            np.arctan2(self.positions[:, 1], self.positions[:, 0])
+        )
+        self.ranges = np.hypot(self.positions[:, 0], self.positions[:, 1])
+
+        self._azimuth_order = np.argsort(self.azimuths)
+        self._sorted_azimuths = self.azimuths[self._azimuth_order]
+        self.range_order = np.argsort(self.ranges, kind="stable")
+        self._sorted_ranges = self.ranges[self.range_order]
+        self._image_locations: dict[tuple[int, int], np.ndarray] = {}
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __iter__(self) -> Iterator[T]:
+        return iter(self.objects)
+
+    def nearest_to_angles(self, angles, max_angle: float = 180) -> list[Optional[int]]:
+        """For each azimuth, the index of the object closest in azimuth within max_angle, or None."""
+        angles = _wrap_degrees(np.asarray(angles, dtype=float).reshape(-1))
+        n = len(self.objects)
+        if n == 0:
+            return [None] * len(angles)
+        # The closest object is either side of the insertion point, wrapping around
+        right = np.searchsorted(self._sorted_azimuths, angles) % n
+        left = (right - 1) % n
+        right_diff = np.abs(_wrap_degrees(self._sorted_azimuths[right] - angles))
+        left_diff = np.abs(_wrap_degrees(self._sorted_azimuths[left] - angles))
+        closest = np.where(left_diff < right_diff, left, right)
+        diff = np.minimum(left_diff, right_diff)
+        return [
+            int(self._azimuth_order[c]) if d < max_angle else None
+            for c, d in zip(closest, diff)
+        ]
+
+    def nearest_to_angle(self, angle: float, max_angle: float = 180) -> Optional[T]:
+        """The object closest in azimuth to angle, if within max_angle degrees."""
+        (index,) = self.nearest_to_angles([angle], max_angle)
+        return self.objects[index] if index is not None else None
+
+    def within_azimuth(self, min_angle: float, max_angle: float) -> list[T]:
+        """Objects with an azimuth between min_angle and max_angle, going anticlockwise."""
+        min_angle, max_angle = _wrap_degrees([min_angle, max_angle])
+        lo = np.searchsorted(self._sorted_azimuths, min_angle, side="left")
+        hi = np.searchsorted(self._sorted_azimuths, max_angle, side="right")
+        if min_angle <= max_angle:
+            order = self._azimuth_order[lo:hi]
+        else:
+            order = np.concatenate([self._azimuth_order[lo:], self._azimuth_order[:hi]])
+        return [self.objects[i] for i in order]
+
+    def within_range(self, max_range: float) -> list[T]:
+        """Objects within max_range metres of the robot horizontally, closest first."""
+        n = np.searchsorted(self._sorted_ranges, max_range, side="right")
+        return [self.objects[i] for i in self.range_order[:n]]
+
+    def by_range(self) -> Iterator[T]:
+        """Objects in order of horizontal distance from the robot, closest first."""
+        return (self.objects[i] for i in self.range_order)
+
+    def nearest(self, predicate: Optional[Callable[[T], bool]] = None) -> Optional[T]:
+        """The object horizontally closest to the robot, optionally only of those matching predicate."""
+        return next(
+            (obj for obj in self.by_range() if predicate is None or predicate(obj)),
+            None,
+        )
+
+    def within(self, point, radius: float) -> list[T]:
+        """Objects within radius metres of a point, closest first."""
+        distances = np.linalg.norm(
+            self.positions - np.asarray(tuple(point.elements), dtype=float), axis=1
+        )
+        inside = np.flatnonzero(distances <= radius)
+        return [self.objects[i] for i in inside[np.argsort(distances[inside])]]
+
+    def image_locations(self, converter, sample_time_ns: int) -> np.ndarray:
+        """(n, 2) positions in the image of a robot space to camera converter. NaN where unknown."""
+        key = (id(converter), sample_time_ns)
+        if (locations := self._image_locations.get(key)) is None:
+            locations = np.full((len(self.objects), 2), np.nan)
+            for i, obj in enumerate(self.objects):
+                location = converter.convert(obj.position, sample_time_ns)
+                if location is not None:
+                    locations[i] = (location.x, location.y)
+            self._image_locations[key] = locations
+        return locations
+
+    def in_frame_mask(self, converter, sample_time_ns: int) -> np.ndarray:
+        """Which objects project inside the camera image (within the camera frustum)."""
+        locations = self.image_locations(converter, sample_time_ns)
+        with np.errstate(invalid="ignore"):
+            return np.all((locations >= 0) & (locations <= 1), axis=1)
+
+    def in_frame(self, converter, sample_time_ns: int) -> list[T]:
+        mask = self.in_frame_mask(converter, sample_time_ns)
+        return [obj for obj, inside in zip(self.objects, mask) if inside]
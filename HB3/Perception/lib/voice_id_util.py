@@ -1,5 +1,7 @@
 import os
 import json
+import asyncio
+import zipfile
 from time import monotonic
 from collections import deque
 
@@ -12,36 +14,156 @@ MAX_LENGTH: int = 3
 """Max number of voice ids to buffer"""
 
 JSON_FILE_PATH: str = "/var/opt/tritium/personal_data/known_voice_ids.json"
+"""Legacy file path where the known voices were stored on disk, read if NPZ_FILE_PATH does not exist"""
+
+NPZ_FILE_PATH: str = "/var/opt/tritium/personal_data/known_voice_ids.npz"
 """File path where the known voices are stored on disk"""
 
+SAVE_DEBOUNCE_S: float = 2.0
+"""Delay before writing the known voices to disk, so bursts of updates are saved once"""
+
 UNKNOWN_SPEAKER_TOKEN: str = "Unidentified Speaker"
 """Token used to represent unknown speaker"""
 
 
+class SpeakerIndex:
+    """Normalised mean embeddings of every known speaker, one row each in a contiguous matrix."""
+
+    INITIAL_CAPACITY = 16
+
+    def __init__(self):
+        self.names: list[str] = []
+        self._rows: dict[str, int] = {}
+        self._matrix: np.ndarray | None = None
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def dimension(self) -> int | None:
+        return None if self._matrix is None else self._matrix.shape[1]
+
+    def clear(self):
+        self.names, self._rows, self._matrix = [], {}, None
+
+    def set(self, name: str, mean_embedding: np.ndarray):
+        norm = np.linalg.norm(mean_embedding)
+        row_vector = mean_embedding / norm if norm > 0 else mean_embedding
+        if self._matrix is None:
+            self._matrix = np.zeros(
+                (self.INITIAL_CAPACITY, row_vector.shape[0]), dtype=np.float32
+            )
+        elif self._matrix.shape[1] != row_vector.shape[0]:
+            raise ValueError(
+                f"Voice id has dimension {row_vector.shape[0]}, expected {self._matrix.shape[1]}"
+            )
+
+        if (row := self._rows.get(name)) is None:
+            row = len(self.names)
+            if row == self._matrix.shape[0]:
+                grown = np.zeros(
+                    (2 * self._matrix.shape[0], self._matrix.shape[1]), dtype=np.float32
+                )
+                grown[:row] = self._matrix
+                self._matrix = grown
+            self.names.append(name)
+            self._rows[name] = row
+        self._matrix[row] = row_vector
+
+    def remove(self, name: str):
+        row = self._rows.pop(name)
+        last = len(self.names) - 1
+        if row != last:
+            # Move the last speaker into the gap to keep the matrix contiguous
+            last_name = self.names[last]
+            self._matrix[row] = self._matrix[last]
+            self.names[row] = last_name
+            self._rows[last_name] = row
+        self.names.pop()
+
+    def similarities(self, embedding: np.ndarray) -> np.ndarray:
+        """Cosine similarity of the embedding with every known speaker."""
+        if not self.names:
+            return np.zeros((0,), dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        if norm == 0 or embedding.shape[0] != self._matrix.shape[1]:
+            return np.zeros((len(self.names),), dtype=np.float32)
+        return self._matrix[: len(self.names)] @ (embedding / norm)
+
+    def embeddings(self) -> np.ndarray:
+        if self._matrix is None:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._matrix[: len(self.names)]
+
+
 _KNOWN_VOICE_IDS: dict[str, deque[np.ndarray]] = {}
 """Known voices stored in memory."""
 
+_SPEAKER_INDEX = SpeakerIndex()
+"""Mean embeddings of _KNOWN_VOICE_IDS, kept up to date as they change"""
+
 _LAST_HEARD: deque[np.ndarray] = deque(maxlen=MAX_LENGTH)
 """Buffer for the last N voices heard"""
 
+_save_handle: asyncio.TimerHandle | None = None
+
+
+def flush_save():
+    """Save the known voices now if a save is pending, such as when stopping."""
+    if _save_handle is not None:
+        save_known_voice_ids()
 
-def save_known_voice_ids():
-    cache: dict[str, list[float]] = {}
-    for name, ids in _KNOWN_VOICE_IDS.items():
-        cache[name] = _mean_embedding(ids).tolist()
 
-    os.makedirs(os.path.dirname(JSON_FILE_PATH), exist_ok=True)
-    with open(JSON_FILE_PATH, "w") as f:
-        json.dump(cache, f)
+def save_known_voice_ids():
+    global _save_handle
+    if _save_handle is not None:
+        _save_handle.cancel()
+        _save_handle = None
+
+    os.makedirs(os.path.dirname(NPZ_FILE_PATH), exist_ok=True)
+    # np.savez appends .npz to paths without it, so write the temporary file with the suffix
+    tmp_path = NPZ_FILE_PATH[: -len(".npz")] + ".tmp.npz"
+    np.savez(
+        tmp_path,
+        names=np.array(_SPEAKER_INDEX.names, dtype=str),
+        embeddings=np.array(
+            [_mean_embedding(_KNOWN_VOICE_IDS[n]) for n in _SPEAKER_INDEX.names],
+            dtype=np.float32,
+        ),
+    )
+    os.replace(tmp_path, NPZ_FILE_PATH)
+
+
+def _schedule_save():
+    global _save_handle
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        save_known_voice_ids()
+        return
+    if _save_handle is None:
+        _save_handle = loop.call_later(SAVE_DEBOUNCE_S, save_known_voice_ids)
 
 
 def load_know_voice_ids():
+    _KNOWN_VOICE_IDS.clear()
+    _SPEAKER_INDEX.clear()
+    try:
+        with np.load(NPZ_FILE_PATH, allow_pickle=False) as cache:
+            for name, id in zip(cache["names"], cache["embeddings"]):
+                _add_voice(str(name), id)
+        log.info(f"{len(_KNOWN_VOICE_IDS)} voice ids loaded")
+        return
+    except (IOError, KeyError, ValueError, zipfile.BadZipFile):
+        pass
     try:
         with open(JSON_FILE_PATH, "r") as f:
             cache = json.load(f)
         for name, id in cache.items():
-            update_know_voice(name, np.array(id))
+            _add_voice(name, np.array(id, dtype=np.float32))
         log.info(f"{len(cache)} voice ids loaded")
+        # Migrate to the binary format
+        _schedule_save()
     except IOError:
         log.warning("No known voices loaded")
 
@@ -50,20 +172,25 @@ def _mean_embedding(embeddings: deque[np.ndarray]) -> np.ndarray:
     return np.array(sum(embeddings) / len(embeddings))
 
 
-def _cosine_similarity(a: np.ndarray, b: np.ndarray) -> float:
-    return np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b))
-
-
 def get_voice_id_head() -> np.ndarray | None:
     return _LAST_HEARD[-1] if _LAST_HEARD else None
 
 
-def update_know_voice(speaker_name: str, voice_id: np.ndarray):
+def _add_voice(speaker_name: str, voice_id: np.ndarray):
+    if _SPEAKER_INDEX.dimension not in (None, voice_id.shape[0]):
+        log.warning("Voice id dimension changed. Dropping all known voices.")
+        _KNOWN_VOICE_IDS.clear()
+        _SPEAKER_INDEX.clear()
     if speaker_name in _KNOWN_VOICE_IDS:
         _KNOWN_VOICE_IDS[speaker_name].append(voice_id)
     else:
         _KNOWN_VOICE_IDS[speaker_name] = deque([voice_id], maxlen=MAX_LENGTH)
-    save_known_voice_ids()
+    _SPEAKER_INDEX.set(speaker_name, _mean_embedding(_KNOWN_VOICE_IDS[speaker_name]))
+
+
+def update_know_voice(speaker_name: str, voice_id: np.ndarray):
+    _add_voice(speaker_name, voice_id)
+    _schedule_save()
 
 
 def get_known_voices() -> list[str]:
@@ -75,7 +202,8 @@ def remove_voice(speaker_name: str):
         _KNOWN_VOICE_IDS.pop(speaker_name)
     except KeyError:
         raise RuntimeError(f"{speaker_name} is not a known voice")
-    save_known_voice_ids()
+    _SPEAKER_INDEX.remove(speaker_name)
+    _schedule_save()
 
 
 def process_voice_id(voice_ids: list[list[float]]) -> str:
@@ -83,22 +211,23 @@ def process_voice_id(voice_ids: list[list[float]]) -> str:
 
     rval: str | None = None
     for embedding in voice_ids:  # right now only one embedding is returned by SP
-
         similarity_trashed = VOICE_ID_THRESHOLD
-        emb = np.array(embedding)
+
+        emb = np.array(embedding, dtype=np.float32)
 
         # populated _LAST_HEARD
         _LAST_HEARD.append(emb)
 
-        for name, known_ids in _KNOWN_VOICE_IDS.items():
-            if not known_ids:
-                continue
-            mean_embedding = _mean_embedding(known_ids)
-            similarity = _cosine_similarity(emb, mean_embedding)
-            log.info(f"Voice similarity with {name}: {similarity}")
-            if similarity > similarity_trashed:
-                rval = name
-                similarity_trashed = similarity
+        similarities = _SPEAKER_INDEX.similarities(emb)
+        if len(similarities) == 0:
+            continue
+        best = int(np.argmax(similarities))
+        log.info(
+            f"Voice similarity with {_SPEAKER_INDEX.names[best]}: {similarities[best]}"
+        )
+        if similarities[best] > similarity_trashed:
+            rval = _SPEAKER_INDEX.names[best]
+            similarity_trashed = similarities[best]
     rval = UNKNOWN_SPEAKER_TOKEN if rval is None else rval
     log.info(f"process_voice_id() took: {monotonic() - start_time} seconds")
-    return rval
\ No newline at end of file
+    return rval
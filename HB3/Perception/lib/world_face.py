@@ -4,7 +4,7 @@ from math import pi, exp, pow, sin, acos, sqrt, atan2
 from typing import List, Optional
 from collections import deque
 
-from PIL.Image import Image
+import numpy as np
 from tritium.world.geom import Ray3, Point2, Point3, Matrix3, Matrix4, Vector2
 from tritium.world.frames import FrameConverter
 
@@ -28,6 +28,8 @@ perception_state = system.import_library("../perception_state.py").perception_st
 
 face_embedding_client_module = system.import_library("./face_embedding_client.py")
 profiles_client_module = system.import_library("./profiles_client.py")
+face_crop_quality = system.import_library("./face_crop_quality.py")
+Frame = system.import_library("./frame_store.py").Frame
 
 face_embedding_client = face_embedding_client_module.FaceEmbeddingClient()
 profiles_client = profiles_client_module.ProfilesClient()
@@ -151,6 +153,10 @@ class WorldFaceObservation:
 class WorldFace(WorldObject):
     # Maximum number of times to send an image of a face for identification
     MAX_N_SENDS = 10
+    # Number of best crops held back per face waiting to be sent for identification
+    CROP_BUFFER_SIZE = 3
+    # Crops scoring at least this are sent straight away rather than waiting for the buffer to fill
+    MIN_IMMEDIATE_SEND_SCORE = 0.4
     ANGLE_UPDATE_MASS = 0.2
 
     # Default distance between eyes from fronton
@@ -218,6 +224,8 @@ class WorldFace(WorldObject):
         self.info = None
         self.profile_id = None
         self.face_embeddings = []
+        self.n_sends = 0
+        self.crop_buffer = face_crop_quality.BestCropBuffer(self.CROP_BUFFER_SIZE)
         self.confidences = deque(maxlen=WorldFace.CONFIDENCES_LEN)
         self.confidences.appendleft(confidence)
 
@@ -396,30 +404,60 @@ class WorldFace(WorldObject):
 
     def server_task_done_cb(self, *args):
         self.update_coroutine = None
+        self._send_best_crop()
 
-    def add_image(self, image_observation: types.FaceDetection, image: Image):
-        if image is not None:
-            if (
-                (self.observations_to_mature == 0)
-                and (len(self.face_embeddings) <= self.MAX_N_SENDS)
-                and (self.update_coroutine is None)
-                and (self.info is None)
-            ):
-                image_width, image_height = image.size
-                l, t, w, h = image_observation.rect
-                left = l * image_width
-                top = t * image_height
-                right = left + w * image_width
-                bottom = top + h * image_height
-                image_cropped = image.crop((left, top, right, bottom))
-
-                loop = asyncio.get_event_loop()
-
-                # Update the face in the background
-                self.update_coroutine = loop.create_task(
-                    self.update_from_image(image_cropped)
-                )
-                self.update_coroutine.add_done_callback(self.server_task_done_cb)
+    def _needs_identification(self) -> bool:
+        return (
+            (self.observations_to_mature == 0)
+            and (self.n_sends < self.MAX_N_SENDS)
+            and (self.info is None)
+        )
+
+    def wants_image(self, detection: DetectedFace) -> bool:
+        """Whether a crop of this detection could be worth sending for identification.
+
+        Only uses the detection geometry, so the image need not be decoded to check.
+        """
+        return self._needs_identification() and self.crop_buffer.would_accept(
+            face_crop_quality.geometry_score(detection, self.yaw)
+        )
+
+    def add_image(self, image_observation: DetectedFace, frame: Frame):
+        if frame is None or not self._needs_identification():
+            return
+        geometry_score = face_crop_quality.geometry_score(image_observation, self.yaw)
+        if geometry_score <= 0 or not self.crop_buffer.would_accept(geometry_score):
+            return
+        try:
+            image_cropped = frame.crop(image_observation.rect).image
+        except OSError as e:
+            log.warning(f"Unable to decode camera frame: {e}")
+            return
+        score = geometry_score * face_crop_quality.sharpness_score(image_cropped)
+        self.crop_buffer.push(score, image_cropped)
+        self._send_best_crop()
+
+    def _send_best_crop(self):
+        if (
+            self.update_coroutine is not None
+            or self.info is not None
+            or self.n_sends >= self.MAX_N_SENDS
+            or len(self.crop_buffer) == 0
+        ):
+            return
+        if not (
+            self.crop_buffer.full
+            or self.crop_buffer.best_score >= self.MIN_IMMEDIATE_SEND_SCORE
+        ):
+            return
+        _, image_cropped = self.crop_buffer.pop_best()
+        self.n_sends += 1
+
+        loop = asyncio.get_event_loop()
+
+        # Update the face in the background
+        self.update_coroutine = loop.create_task(self.update_from_image(image_cropped))
+        self.update_coroutine.add_done_callback(self.server_task_done_cb)
 
     async def update_from_image(self, image):
         # Get the face embedding
@@ -521,16 +559,40 @@ class WorldFace(WorldObject):
 
     def proxy_likelihood(self, camera_observation):
         """Gaussian PDF is too sensitive... Use distance from point as a proxy instead."""
-        detected_position = camera_observation.center_ray.point(
-            camera_observation.estimated_distance
-        )
-        error = (detected_position - self.position_filter.position_estimate).length
-        if error < self.SAME_OBJECT_DISTANCE_THRESHOLD_M:
-            return (
-                self.SAME_OBJECT_DISTANCE_THRESHOLD_M - error
-            ) / self.SAME_OBJECT_DISTANCE_THRESHOLD_M
-        else:
-            return 0
+        return float(self.proxy_likelihoods([self], [camera_observation])[0, 0])
 
     def joint_probability(self, camera_observation):
-        return self.proxy_likelihood(camera_observation) * self.confidence
\ No newline at end of file
+        return self.proxy_likelihood(camera_observation) * self.confidence
+
+    @classmethod
+    def proxy_likelihoods(
+        cls, faces: list["WorldFace"], camera_observations: list
+    ) -> np.ndarray:
+        """The proxy_likelihood of every face for every observation, as a (faces, observations) array."""
+        positions = np.array(
+            [tuple(face.position.elements) for face in faces], dtype=float
+        ).reshape(-1, 3)
+        detected_positions = np.array(
+            [
+                tuple(
+                    observation.center_ray.point(
+                        observation.estimated_distance
+                    ).elements
+                )
+                for observation in camera_observations
+            ],
+            dtype=float,
+        ).reshape(-1, 3)
+        errors = np.linalg.norm(
+            positions[:, None, :] - detected_positions[None, :, :], axis=2
+        )
+        threshold = cls.SAME_OBJECT_DISTANCE_THRESHOLD_M
+        return np.maximum(0, (threshold - errors) / threshold)
+
+    @classmethod
+    def joint_probabilities(
+        cls, faces: list["WorldFace"], camera_observations: list
+    ) -> np.ndarray:
+        """The joint_probability of every face for every observation, as a (faces, observations) array."""
+        confidences = np.array([face.confidence for face in faces], dtype=float)
+        return cls.proxy_likelihoods(faces, camera_observations) * confidences[:, None]
\ No newline at end of file
@@ -1,43 +1,37 @@
-import base64
 import asyncio
 from typing import Optional
 
+frame_store = system.import_library("./lib/frame_store.py")
+perception_scheduler = system.import_library("./lib/perception_scheduler.py")
+spatial_index = system.import_library("./lib/spatial_index.py")
+
 DEFAULT_FACE_HEIGHT = 1.7  # In meters
 FACE_HEIGHT_EXP_MASS = 0.9
 
 
 class PerceptionState:
-    last_image_bytes: Optional[bytes] = None
-    _last_good_image_bytes: Optional[bytes] = None
-    _last_good_image_b64: Optional[str] = None
     average_face_height: float = DEFAULT_FACE_HEIGHT
 
     def __init__(self):
-        self._last_good_image_bytes = None
-        self._last_good_image_b64 = None
+        self.frames = frame_store.FrameStore()
+        self.scheduler = perception_scheduler.PerceptionScheduler()
+        # Rebuilt from world_faces after each face update
+        self.face_index = spatial_index.SpatialIndex()
 
     @property
-    def last_good_image_b64(self):
-        if self._last_good_image_b64 is not None:
-            return self._last_good_image_b64
-        elif self._last_good_image_bytes is not None:
-            return f"data:image/jpeg;base64,{base64.b64encode(self._last_good_image_bytes).decode('utf-8')}"
-        else:
-            return None
-
-    @last_good_image_b64.setter
-    def last_good_image_b64(self, value: Optional[str]):
-        self._last_good_image_b64 = value
-        self._last_good_image_bytes = None
+    def last_image_bytes(self) -> Optional[bytes]:
+        frame = self.frames.latest()
+        return frame.data if frame is not None else None
 
     @property
-    def last_good_image_bytes(self):
-        return self._last_good_image_bytes
+    def last_good_image_b64(self) -> Optional[str]:
+        frame = self.frames.latest_good()
+        return frame.b64 if frame is not None else None
 
-    @last_good_image_bytes.setter
-    def last_good_image_bytes(self, value: Optional[bytes]):
-        self._last_good_image_b64 = None
-        self._last_good_image_bytes = value
+    @property
+    def last_good_image_bytes(self) -> Optional[bytes]:
+        frame = self.frames.latest_good()
+        return frame.data if frame is not None else None
 
     def update_face_height(self, height):
         self.average_face_height = (
@@ -47,6 +41,9 @@ class PerceptionState:
 
     world_faces = set()
 
+    def rebuild_face_index(self):
+        self.face_index = spatial_index.SpatialIndex(self.world_faces)
+
     faces_being_dropped = set()
 
     def drop_face(self, face):
@@ -3,6 +3,7 @@ from time import time as time_unix
 from tritium.world.geom import Point3
 
 TYPES = system.import_library("../lib/types.py")
+profiler = system.import_library("../lib/profiler.py")
 speech_publisher = system.world.publish(
     "ameca_speech",
     TYPES.SpeechBubble,
@@ -24,12 +25,14 @@ CLEARING_ITEM = TYPES.SpeechBubble(None, ROBOT_HEAD_POSITION, -1)
 class Activity:
     last_tts_item_id = None
 
+    @profiler.profiled_messages(__file__)
     def on_message(self, channel, message):
         if channel == "tts_item_finished":
             said, id_ = message
             speech_publisher.write(TYPES.SpeechBubble(said, ROBOT_HEAD_POSITION, id_))
 
     @system.tick(fps=10)
+    @profiler.profiled_tick(__file__, fps=10)
     def on_tick(self):
         time = time_unix()
         if ret := TextToSpeechNodeClient.get_current_sentence(time):
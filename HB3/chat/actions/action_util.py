@@ -1,6 +1,6 @@
 import re
 from abc import abstractmethod
-from typing import Any, Type, Callable, Awaitable, TypeAlias
+from typing import Any, Type, Callable, Hashable, Awaitable, TypeAlias
 from asyncio import iscoroutinefunction
 from contextvars import ContextVar
 
@@ -37,6 +37,28 @@ class ActionBuilder:
         """This will be call on every interaction trigger to update the action"""
         pass
 
+    def state_version(self) -> Hashable | None:
+        """A value which changes whenever factory() would build different actions.
+
+        While it is unchanged, actions() reuses the actions from the last call of factory().
+        None (the default) means the builder cannot tell, so factory() is called every time.
+        """
+        return None
+
+    def actions(self) -> list[Action]:
+        """The current actions of this builder, only calling factory() when its state changes"""
+        version = self.state_version()
+        cached = getattr(self, "_cached_actions", None)
+        if version is not None and cached is not None and cached[0] == version:
+            return cached[1]
+        actions = self.factory()
+        self._cached_actions = (version, actions) if version is not None else None
+        return actions
+
+    def invalidate(self):
+        """Build the actions again on the next call of actions()"""
+        self._cached_actions = None
+
 
 class ActionRegistry:
 
@@ -117,4 +139,6 @@ class ActionRegistry:
             )
 
     def reset(self):
-        [b.reset() for _, b in self.active_builders.items()]
\ No newline at end of file
+        for b in self.active_builders.values():
+            b.reset()
+            b.invalidate()
\ No newline at end of file
@@ -66,6 +66,9 @@ class GetConversationalTopic(ActionBuilder):
     def _compleat_iteration_cb(self) -> None:
         self.iteration_compleat = True
 
+    def state_version(self) -> tuple[str, ...]:
+        return tuple(system.persona_manager.current_persona.topics or ())
+
     def factory(self) -> list[Action]:
         active_topic_list: list[str] | None = (
             system.persona_manager.current_persona.topics
@@ -85,11 +85,21 @@ class SearchKnowledgeBase(ActionBuilder):
             self._headers = {}
         self._timeout = aiohttp.ClientTimeout(total=3)
 
+    @staticmethod
+    def _get_collections_info() -> list[dict]:
+        return asdict(RAGResources.RAGCollectionInfoList.get()).get(
+            "rag_collection", []
+        )
+
+    def state_version(self) -> tuple:
+        return tuple(
+            (info["collection_id"], info["collection_name"], info["description"])
+            for info in self._get_collections_info()
+        )
+
     def factory(self) -> list[Action]:
 
-        _collections_info: list[dict] = asdict(
-            RAGResources.RAGCollectionInfoList.get()
-        ).get("rag_collection", [])
+        _collections_info: list[dict] = self._get_collections_info()
         if self._service_config_query is None or not _collections_info:
             return []
 
@@ -150,13 +160,23 @@ class SearchKnowledgeBase(ActionBuilder):
 
 @ActionRegistry.register_builder
 class RememberVoiceWithName(ActionBuilder):
-    def factory(self) -> list[Action]:
-        self._voice_id = system.unstable.stash.get_local(
+    @staticmethod
+    def _get_voice_id_enabled():
+        return system.unstable.stash.get_local(
             "/profile/nodes/speech_recognition/config/service_proxy_config/voice_id",
             default=False,
             required=False,
         )
 
+    def state_version(self) -> tuple:
+        return (
+            bool(self._get_voice_id_enabled()),
+            tuple(VOICE_ID_UTIL.get_known_voices()),
+        )
+
+    def factory(self) -> list[Action]:
+        self._voice_id = self._get_voice_id_enabled()
+
         if not self._voice_id:
             return []
 
@@ -274,6 +294,9 @@ class ChangeModeOfOperation(ActionBuilder):
     def __init__(self, modes: list[str]):
         self.modes: tuple[str] = tuple(modes)
 
+    def state_version(self) -> tuple[str]:
+        return self.modes
+
     def factory(self) -> list[Action]:
         if not self.modes:
             return []
@@ -2,13 +2,18 @@
 Log all the events which occurs in the short term.
 """
 
+import os
 import json
 import uuid
+import heapq
 import weakref
 from abc import abstractmethod
+from bisect import bisect_left
+from itertools import islice
+from collections import defaultdict, deque
 from time import time as time_unix
 from typing import Literal, ClassVar, Optional
-from dataclasses import asdict, dataclass
+from dataclasses import dataclass
 
 PERSONA_UTIL = system.import_library("../../lib/persona_util.py")
 TYPES = system.import_library("../../lib/types.py")
@@ -16,6 +21,16 @@ TYPES = system.import_library("../../lib/types.py")
 
 DEFAULT_LOG_COLOR = "white"
 
+# The most events held in memory by an InteractionHistory. Beyond this the oldest are
+# archived (if the history has an archive) and dropped, ARCHIVE_BATCH at a time.
+MAX_HISTORY_ITEMS = 2000
+ARCHIVE_BATCH = 200
+ARCHIVE_DIRECTORY = "/var/opt/tritium/interaction_history"
+
+# Event attributes InteractionHistory indexes, as well as event types. They are expected
+# not to change once an event has been added.
+INDEXED_ATTRIBUTES = ("function_name", "call_id", "person")
+
 
 @dataclass
 class TTSEventData:
@@ -76,6 +91,19 @@ class InteractionEvent:
     def try_conflate(self, next_event) -> Optional["InteractionEvent"]:
         return None
 
+    @property
+    def has_messages(self) -> bool:
+        """Whether the event can appear in the message list. Others are skipped over."""
+        return self.openai_role is not None
+
+    def render_state(self):
+        """A value which changes whenever to_messages() would return something different.
+
+        Events are rendered once and reused while this is unchanged. None means the
+        rendering depends on the time, so it is never reused.
+        """
+        return ()
+
     def to_event_data(self):
         return InteractionEventData(
             self.interaction_type,
@@ -210,6 +238,9 @@ class ToolCallEvent(InteractionEvent):
             return "\n".join(res_text)
         return
 
+    def render_state(self):
+        return len(self._responses) if self._responses else 0
+
     def to_ui_text(self) -> str | None:
         """
         We give to_text to the LLM sometimes and if we include the function name and arguments,
@@ -301,6 +332,14 @@ class TTSEvent(InteractionEvent):
             return self.speech_item.speech
         return said
 
+    @property
+    def has_messages(self) -> bool:
+        return not self.speech_item.is_thinking
+
+    def render_state(self):
+        # What has been said so far changes with time until the speech is finished
+        return self.speech_item.speech if self._finished else None
+
     def stop(self, time):
         if not self._finished:
             self.speech_item.speech = self.get_said_at_time(time)
@@ -423,6 +462,10 @@ class SpeechRecognisedEvent(InteractionEvent):
             else f"User said: {self.speech}"
         )
 
+    def render_state(self):
+        # The speech is sometimes amended after the event is added
+        return self.speech, self.speaker
+
     def to_messages(self) -> Optional[list[dict]]:
 
         text: str = f"<{self.speaker}>: " + self.speech if self.speaker else self.speech
@@ -532,6 +575,38 @@ class InteractionItem:
     event: InteractionEvent
 
 
+class _MessageRun:
+    """Consecutive events which are conflated into one, and their rendered messages."""
+
+    __slots__ = ("events", "_state", "_event", "_messages")
+
+    def __init__(self, event: InteractionEvent):
+        self.events: list[InteractionEvent] = [event]
+        self._state = None
+        self._event: Optional[InteractionEvent] = None
+        self._messages: Optional[list[dict]] = None
+
+    def accepts(self, event: InteractionEvent) -> bool:
+        return self.events[-1].try_conflate(event) is not None
+
+    def render(self) -> tuple[InteractionEvent, Optional[list[dict]]]:
+        """The conflated event and its messages, rendered again only if they have changed."""
+        state = tuple(event.render_state() for event in self.events)
+        if self._state is not None and state == self._state:
+            return self._event, self._messages
+        conflated = self.events[0]
+        for event in self.events[1:]:
+            conflated = conflated.try_conflate(event) or event
+        messages = conflated.to_messages()
+        if None in state:
+            self._state = None
+        else:
+            self._state, self._event, self._messages = state, conflated, messages
+        return conflated, messages
+
+
+_MISSING = object()
+
 _history_hook_keys: tuple[str, ...] = ("ASR", "TTS", "non_verbal")
 
 
@@ -548,8 +623,30 @@ class InteractionHistory:
     ) -> list["InteractionHistory"]:
         return [v for _, v in cls._HISTORY_HOOK_REGISTRY[type].items()]
 
-    def __init__(self) -> None:
-        self._history: list[InteractionItem] = []
+    def __init__(
+        self,
+        max_items: int = MAX_HISTORY_ITEMS,
+        archive_path: Optional[str] = None,
+    ) -> None:
+        """
+        Args:
+            max_items: the most events to hold in memory.
+            archive_path: a file to append the text of events dropped from memory to.
+                If None, they are discarded.
+        """
+        self._history: deque[InteractionItem] = deque()
+        # Events with messages, grouped as they are conflated in the message list
+        self._runs: deque[_MessageRun] = deque()
+        # Positions of events by type, and by (attribute, value) of INDEXED_ATTRIBUTES.
+        # Positions count from the first event ever added, so they are unchanged by
+        # dropping the oldest events. _first_position is that of self._history[0].
+        self._first_position = 0
+        self._by_type: defaultdict[type, list[int]] = defaultdict(list)
+        self._by_attribute: defaultdict[tuple[str, object], list[int]] = defaultdict(
+            list
+        )
+        self._max_items = max_items
+        self._archive_path = archive_path
         self._id: str = str(uuid.uuid4())
 
     def __getitem__(self, idx):
@@ -570,7 +667,103 @@ class InteractionHistory:
                 pass
 
     def pop(self, index: int) -> InteractionItem:
-        return self._history.pop(index)
+        item = self._history[index]
+        del self._history[index]
+        self._rebuild_runs()
+        self._rebuild_indexes()
+        return item
+
+    def _index(self, event: InteractionEvent, position: int):
+        self._by_type[type(event)].append(position)
+        for name in INDEXED_ATTRIBUTES:
+            if (value := getattr(event, name, None)) is not None:
+                self._by_attribute[(name, value)].append(position)
+
+    def _rebuild_indexes(self):
+        self._first_position = 0
+        self._by_type.clear()
+        self._by_attribute.clear()
+        for position, item in enumerate(self._history):
+            self._index(item.event, position)
+
+    def _prune_indexes(self):
+        """Forget the positions of events which have been dropped."""
+        for index in (self._by_type, self._by_attribute):
+            for key, positions in list(index.items()):
+                del positions[: bisect_left(positions, self._first_position)]
+                if not positions:
+                    del index[key]
+
+    def _item_at(self, position: int) -> InteractionItem:
+        return self._history[position - self._first_position]
+
+    def _candidate_positions(
+        self, interaction_event: type[InteractionEvent], att_dict: dict
+    ) -> list[int]:
+        """Ascending positions of the events find() needs to check."""
+        by_attribute = []
+        for name, value in att_dict.items():
+            if name in INDEXED_ATTRIBUTES:
+                try:
+                    by_attribute.append(self._by_attribute.get((name, value), []))
+                except TypeError:  # Unhashable value
+                    pass
+        if by_attribute:
+            return min(by_attribute, key=len)
+        by_type = [
+            positions
+            for event_type, positions in self._by_type.items()
+            if issubclass(event_type, interaction_event)
+        ]
+        if len(by_type) == 1:
+            return by_type[0]
+        return list(heapq.merge(*by_type))
+
+    def _add_to_runs(self, event: InteractionEvent):
+        if not event.has_messages:
+            return
+        if self._runs and self._runs[-1].accepts(event):
+            self._runs[-1].events.append(event)
+        else:
+            self._runs.append(_MessageRun(event))
+
+    def _rebuild_runs(self):
+        self._runs.clear()
+        for item in self._history:
+            self._add_to_runs(item.event)
+
+    def _drop_oldest(self, n: int):
+        dropped = [self._history.popleft() for _ in range(min(n, len(self._history)))]
+        self._first_position += len(dropped)
+        self._prune_indexes()
+        for item in dropped:
+            if self._runs and self._runs[0].events[0] is item.event:
+                self._runs[0].events.pop(0)
+                if not self._runs[0].events:
+                    self._runs.popleft()
+                else:
+                    self._runs[0]._state = None
+        if self._archive_path is not None:
+            self._archive(dropped)
+
+    def _archive(self, items: list[InteractionItem]):
+        try:
+            os.makedirs(os.path.dirname(self._archive_path), exist_ok=True)
+            with open(self._archive_path, "a") as f:
+                for item in items:
+                    if (text := item.event.to_text()) is not None:
+                        f.write(
+                            json.dumps(
+                                {
+                                    "time": item.event_time_s,
+                                    "type": item.event.interaction_type,
+                                    "text": text,
+                                }
+                            )
+                            + "\n"
+                        )
+        except OSError as e:
+            log.warning(f"Unable to archive interaction history: {e}")
 
     def to_text(self, max_len: Optional[int] = None) -> str:
         """Get history as line separated events.
@@ -600,43 +793,44 @@ class InteractionHistory:
     def to_message_list(self, max_len: Optional[int] = None) -> list[dict]:
         """Get history as list of messages (for ChatCompletion API).
 
+        Events are conflated as they are added, and their messages are only rendered
+        again when they change, so this costs O(max_len) rather than O(history).
+
         Args:
             max_len: maximum number of events to pull. If None, there is no limit. Defaults to None.
 
         Returns:
             The interaction history as message list.
         """
-        if not self._history:
-            return []
         messages: list[dict] = []
-        last_event: Optional[InteractionEvent] = self._history[-1].event
-        for item in reversed(self._history[:-1]):  # iterate history in reverse order
-            if item.event.to_messages() is None:
-                continue
-            # Conflate messages of the same type to avoid artifacts from streaming tts
-            # We want 1 message per user.
-            if (conflated := item.event.try_conflate(last_event)) is not None:
-                last_event = conflated
+
+        def add(new_messages: Optional[list[dict]]) -> bool:
+            """Add messages if they fit, returning whether there is room for more."""
+            if new_messages is None:
+                return True
+            new_len = len(messages) + len(new_messages)
+            if max_len is not None and new_len > max_len:
+                return False
+            messages.extend(new_messages)
+            return max_len is None or new_len < max_len
+
+        # The latest run not yet added, which earlier runs may still be conflated into if
+        # only events without messages came between them
+        last_event: Optional[InteractionEvent] = None
+        last_messages: Optional[list[dict]] = None
+        for run in reversed(self._runs):  # iterate history in reverse order
+            event, run_messages = run.render()
+            if run_messages is None:
                 continue
-            elif (last_event_messages := last_event.to_messages()) is not None:
-                if max_len is None:
-                    messages.extend(last_event_messages)
-                else:
-                    new_len = len(messages) + len(last_event_messages)
-                    if new_len > max_len:
-                        break
-                    messages.extend(last_event_messages)
-                    if new_len == max_len:
-                        break
-
-            last_event = item.event
-        else:
             if last_event is not None:
-                last_event_messages = last_event.to_messages()
-                if last_event_messages is not None and (
-                    not max_len or len(messages) + len(last_event_messages) <= max_len
-                ):
-                    messages.extend(last_event_messages)
+                if (conflated := event.try_conflate(last_event)) is not None:
+                    last_event, last_messages = conflated, conflated.to_messages()
+                    continue
+                if not add(last_messages):
+                    break
+            last_event, last_messages = event, run_messages
+        else:
+            add(last_messages)
 
         return messages[::-1]
 
@@ -649,22 +843,33 @@ class InteractionHistory:
         Returns:
             The interaction history as line-separated events.
         """
-        try:
-            start_point = next(
-                len(self._history) - i
-                for i, item in enumerate(reversed(self._history))
-                if item.event == PersonEntryEvent(person_name)
-            )
-        except StopIteration:
+        positions = self._by_attribute.get(("person", person_name), [])
+        entry = next(
+            (
+                i
+                for i in range(len(positions) - 1, -1, -1)
+                if type(self._item_at(positions[i]).event).__name__
+                == "PersonEntryEvent"
+            ),
+            None,
+        )
+        if entry is None:
             return None
+        start = positions[entry] - self._first_position + 1
+        stop = next(
+            (
+                position - self._first_position
+                for position in islice(positions, entry + 1, None)
+                if type(self._item_at(position).event).__name__ == "PersonExitEvent"
+            ),
+            None,
+        )
 
         items = []
         person_has_spoken = False
-        for item in self._history[start_point:]:
+        for item in islice(self._history, start, stop):
             if type(item.event).__name__ == "SpeechRecognisedEvent":
                 person_has_spoken = True
-            if item.event == PersonExitEvent(person_name):
-                break
             if (text := item.event.to_text()) is not None:
                 items.append(text)
         if not person_has_spoken:
@@ -676,7 +881,11 @@ class InteractionHistory:
         if not skip_emit and interaction_event.event_emitter:
             if event_data := interaction_event.to_event_data():
                 interaction_event.event_emitter.emit(event_data)
+        self._index(interaction_event, self._first_position + len(self._history))
         self._history.append(InteractionItem(event_time_s, interaction_event))
+        self._add_to_runs(interaction_event)
+        if len(self._history) > self._max_items:
+            self._drop_oldest(ARCHIVE_BATCH)
 
     def find(
         self,
@@ -688,22 +897,21 @@ class InteractionHistory:
         Return the first InteractionEvent that matches the type, and attribute in `att_dict`
         eg. {"function_name": "pog", "function_arguments": "max"} will only match if the attribute  `function_name` is "pog" and `function_arguments` is "max"
         """
-        history = self._history if not reverse_order else reversed(self._history)
-        for i, hist in enumerate(history):
-            if isinstance(hist.event, interaction_event):
-                original_dict = asdict(hist.event)
-                sub_set = {k: original_dict[k] for k in att_dict}
-
-                if sub_set == att_dict:
-                    index = len(self._history) - i - 1 if reverse_order else i
-                    return index, hist
+        positions = self._candidate_positions(interaction_event, att_dict)
+        for position in reversed(positions) if reverse_order else positions:
+            hist = self._item_at(position)
+            if isinstance(hist.event, interaction_event) and all(
+                getattr(hist.event, k, _MISSING) == v for k, v in att_dict.items()
+            ):
+                return position - self._first_position, hist
         return None
 
     def reset(self):
         self._history.clear()
+        self._runs.clear()
+        self._rebuild_indexes()
 
     def last_recognized_speech_event(self) -> Optional[SpeechRecognisedEvent]:
-        for item in reversed(self._history):
-            if isinstance(item.event, SpeechRecognisedEvent):
-                return item.event
+        if found := self.find(SpeechRecognisedEvent):
+            return found[1].event
         return None
\ No newline at end of file
@@ -64,7 +64,10 @@ async def update_from_conversation(person_object):
             {"role": "user", "content": user_prompt},
         ]
         response = await llm_interface.run_chat(
-            model="gpt-4-0613", messages=messages, functions=FUNCTIONS
+            model="gpt-4-0613",
+            messages=messages,
+            functions=FUNCTIONS,
+            purpose="update profile",
         )
 
         async def handle_function(fun_call):
@@ -7,6 +7,7 @@ CONFIG = system.import_library("../../../Config/Chat.py").CONFIG
 
 llm_interface = system.import_library("../../lib/llm/llm_interface.py")
 INTERACTION_HISTORY = system.import_library("../knowledge/interaction_history.py")
+EXPRESSION_CLASSIFIER = system.import_library("./expression_classifier.py")
 
 
 def find_matching_pattern(text: str, pattern_list: List[str]) -> Optional[str]:
@@ -46,6 +47,19 @@ class TTSFaceExpression:
         )
         if self.default not in self.expressions:
             self.expressions = [default_expression] + self.expressions
+        self.classifier = EXPRESSION_CLASSIFIER.ExpressionClassifier(
+            self.expressions, self.default
+        )
+
+    def classify(
+        self, msg: str, language_code: Optional[str] = None
+    ) -> EXPRESSION_CLASSIFIER.Classification:
+        """Choose an expression immediately, from the cache or keywords in msg.
+
+        If the classification is ambiguous, determine_tts_face_expression can be awaited
+        for a better one.
+        """
+        return self.classifier.classify(msg, language_code)
 
     async def determine_tts_face_expression(
         self,
@@ -53,7 +67,14 @@ class TTSFaceExpression:
         interactions: Optional[INTERACTION_HISTORY.InteractionHistory] = None,
         gpt_model="gpt-4o-mini",
         parent_item_id: Optional[str] = None,
+        language_code: Optional[str] = None,
+        classification: Optional[EXPRESSION_CLASSIFIER.Classification] = None,
     ) -> Optional[str]:
+        # The classification of msg, if the caller already has it
+        if classification is None:
+            classification = self.classify(msg, language_code)
+        if not classification.ambiguous:
+            return classification.expression
 
         context = f"Context:\n{interactions.to_text(10)}\n" if interactions else ""
 
@@ -82,6 +103,8 @@ Only ever respond with an exact facial expressions and no more characters.
             )
             reply: str = response["content"] if response is not None else ""
             result = find_matching_pattern(reply, self.expressions)
+            if result is not None:
+                self.classifier.remember(msg, result)
 
         except Exception:
             log.exception("determine_tts_face_expression Error")
@@ -1,4 +1,6 @@
 import re
+import math
+import weakref
 from typing import List, Optional
 
 ROBOT_STATE = system.import_library("../../robot_state.py")
@@ -6,6 +8,16 @@ robot_state = ROBOT_STATE.state
 
 llm_interface = system.import_library("../../lib/llm/llm_interface.py")
 INTERACTION_HISTORY = system.import_library("../knowledge/interaction_history.py")
+LANGUAGE_IDENTIFIER = system.import_library("./language_identifier.py")
+
+# Text the local identifier is unsure of is taken to be in the last language of the
+# conversation, if that scores within this much of the best. Otherwise the LLM decides.
+STICKY_MARGIN = 0.5
+
+# The last language identified in each conversation
+_conversation_languages: weakref.WeakKeyDictionary[
+    INTERACTION_HISTORY.InteractionHistory, str
+] = weakref.WeakKeyDictionary()
 
 
 def find_matching_pattern(text: str, pattern_list: List[str]) -> Optional[str]:
@@ -56,4 +68,42 @@ Only ever respond with an exact language code and no more characters.
     except Exception as e:
         log.warning(f"determineLangCode Error: {e}")
         result = "eng"
-    return result
\ No newline at end of file
+    return result
+
+
+async def detectLangCode(
+    msg: str,
+    interactions: Optional[INTERACTION_HISTORY.InteractionHistory] = None,
+    parent_item_id: Optional[str] = None,
+) -> Optional[str]:
+    """Identify the language of msg locally, only asking the LLM when unsure.
+
+    The language is remembered for the conversation (interactions, or the robot's
+    interaction history if None) and used for text too short or ambiguous to tell.
+    """
+    languages = robot_state.all_languages
+    if len(languages) == 1:
+        return next(iter(languages))
+
+    conversation = (
+        interactions if interactions is not None else ROBOT_STATE.interaction_history
+    )
+    last_language = _conversation_languages.get(conversation)
+    identification = LANGUAGE_IDENTIFIER.identify(msg, languages)
+    if identification.confident:
+        language = identification.language
+    elif last_language in languages and (
+        identification.language is None
+        or identification.scores[identification.language]
+        - identification.scores.get(last_language, -math.inf)
+        <= STICKY_MARGIN
+    ):
+        language = last_language
+    else:
+        language = await determineLangCode(
+            msg, interactions, parent_item_id=parent_item_id
+        )
+
+    if language in languages:
+        _conversation_languages[conversation] = language
+    return language
\ No newline at end of file
@@ -0,0 +1,305 @@
+"""Choose facial expressions for speech locally, without waiting for an LLM.
+
+Expressions are the names of animations, such as Chat_G2_Happy_2: an emotion, optionally
+followed by its intensity. Text is scored against a keyword lexicon for each emotion, and
+the expression of the best scoring emotion with the matching intensity is chosen. Text is
+classified as ambiguous when the keywords don't settle it, so that something slower, such
+as an LLM, can be asked instead. Classifications are cached by their normalised text.
+"""
+
+import re
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Optional
+
+# The most classifications remembered
+MAX_CACHE_SIZE = 512
+
+# The emotion of text without keywords
+NEUTRAL = "neutral"
+
+# Languages (ISO 639-3) the lexicon covers. Text in any other is ambiguous.
+LEXICON_LANGUAGES = ("eng",)
+
+# Words suggesting each emotion, as the exact forms matched. An emotion not listed here only
+# matches its own name.
+EMOTION_KEYWORDS: dict[str, tuple[str, ...]] = {
+    "happy": (
+        "happy",
+        "happier",
+        "happiest",
+        "happiness",
+        "happily",
+        "glad",
+        "great",
+        "love",
+        "loved",
+        "loves",
+        "loving",
+        "lovely",
+        "wonderful",
+        "fantastic",
+        "awesome",
+        "amazing",
+        "brilliant",
+        "excellent",
+        "delight",
+        "delighted",
+        "delightful",
+        "enjoy",
+        "enjoyed",
+        "enjoying",
+        "fun",
+        "funny",
+        "haha",
+        "hahaha",
+        "yay",
+        "congratulations",
+        "thanks",
+        "thank",
+        "pleased",
+        "pleasure",
+        "excited",
+        "exciting",
+        "nice",
+        "welcome",
+        "beautiful",
+        "perfect",
+    ),
+    "sad": (
+        "sad",
+        "sadly",
+        "sadder",
+        "saddest",
+        "sadness",
+        "sorry",
+        "unfortunate",
+        "unfortunately",
+        "miss",
+        "missed",
+        "missing",
+        "lonely",
+        "cry",
+        "cried",
+        "cries",
+        "crying",
+        "tears",
+        "grief",
+        "grieve",
+        "grieving",
+        "loss",
+        "died",
+        "death",
+        "depressed",
+        "depressing",
+        "depression",
+        "heartbroken",
+        "disappointed",
+        "disappointing",
+        "disappointment",
+        "regret",
+        "regrets",
+        "upset",
+        "unhappy",
+    ),
+    "angry": (
+        "angry",
+        "angrily",
+        "angrier",
+        "anger",
+        "furious",
+        "mad",
+        "annoyed",
+        "annoying",
+        "irritated",
+        "irritating",
+        "outraged",
+        "outrageous",
+        "hate",
+        "hated",
+        "hates",
+        "rage",
+        "stupid",
+        "ridiculous",
+        "unacceptable",
+    ),
+    "fear": (
+        "afraid",
+        "scared",
+        "scary",
+        "scare",
+        "fear",
+        "fears",
+        "fearful",
+        "frightened",
+        "frightening",
+        "terrified",
+        "terrifying",
+        "nervous",
+        "worried",
+        "worry",
+        "worrying",
+        "anxious",
+        "danger",
+        "dangerous",
+        "creepy",
+        "horror",
+        "panic",
+        "panicking",
+    ),
+    "surprised": (
+        "surprise",
+        "surprised",
+        "surprising",
+        "wow",
+        "whoa",
+        "unbelievable",
+        "incredible",
+        "astonished",
+        "astonishing",
+        "shocked",
+        "shocking",
+        "unexpected",
+    ),
+    "dislike": (
+        "disgust",
+        "disgusted",
+        "disgusting",
+        "gross",
+        "yuck",
+        "ew",
+        "eww",
+        "horrible",
+        "awful",
+        "terrible",
+        "nasty",
+        "dislike",
+        "boring",
+        "ugh",
+    ),
+    "confused": (
+        "confused",
+        "confusing",
+        "confusion",
+        "hmm",
+        "puzzled",
+        "puzzling",
+        "strange",
+        "weird",
+        "odd",
+        "unsure",
+        "pardon",
+    ),
+}
+
+# Expression names for the emotions in EMOTION_KEYWORDS
+EMOTION_ALIASES: dict[str, str] = {
+    "joy": "happy",
+    "happiness": "happy",
+    "sadness": "sad",
+    "anger": "angry",
+    "scared": "fear",
+    "afraid": "fear",
+    "surprise": "surprised",
+    "disgust": "dislike",
+    "confusion": "confused",
+}
+
+# Words raising the intensity of the keyword after them
+INTENSIFIERS = ("very", "so", "really", "extremely", "absolutely", "totally", "such")
+# Words cancelling keywords up to NEGATION_WINDOW words after them
+NEGATIONS = ("not", "no", "never", "don't", "isn't", "wasn't", "aren't", "can't")
+NEGATION_WINDOW = 3
+
+_EXPRESSION_NAME = re.compile(r"([A-Za-z]+)(?:_(\d+))?$")
+_WORDS = re.compile(r"[a-z']+")
+
+
+def parse_expression(expression: str) -> tuple[str, int]:
+    """The emotion and intensity (0 if not given) of an expression name."""
+    match = _EXPRESSION_NAME.search(expression)
+    if match is None:
+        return expression.lower(), 0
+    emotion = match.group(1).lower()
+    return EMOTION_ALIASES.get(emotion, emotion), int(match.group(2) or 0)
+
+
+def normalise(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+@dataclass
+class Classification:
+    expression: str
+    # Whether the text should be classified by something better, if there is time
+    ambiguous: bool
+
+
+class ExpressionClassifier:
+    def __init__(self, expressions: list[str], default: str):
+        # Expressions of each emotion, by increasing intensity
+        self.by_emotion: defaultdict[str, list[str]] = defaultdict(list)
+        for expression in sorted(expressions, key=lambda e: parse_expression(e)[1]):
+            self.by_emotion[parse_expression(expression)[0]].append(expression)
+        self.neutral = (
+            self.by_emotion[NEUTRAL][0] if NEUTRAL in self.by_emotion else default
+        )
+
+        self._words: dict[str, str] = {}
+        for emotion in self.by_emotion:
+            for keyword in EMOTION_KEYWORDS.get(emotion, (emotion,)):
+                self._words[keyword] = emotion
+        self._cache: OrderedDict[str, str] = OrderedDict()
+
+    def cached(self, text: str) -> Optional[str]:
+        key = normalise(text)
+        if (expression := self._cache.get(key)) is not None:
+            self._cache.move_to_end(key)
+        return expression
+
+    def remember(self, text: str, expression: str):
+        key = normalise(text)
+        self._cache[key] = expression
+        self._cache.move_to_end(key)
+        while len(self._cache) > MAX_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    def classify(
+        self, text: str, language_code: Optional[str] = None
+    ) -> Classification:
+        """Classify text from the cache, or else its keywords."""
+        if (expression := self.cached(text)) is not None:
+            return Classification(expression, False)
+        if language_code is not None and language_code not in LEXICON_LANGUAGES:
+            return Classification(self.neutral, True)
+
+        words = _WORDS.findall(text.lower())
+        scores: defaultdict[str, int] = defaultdict(int)
+        negated = False
+        for i, word in enumerate(words):
+            if (emotion := self._words.get(word)) is None:
+                continue
+            if any(w in NEGATIONS for w in words[max(0, i - NEGATION_WINDOW) : i]):
+                negated = True
+                continue
+            scores[emotion] += 2 if i > 0 and words[i - 1] in INTENSIFIERS else 1
+
+        if not scores:
+            # Most speech has no keywords, and "not happy" is not neutral either, so
+            # these are only neutral until something better has classified them
+            return Classification(self.neutral, True)
+
+        ranked = sorted(scores, key=scores.get, reverse=True)
+        emotion = ranked[0]
+        ambiguous = negated or (
+            len(ranked) > 1 and scores[ranked[1]] == scores[emotion]
+        )
+        intensities = self.by_emotion[emotion]
+        intensity = scores[emotion] + ("!" in text)
+        expression = intensities[min(intensity, len(intensities)) - 1]
+        return self._remembered(text, Classification(expression, ambiguous))
+
+    def _remembered(self, text: str, classification: Classification) -> Classification:
+        if not classification.ambiguous:
+            self.remember(text, classification.expression)
+        return classification
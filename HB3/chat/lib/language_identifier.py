@@ -0,0 +1,286 @@
+"""Identify the language of text locally, from its character n-grams.
+
+Every language in SAMPLES has a profile of how often the character 1 to 3-grams of its
+sample text occur, built once on import. Text is scored against the profiles of the
+candidate languages with naive Bayes, which takes microseconds, and the identification
+says whether it is confident, so that uncertain text can be passed on to something slower.
+"""
+
+import re
+import math
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, Optional
+
+NGRAM_ORDERS = (1, 2, 3)
+# Additive smoothing of the n-gram frequencies, over a vocabulary of this many n-grams
+SMOOTHING = 0.5
+VOCABULARY_SIZE = 5000
+
+# An identification is confident when the best language's log likelihood per n-gram beats
+# the next best by MIN_MARGIN, over at least MIN_NGRAMS n-grams
+MIN_MARGIN = 0.25
+MIN_NGRAMS = 30
+
+# Languages are ISO 639-3 codes, as in robot_state.all_languages. A profile also stands
+# for these codes.
+ALIASES: dict[str, tuple[str, ...]] = {
+    "nor": ("nob", "nno"),
+    "zho": ("cmn", "yue"),
+    "ara": ("arb",),
+}
+
+# Everyday text in each language, the kind of thing the robot says
+SAMPLES: dict[str, str] = {
+    "eng": """
+        Hello, it is nice to meet you. What would you like to talk about today? I think
+        that is a really good question. Yes, of course, I can help you with that. My name
+        is Ameca and I am a humanoid robot. I don't know, but we could find out together.
+        Thank you very much, that was very kind of you. Where are you from? How are you
+        doing this morning? Have you been here before? Let me think about it for a moment.
+        It was the best thing that they had ever seen, and everyone wanted to see it again.
+        """,
+    "deu": """
+        Hallo, schön dich kennenzulernen. Worüber möchtest du heute sprechen? Ich denke,
+        das ist eine wirklich gute Frage. Ja, natürlich kann ich dir dabei helfen. Mein
+        Name ist Ameca und ich bin ein humanoider Roboter. Ich weiß es nicht, aber wir
+        könnten es zusammen herausfinden. Vielen Dank, das war sehr nett von dir. Woher
+        kommst du? Wie geht es dir heute Morgen? Warst du schon einmal hier? Lass mich
+        kurz darüber nachdenken. Es ist nicht so einfach, wie es aussieht, aber wir werden
+        sehen, was sich machen lässt.
+        """,
+    "fra": """
+        Bonjour, je suis ravie de vous rencontrer. De quoi voulez-vous parler aujourd'hui ?
+        Je pense que c'est une très bonne question. Oui, bien sûr, je peux vous aider avec
+        ça. Je m'appelle Ameca et je suis un robot humanoïde. Je ne sais pas, mais nous
+        pourrions le découvrir ensemble. Merci beaucoup, c'était très gentil de votre part.
+        D'où venez-vous ? Comment allez-vous ce matin ? Êtes-vous déjà venu ici ? Laissez-moi
+        y réfléchir un instant. Ce n'est pas aussi simple qu'il y paraît.
+        """,
+    "spa": """
+        Hola, encantada de conocerte. ¿De qué te gustaría hablar hoy? Creo que es una
+        pregunta muy buena. Sí, por supuesto, puedo ayudarte con eso. Me llamo Ameca y soy
+        un robot humanoide. No lo sé, pero podríamos averiguarlo juntos. Muchas gracias,
+        has sido muy amable. ¿De dónde eres? ¿Cómo estás esta mañana? ¿Has estado aquí
+        antes? Déjame pensarlo un momento. No es tan sencillo como parece, pero vamos a
+        ver qué podemos hacer.
+        """,
+    "ita": """
+        Ciao, piacere di conoscerti. Di cosa ti piacerebbe parlare oggi? Penso che sia una
+        domanda davvero buona. Sì, certo, posso aiutarti con questo. Mi chiamo Ameca e sono
+        un robot umanoide. Non lo so, ma potremmo scoprirlo insieme. Grazie mille, è stato
+        molto gentile da parte tua. Di dove sei? Come stai stamattina? Sei già stato qui?
+        Fammi pensare un attimo. Non è così semplice come sembra, ma vediamo cosa possiamo
+        fare.
+        """,
+    "por": """
+        Olá, prazer em conhecer você. Sobre o que você gostaria de falar hoje? Acho que é
+        uma pergunta muito boa. Sim, claro, posso ajudar você com isso. Meu nome é Ameca e
+        eu sou um robô humanoide. Não sei, mas poderíamos descobrir juntos. Muito obrigada,
+        foi muito gentil da sua parte. De onde você é? Como você está esta manhã? Você já
+        esteve aqui antes? Deixe-me pensar um pouco. Não é tão simples quanto parece, mas
+        vamos ver o que podemos fazer.
+        """,
+    "nld": """
+        Hallo, leuk je te ontmoeten. Waar wil je het vandaag over hebben? Ik denk dat dat
+        een heel goede vraag is. Ja, natuurlijk kan ik je daarmee helpen. Mijn naam is
+        Ameca en ik ben een mensachtige robot. Ik weet het niet, maar we kunnen het samen
+        uitzoeken. Heel erg bedankt, dat was erg aardig van je. Waar kom je vandaan? Hoe
+        gaat het met je vanochtend? Ben je hier al eerder geweest? Laat me er even over
+        nadenken. Het is niet zo eenvoudig als het lijkt.
+        """,
+    "nor": """
+        Hei, hyggelig å møte deg. Hva har du lyst til å snakke om i dag? Jeg tror det er et
+        veldig godt spørsmål. Ja, selvfølgelig kan jeg hjelpe deg med det. Jeg heter Ameca
+        og jeg er en menneskelignende robot. Jeg vet ikke, men vi kan finne det ut sammen.
+        Tusen takk, det var veldig snilt av deg. Hvor kommer du fra? Hvordan har du det i
+        morges? Har du vært her før? La meg tenke litt på det. Det er ikke så enkelt som
+        det ser ut, men vi får se hva vi kan gjøre.
+        """,
+    "swe": """
+        Hej, trevligt att träffas. Vad vill du prata om idag? Jag tycker att det är en
+        riktigt bra fråga. Ja, självklart kan jag hjälpa dig med det. Jag heter Ameca och
+        jag är en människoliknande robot. Jag vet inte, men vi kan ta reda på det
+        tillsammans. Tack så mycket, det var väldigt snällt av dig. Var kommer du ifrån?
+        Hur mår du i morse? Har du varit här förut? Låt mig tänka på det en stund. Det är
+        inte så enkelt som det ser ut, men vi får se vad vi kan göra.
+        """,
+    "dan": """
+        Hej, rart at møde dig. Hvad har du lyst til at snakke om i dag? Jeg synes, det er
+        et rigtig godt spørgsmål. Ja, selvfølgelig kan jeg hjælpe dig med det. Jeg hedder
+        Ameca, og jeg er en menneskelignende robot. Jeg ved det ikke, men vi kunne finde
+        ud af det sammen. Mange tak, det var meget sødt af dig. Hvor kommer du fra?
+        Hvordan har du det i morges? Har du været her før? Lad mig lige tænke over det.
+        Det er ikke så nemt, som det ser ud, men vi må se, hvad vi kan gøre.
+        """,
+    "fin": """
+        Hei, mukava tavata. Mistä haluaisit puhua tänään? Minusta se on todella hyvä
+        kysymys. Kyllä, tietenkin voin auttaa sinua siinä. Nimeni on Ameca ja olen
+        ihmisen näköinen robotti. En tiedä, mutta voisimme selvittää sen yhdessä. Kiitos
+        paljon, se oli todella ystävällistä sinulta. Mistä olet kotoisin? Mitä sinulle
+        kuuluu tänä aamuna? Oletko käynyt täällä aiemmin? Anna minun miettiä hetki. Se ei
+        ole niin helppoa kuin miltä se näyttää, mutta katsotaan mitä voimme tehdä.
+        """,
+    "pol": """
+        Cześć, miło cię poznać. O czym chciałbyś dzisiaj porozmawiać? Myślę, że to bardzo
+        dobre pytanie. Tak, oczywiście, mogę ci w tym pomóc. Nazywam się Ameca i jestem
+        humanoidalnym robotem. Nie wiem, ale moglibyśmy dowiedzieć się tego razem.
+        Dziękuję bardzo, to było bardzo miłe z twojej strony. Skąd jesteś? Jak się masz
+        dzisiaj rano? Czy byłeś tu już wcześniej? Pozwól mi się nad tym chwilę zastanowić.
+        To nie jest takie proste, jak się wydaje.
+        """,
+    "tur": """
+        Merhaba, tanıştığıma memnun oldum. Bugün ne hakkında konuşmak istersin? Bence bu
+        gerçekten çok iyi bir soru. Evet, tabii ki bu konuda sana yardımcı olabilirim.
+        Benim adım Ameca ve ben insansı bir robotum. Bilmiyorum ama birlikte öğrenebiliriz.
+        Çok teşekkür ederim, çok naziksin. Nerelisin? Bu sabah nasılsın? Daha önce burada
+        bulundun mu? Bir dakika düşünmeme izin ver. Göründüğü kadar basit değil ama ne
+        yapabileceğimize bakalım.
+        """,
+    "rus": """
+        Привет, рада с тобой познакомиться. О чём ты хотел бы поговорить сегодня? Я думаю,
+        это действительно хороший вопрос. Да, конечно, я могу тебе с этим помочь. Меня
+        зовут Амека, и я человекоподобный робот. Я не знаю, но мы могли бы узнать это
+        вместе. Большое спасибо, это было очень мило с твоей стороны. Откуда ты? Как у
+        тебя дела сегодня утром? Ты уже был здесь раньше? Дай мне немного подумать. Это не
+        так просто, как кажется, но посмотрим, что можно сделать.
+        """,
+    "ukr": """
+        Привіт, рада з тобою познайомитися. Про що ти хотів би поговорити сьогодні? Я
+        думаю, це справді гарне питання. Так, звичайно, я можу тобі з цим допомогти. Мене
+        звати Амека, і я людиноподібний робот. Я не знаю, але ми могли б дізнатися це
+        разом. Щиро дякую, це було дуже мило з твого боку. Звідки ти? Як у тебе справи
+        сьогодні вранці? Ти вже був тут раніше? Дай мені трохи подумати. Це не так просто,
+        як здається, але подивимося, що можна зробити.
+        """,
+    "ell": """
+        Γεια σου, χαίρομαι που σε γνωρίζω. Για τι θα ήθελες να μιλήσουμε σήμερα; Νομίζω
+        ότι είναι μια πολύ καλή ερώτηση. Ναι, φυσικά, μπορώ να σε βοηθήσω με αυτό. Με λένε
+        Αμέκα και είμαι ένα ανθρωποειδές ρομπότ. Δεν ξέρω, αλλά θα μπορούσαμε να το μάθουμε
+        μαζί. Ευχαριστώ πολύ, ήταν πολύ ευγενικό εκ μέρους σου. Από πού είσαι; Πώς είσαι
+        σήμερα το πρωί;
+        """,
+    "ara": """
+        مرحبا، سعيدة بلقائك. عن ماذا تحب أن نتحدث اليوم؟ أعتقد أن هذا سؤال جيد حقا. نعم،
+        بالطبع، يمكنني مساعدتك في ذلك. اسمي أميكا وأنا روبوت شبيه بالإنسان. لا أعرف، لكن
+        يمكننا أن نكتشف ذلك معا. شكرا جزيلا، كان ذلك لطفا كبيرا منك. من أين أنت؟ كيف حالك
+        هذا الصباح؟ هل كنت هنا من قبل؟ دعني أفكر في ذلك قليلا.
+        """,
+    "heb": """
+        שלום, נעים מאוד להכיר אותך. על מה היית רוצה לדבר היום? אני חושבת שזאת שאלה ממש
+        טובה. כן, בטח, אני יכולה לעזור לך עם זה. קוראים לי אמקה ואני רובוט דמוי אדם. אני
+        לא יודעת, אבל נוכל לגלות את זה ביחד. תודה רבה, זה היה מאוד נחמד מצידך. מאיפה
+        אתה? מה שלומך הבוקר? היית כאן פעם?
+        """,
+    "hin": """
+        नमस्ते, आपसे मिलकर खुशी हुई। आज आप किस बारे में बात करना चाहेंगे? मुझे लगता है कि
+        यह सच में बहुत अच्छा सवाल है। हाँ, बिल्कुल, मैं इसमें आपकी मदद कर सकती हूँ। मेरा
+        नाम अमेका है और मैं एक मानव जैसी रोबोट हूँ। मुझे नहीं पता, लेकिन हम मिलकर पता
+        लगा सकते हैं। बहुत बहुत धन्यवाद, यह आपकी बहुत मेहरबानी थी। आप कहाँ से हैं?
+        """,
+    "jpn": """
+        こんにちは、お会いできてうれしいです。今日は何について話したいですか？それは本当に
+        いい質問だと思います。はい、もちろん、それについてお手伝いできます。私の名前は
+        アメカで、人型ロボットです。わかりませんが、一緒に調べることができます。どうも
+        ありがとうございます、とても親切ですね。どこから来ましたか？今朝の調子はどうですか？
+        ここに来たことはありますか？少し考えさせてください。
+        """,
+    "kor": """
+        안녕하세요, 만나서 반갑습니다. 오늘은 무엇에 대해 이야기하고 싶으세요? 정말 좋은
+        질문이라고 생각해요. 네, 물론이죠, 그 일을 도와드릴 수 있어요. 제 이름은
+        아메카이고 저는 인간형 로봇입니다. 잘 모르겠지만 함께 알아볼 수 있어요. 정말
+        감사합니다, 친절하시네요. 어디에서 오셨어요? 오늘 아침 기분은 어떠세요? 여기에 와
+        본 적이 있으세요? 잠깐 생각해 볼게요.
+        """,
+    "zho": """
+        你好，很高兴认识你。你今天想聊些什么？我觉得这真是一个很好的问题。是的，当然，我可以
+        帮你做这件事。我的名字叫阿米卡，我是一个人形机器人。我不知道，但是我们可以一起找出
+        答案。非常感谢，你真是太好了。你是从哪里来的？你今天早上怎么样？你以前来过这里吗？
+        让我想一想。這個問題沒有看起來那麼簡單，但是我們看看能做些什麼。
+        """,
+}
+
+# Anything that isn't a letter separates words
+_NOT_LETTERS = re.compile(r"[\W\d_]+")
+
+
+def ngrams(text: str) -> Iterator[str]:
+    """The character n-grams of each word in text, with words padded by spaces."""
+    for word in _NOT_LETTERS.split(text.lower()):
+        if not word:
+            continue
+        padded = f" {word} "
+        for n in NGRAM_ORDERS:
+            start, stop = (1, len(padded) - 1) if n == 1 else (0, len(padded) - n + 1)
+            for i in range(start, stop):
+                yield padded[i : i + n]
+
+
+class LanguageProfile:
+    def __init__(self, sample: str):
+        counts = Counter(ngrams(sample))
+        denominator = math.log(sum(counts.values()) + SMOOTHING * VOCABULARY_SIZE)
+        self.log_likelihoods: dict[str, float] = {
+            ngram: math.log(count + SMOOTHING) - denominator
+            for ngram, count in counts.items()
+        }
+        self.unseen_log_likelihood = math.log(SMOOTHING) - denominator
+
+    def score(self, ngram_counts: Counter) -> float:
+        """The log likelihood of text with these n-gram counts."""
+        get = self.log_likelihoods.get
+        unseen = self.unseen_log_likelihood
+        return sum(get(ngram, unseen) * count for ngram, count in ngram_counts.items())
+
+
+PROFILES: dict[str, LanguageProfile] = {
+    language: LanguageProfile(sample) for language, sample in SAMPLES.items()
+}
+_PROFILE_OF: dict[str, str] = {
+    **{language: language for language in PROFILES},
+    **{alias: language for language, aliases in ALIASES.items() for alias in aliases},
+}
+
+
+@dataclass
+class Identification:
+    # The most likely of the candidate languages, or None if the text has no letters
+    language: Optional[str]
+    # Whether the text was long enough, and the language clear enough, to be sure of it
+    confident: bool
+    # Log likelihood per n-gram of each candidate language with a profile
+    scores: dict[str, float] = field(default_factory=dict)
+
+
+def identify(text: str, languages: Iterable[str]) -> Identification:
+    """Identify which of languages text is in.
+
+    Identifications are never confident if any of the languages has no profile, as the text
+    could be in that language.
+    """
+    languages = sorted(languages)
+    ngram_counts = Counter(ngrams(text))
+    n_ngrams = sum(ngram_counts.values())
+    if not n_ngrams or not languages:
+        return Identification(None, False)
+
+    scores: dict[str, float] = {}
+    profile_scores: dict[str, float] = {}
+    for language in languages:
+        if (profile := _PROFILE_OF.get(language)) is None:
+            continue
+        if profile not in profile_scores:
+            profile_scores[profile] = PROFILES[profile].score(ngram_counts) / n_ngrams
+        scores[language] = profile_scores[profile]
+    if not scores:
+        return Identification(None, False)
+
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    confident = (
+        len(scores) == len(languages)
+        # Languages sharing a profile can't be told apart
+        and len(profile_scores) == len(scores)
+        and n_ngrams >= MIN_NGRAMS
+        and (len(ranked) == 1 or scores[ranked[0]] - scores[ranked[1]] >= MIN_MARGIN)
+    )
+    return Identification(ranked[0], confident, scores)
@@ -0,0 +1,218 @@
+"""Reply to frequently heard speech from a cache, without waiting for the LLM.
+
+Replies are cached by the decision model's prompt (its model and system messages), the
+speaker, and an embedding of what they said. Speech is answered from the cache when its
+embedding is similar enough to a cached one, and the cached reply hasn't expired. Only
+replies to a single utterance which called no tools are cached. STATS keeps the hit rate
+and the time saved.
+
+Embeddings are made locally from hashed words and character trigrams, so that a miss
+costs no more than a fraction of a millisecond. They match rephrasings such as "what's
+your name" and "what is your name?", rather than synonyms.
+"""
+
+import re
+import json
+import hashlib
+from time import monotonic
+from zlib import crc32
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+
+CONFIG = system.import_library("../../../Config/Chat.py").CONFIG
+INTERACTION_HISTORY = system.import_library("../knowledge/interaction_history.py")
+
+# Size of the embeddings
+EMBEDDING_DIMENSION = 1024
+# Weight of whole words in the embeddings, relative to their character trigrams
+WORD_WEIGHT = 2.0
+# Speech shorter than this often depends on what was said before, such as "why?"
+MIN_WORDS = 3
+# Speech only matches speech negated the same way, however similar it is otherwise
+NEGATIONS = ("not", "no", "never")
+
+CONTRACTIONS = {
+    "can't": "can not",
+    "won't": "will not",
+    "n't": " not",
+    "'re": " are",
+    "'m": " am",
+    "'ve": " have",
+    "'ll": " will",
+    "'d": " would",
+    "'s": " is",
+}
+
+_CONTRACTION = re.compile("|".join(map(re.escape, CONTRACTIONS)))
+_WORDS = re.compile(r"[^\W_]+")
+
+
+def normalise(text: str) -> list[str]:
+    """The words of text, lower cased with contractions expanded."""
+    text = _CONTRACTION.sub(lambda m: CONTRACTIONS[m.group(0)], text.lower())
+    return _WORDS.findall(text.replace("’", "'"))
+
+
+def embed(words: list[str]) -> np.ndarray:
+    """A unit length embedding of words, from their hashed words and trigrams."""
+    embedding = np.zeros(EMBEDDING_DIMENSION, dtype=np.float32)
+    for word in words:
+        embedding[crc32(word.encode()) % EMBEDDING_DIMENSION] += WORD_WEIGHT
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            embedding[crc32(padded[i : i + 3].encode()) % EMBEDDING_DIMENSION] += 1
+    norm = np.linalg.norm(embedding)
+    return embedding / norm if norm else embedding
+
+
+def prompt_hash(decision_model) -> str:
+    """A hash of what a decision model is prompted with besides the conversation."""
+    prompt = json.dumps([decision_model.model, decision_model.system_messages])
+    return hashlib.sha1(prompt.encode()).hexdigest()
+
+
+@dataclass
+class CacheKey:
+    prompt: str
+    speaker: Optional[str]
+    embedding: np.ndarray
+    negated: bool
+    text: str
+
+
+@dataclass
+class CachedReply:
+    key: CacheKey
+    # The streamed chunks, as {"content": ..., "lang_code": ...}
+    chunks: list[dict]
+    # How long the LLM took to reply
+    latency_s: float
+    created: float = field(default_factory=monotonic)
+
+
+@dataclass
+class ResponseCacheStats:
+    hits: int = 0
+    misses: int = 0
+    # Total time the LLM took to make the replies used from the cache
+    saved_s: float = 0.0
+
+    @property
+    def hit_rate(self) -> Optional[float]:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else None
+
+    def to_dict(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "mean_saved_s": self.saved_s / self.hits if self.hits else None,
+        }
+
+
+STATS = ResponseCacheStats()
+
+
+class ResponseCache:
+    def __init__(self, max_size: int, ttl_s: float, min_similarity: float):
+        """A cache of LLM replies to speech.
+
+        Args:
+            max_size: the most replies kept. The least recently used are evicted first.
+            ttl_s: how long replies are kept, in seconds.
+            min_similarity: how similar speech must be to use a reply, as the cosine
+              similarity of their embeddings.
+        """
+        self.max_size = max_size
+        self.ttl_s = ttl_s
+        self.min_similarity = min_similarity
+        self._replies: OrderedDict[int, CachedReply] = OrderedDict()
+        self._next_id = 0
+
+    def __len__(self):
+        return len(self._replies)
+
+    def clear(self):
+        self._replies.clear()
+
+    def key(self, decision_model) -> Optional[CacheKey]:
+        """The key of the reply to the last event in decision_model's history.
+
+        None if that isn't a single utterance which can be cached.
+        """
+        history = decision_model.interaction_history
+        if not len(history):
+            return None
+        event = history[-1].event
+        if not isinstance(event, INTERACTION_HISTORY.SpeechRecognisedEvent):
+            return None
+        if len(history) > 1 and isinstance(
+            history[-2].event, INTERACTION_HISTORY.SpeechRecognisedEvent
+        ):
+            # Sent to the LLM together with the speech before it
+            return None
+        words = normalise(event.speech)
+        if len(words) < MIN_WORDS:
+            return None
+        return CacheKey(
+            prompt_hash(decision_model),
+            event.speaker,
+            embed(words),
+            sum(word in NEGATIONS for word in words) % 2 == 1,
+            " ".join(words),
+        )
+
+    def _expire(self):
+        now = monotonic()
+        for reply_id in [
+            reply_id
+            for reply_id, reply in self._replies.items()
+            if now - reply.created > self.ttl_s
+        ]:
+            del self._replies[reply_id]
+
+    def get(self, key: CacheKey) -> Optional[list[dict]]:
+        """The chunks of the cached reply matching key, if there is one."""
+        self._expire()
+        best_id, best_similarity = None, self.min_similarity
+        for reply_id, reply in self._replies.items():
+            if (
+                reply.key.prompt != key.prompt
+                or reply.key.speaker != key.speaker
+                or reply.key.negated != key.negated
+            ):
+                continue
+            similarity = float(np.dot(reply.key.embedding, key.embedding))
+            if similarity >= best_similarity:
+                best_id, best_similarity = reply_id, similarity
+        if best_id is None:
+            STATS.misses += 1
+            probe("response_cache", STATS.to_dict())
+            return None
+        self._replies.move_to_end(best_id)
+        reply = self._replies[best_id]
+        STATS.hits += 1
+        STATS.saved_s += reply.latency_s
+        probe("response_cache", STATS.to_dict())
+        log.info(f"Replying from cache to {key.text!r}, as to {reply.key.text!r}")
+        return reply.chunks
+
+    def put(self, key: CacheKey, chunks: list[dict], latency_s: float):
+        """Cache the chunks of the reply to key, which took latency_s to make."""
+        if not chunks:
+            return
+        self._replies[self._next_id] = CachedReply(key, chunks, latency_s)
+        self._next_id += 1
+        while len(self._replies) > self.max_size:
+            self._replies.popitem(last=False)
+
+
+CACHE = ResponseCache(
+    CONFIG["RESPONSE_CACHE_MAX_SIZE"],
+    CONFIG["RESPONSE_CACHE_TTL_S"],
+    CONFIG["RESPONSE_CACHE_MIN_SIMILARITY"],
+)
@@ -0,0 +1,162 @@
+"""Start the LLM's response to speech before the final speech recognition result arrives.
+
+When speech is heard, a SpeculativeResponse asks the LLM to reply to the text heard as if it
+had been recognised, and buffers the response without acting on it. When the final result
+arrives the speculation is committed if it matches closely enough, and its response used
+as if it had only just been requested. Otherwise it is cancelled, and the response
+requested again. STATS keeps the hit rate and the time saved.
+"""
+
+import re
+import asyncio
+from time import monotonic
+from difflib import SequenceMatcher
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Optional
+
+CONFIG = system.import_library("../../../Config/Chat.py").CONFIG
+INTERACTION_HISTORY = system.import_library("../knowledge/interaction_history.py")
+TRACER = system.import_library("../../lib/latency_tracer.py").TRACER
+
+# How similar the text heard and the final result must be to use the speculative response,
+# as a difflib ratio of their normalised text
+MIN_SIMILARITY: float = CONFIG["SPECULATIVE_MIN_SIMILARITY"]
+
+_PUNCTUATION = re.compile(r"[^\w\s']+")
+_DONE = object()
+
+
+def normalise(text: str) -> str:
+    return " ".join(_PUNCTUATION.sub(" ", text.lower()).split())
+
+
+def similarity(a: str, b: str) -> float:
+    return SequenceMatcher(None, normalise(a), normalise(b)).ratio()
+
+
+@dataclass
+class SpeculationStats:
+    started: int = 0
+    committed: int = 0
+    # Speculations which didn't match the final result, or had no final result
+    cancelled: int = 0
+    # Total time between starting the committed speculations and the earlier of their
+    # first token and their commit, which would otherwise have been spent waiting
+    saved_s: float = 0.0
+
+    @property
+    def hit_rate(self) -> Optional[float]:
+        finished = self.committed + self.cancelled
+        return self.committed / finished if finished else None
+
+    def to_dict(self) -> dict:
+        return {
+            "started": self.started,
+            "committed": self.committed,
+            "cancelled": self.cancelled,
+            "hit_rate": self.hit_rate,
+            "mean_saved_s": self.saved_s / self.committed if self.committed else None,
+        }
+
+
+STATS = SpeculationStats()
+
+
+class SpeculativeResponse:
+    def __init__(
+        self,
+        decision_model,
+        text: str,
+        speaker: Optional[str] = None,
+        purpose: Optional[str] = None,
+    ):
+        """Request decision_model's response to speech which hasn't been recognised yet.
+
+        Args:
+            decision_model: the LLMModel which would respond to the speech.
+            text: the speech heard so far.
+            speaker: who is speaking, if known. If not, the speech can be recognised as
+              anyone's.
+            purpose: the purpose of the response, as passed to recursively_call_llm.
+        """
+        self.decision_model = decision_model
+        self.text = text
+        self.speaker = speaker
+        history = decision_model.interaction_history
+        # The final result should be the only event added to the history before commit
+        self._last_item = history[-1] if len(history) else None
+        self._failed = False
+        self._started = monotonic()
+        self._first_token: Optional[float] = None
+        self._responses: asyncio.Queue = asyncio.Queue()
+        self._task = asyncio.get_event_loop().create_task(self._run(purpose))
+        STATS.started += 1
+
+    async def _run(self, purpose: Optional[str]):
+        try:
+            messages = await self.decision_model.get_message_prompt()
+            messages += INTERACTION_HISTORY.SpeechRecognisedEvent(
+                self.text, speaker=self.speaker
+            ).to_messages()
+            response_stream = await self.decision_model(
+                messages, purpose=f"speculative {purpose}" if purpose else "speculative"
+            )
+            if response_stream is None:
+                self._failed = True
+                return
+            async for response in response_stream:
+                if self._first_token is None:
+                    self._first_token = monotonic()
+                self._responses.put_nowait(response)
+        except Exception as e:
+            # Raised where the response is used, if it is committed after this
+            self._failed = True
+            self._responses.put_nowait(e)
+        finally:
+            self._responses.put_nowait(_DONE)
+
+    def matches(self, text: str, speaker: Optional[str] = None) -> bool:
+        """Whether the final result text (from speaker) can use this response."""
+        history = self.decision_model.interaction_history
+        previous_item = history[-2] if len(history) >= 2 else None
+        return (
+            not self._failed
+            and (self.speaker is None or speaker == self.speaker)
+            and len(history) > 0
+            and previous_item is self._last_item
+            and similarity(text, self.text) >= MIN_SIMILARITY
+        )
+
+    def commit(
+        self, parent_item_id: Optional[str] = None
+    ) -> AsyncIterator[dict[str, Any]]:
+        """The response stream, from its first chunk.
+
+        Args:
+            parent_item_id: the id of the final result. The request was sent before it
+              existed, so the response is linked to it here instead.
+        """
+        STATS.committed += 1
+        STATS.saved_s += (self._first_token or monotonic()) - self._started
+        probe("speculation", STATS.to_dict())
+        return self._stream(parent_item_id)
+
+    async def _stream(
+        self, parent_item_id: Optional[str]
+    ) -> AsyncIterator[dict[str, Any]]:
+        first = True
+        try:
+            while (response := await self._responses.get()) is not _DONE:
+                if isinstance(response, Exception):
+                    raise response
+                if first:
+                    TRACER.link(response.get("item_id", None), parent_item_id)
+                    first = False
+                yield response
+        finally:
+            self._task.cancel()
+
+    def cancel(self):
+        STATS.cancelled += 1
+        probe("speculation", STATS.to_dict())
+        self._task.cancel()
@@ -20,10 +20,30 @@ robot_state = ROBOT_STATE.state
 
 BACKEND_SPECIALIZED_PRONUNCIATIONS = CONFIG["BACKEND_SPECIALIZED_PRONUNCIATIONS"]
 
-LANG_CODE = system.import_library("./determine_tts_lang_code.py")
+LANG_CODE = system.import_library("./determine_tts_face_lang_code.py")
 StreamOutput = Callable[[str, dict[str, Any]], Awaitable[Any]]
 
 
+# The pronunciations in BACKEND_SPECIALIZED_PRONUNCIATIONS used for each voice backend
+PRONUNCIATION_BACKENDS = {
+    "Polly": "aws_polly_neural_v1",
+    "aws_polly_neural_v1": "aws_polly_neural_v1",
+    "cartesia_ai_tts_v1": "cartesia_ai_tts_v1",
+}
+
+# Text filters are compiled once per robot name and voice backend, so they are rebuilt
+# when the persona or voice changes. They are all dropped if there are more than this.
+MAX_CACHED_FILTERS = 16
+
+_robot_name_patterns: dict[str, re.Pattern] = {}
+_pronunciation_remappers: dict[str, Optional["PronunciationRemapper"]] = {}
+
+
+def clear_cache():
+    _robot_name_patterns.clear()
+    _pronunciation_remappers.clear()
+
+
 def remove_patterns(text: str, patterns: List[str]):
     for pattern in patterns:
         regexp = re.compile(pattern)
@@ -36,40 +56,76 @@ def generate_string_cases(text: str) -> List[str]:
     return cases
 
 
+def robot_name_pattern(robot_name: str) -> re.Pattern:
+    """Matches the robot's name followed by a colon, as the LLM sometimes starts with."""
+    if (pattern := _robot_name_patterns.get(robot_name)) is None:
+        if len(_robot_name_patterns) >= MAX_CACHED_FILTERS:
+            _robot_name_patterns.clear()
+        pattern = re.compile(
+            "|".join(re.escape(n + ":") for n in generate_string_cases(robot_name))
+        )
+        _robot_name_patterns[robot_name] = pattern
+    return pattern
+
+
+class PronunciationRemapper:
+    def __init__(self, specialized_pronunciations: dict[str, str]):
+        self.specialized_pronunciations = {
+            k.lower(): v for k, v in specialized_pronunciations.items()
+        }
+        self.pattern = re.compile(
+            "|".join(map(re.escape, self.specialized_pronunciations.keys())),
+            flags=re.IGNORECASE,
+        )
+
+    def _replace_pronunciation(self, match: re.Match[str]) -> str:
+        return self.specialized_pronunciations.get(
+            match.group(0).lower(), match.group(0)
+        )
+
+    def remap(self, text: str) -> str:
+        return self.pattern.sub(self._replace_pronunciation, text)
+
+
+def pronunciation_remapper(
+    backend_specialized_pronunciations: dict[str, dict[str, str]], backend: str
+) -> Optional[PronunciationRemapper]:
+    """The remapper for a voice backend, or None if it has no specialized pronunciations."""
+    try:
+        return _pronunciation_remappers[backend]
+    except KeyError:
+        pass
+    if len(_pronunciation_remappers) >= MAX_CACHED_FILTERS:
+        _pronunciation_remappers.clear()
+    specialized_pronunciations = backend_specialized_pronunciations.get(
+        PRONUNCIATION_BACKENDS.get(backend), {}
+    )
+    remapper = (
+        PronunciationRemapper(specialized_pronunciations)
+        if specialized_pronunciations
+        else None
+    )
+    _pronunciation_remappers[backend] = remapper
+    return remapper
+
+
 def remap_pronunciations(
     text: str, backend_specialized_pronunciations: dict[str, dict[str, str]], lang: str
 ) -> str:
     voice = robot_state.get_voice_for_language(lang)
-
-    specialized_pronunciations: dict[str, str]
-    match (voice.backend):
-        case "Polly" | "aws_polly_neural_v1":
-            specialized_pronunciations = {
-                k.lower(): v
-                for k, v in backend_specialized_pronunciations.get(
-                    "aws_polly_neural_v1", {}
-                ).items()
-            }
-        case "cartesia_ai_tts_v1":
-            specialized_pronunciations = {
-                k.lower(): v
-                for k, v in backend_specialized_pronunciations.get(
-                    "cartesia_ai_tts_v1", {}
-                ).items()
-            }
-        case _:
-            return text
-
-    if not specialized_pronunciations:
+    if voice is None:
         return text
+    remapper = pronunciation_remapper(backend_specialized_pronunciations, voice.backend)
+    return remapper.remap(text) if remapper is not None else text
 
-    def _replace_pronunciations(match: re.Match[str]) -> str:
-        word = match.group(0).lower()
-        replacement = specialized_pronunciations.get(word, match.group(0))
-        return replacement
 
-    pattern = "|".join(map(re.escape, specialized_pronunciations.keys()))
-    return re.sub(pattern, _replace_pronunciations, text, flags=re.IGNORECASE)
+def filter_text(msg: str) -> str:
+    """Remove the robot's name and emojis from msg."""
+    filtered_msg = robot_name_pattern(PERSONA_UTIL.get_robot_name()).sub("", msg)
+    # Emojis are never ASCII
+    if not filtered_msg.isascii():
+        filtered_msg = emoji.replace_emoji(filtered_msg, "")
+    return filtered_msg
 
 
 async def dummyStream(msg: str, kwargs: dict[str, Any] = {}):
@@ -84,21 +140,15 @@ async def streamToTTS(msg: Optional[str], kwargs: dict[str, Any] = {}):
         log.warning("streamToTTS: ignoring empty massage")
         return
 
-    # Filter robot name from message
-    robot_name_colon = [
-        n + ":" for n in generate_string_cases(PERSONA_UTIL.get_robot_name())
-    ]
-    filtered_msg: str = remove_patterns(msg, robot_name_colon)
-
-    # Filter out emojis
-    filtered_msg = emoji.replace_emoji(filtered_msg, "")
+    # Filter robot name and emojis from message
+    filtered_msg: str = filter_text(msg)
 
     # Detect language
     parent_item_id = kwargs.get("parent_item_id", None)
     lang_detected = kwargs.get("lang_code", None)
     if lang_detected is None:
         interaction = kwargs.get("interaction", None)
-        lang_detected = await LANG_CODE.determineLangCode(
+        lang_detected = await LANG_CODE.detectLangCode(
             filtered_msg,
             interaction,
             parent_item_id=parent_item_id,
@@ -187,7 +187,16 @@ class InteractionMode(llm_decider_mode.LLMDeciderMode):
             channel (str): the channel the message was sent on
             message (Any): the message content
         """
-        if channel == "speech_recognized":
+        if channel == "speech_heard":
+            if not robot_state.speaking:
+                self.speculate(
+                    message,
+                    decision_model=self.decision_model_chat,
+                    purpose="verbal interaction",
+                )
+        elif channel in ("speech_started", "no_speech_heard"):
+            self.cancel_speculation()
+        elif channel == "speech_recognized":
             if not robot_state.speaking:
                 robot_state.set_thinking(True)
                 robot_state.start_response_task(
@@ -195,6 +204,9 @@ class InteractionMode(llm_decider_mode.LLMDeciderMode):
                         decision_model=self.decision_model_chat,
                         parent_item_id=message.get("id", None),
                         purpose="verbal interaction",
+                        first_response_stream=self.take_speculation(
+                            message, self.decision_model_chat
+                        ),
                     )
                 )
             elif not DISABLE_ASR_WHILE_SPEAKING:
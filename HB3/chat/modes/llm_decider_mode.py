@@ -1,8 +1,9 @@
 import re
 import json
 import asyncio
+from time import monotonic
 from abc import abstractmethod
-from typing import Any, Optional
+from typing import Any, AsyncIterator, Optional
 from inspect import signature
 
 from openai import APIError, APITimeoutError
@@ -16,6 +17,10 @@ mode = system.import_library("./mode.py")
 stream_module = system.import_library("../lib/stream_outputs.py")
 robot_state = system.import_library("../../robot_state.py").state
 PARENT_ITEM_ID = system.import_library("../actions/action_util.py").PARENT_ITEM_ID
+latency_tracer = system.import_library("../../lib/latency_tracer.py")
+TRACER = latency_tracer.TRACER
+SPECULATIVE_RESPONSE = system.import_library("../lib/speculative_response.py")
+RESPONSE_CACHE = system.import_library("../lib/response_cache.py")
 
 
 class LLMDeciderMode(mode.Mode):
@@ -29,10 +34,55 @@ class LLMDeciderMode(mode.Mode):
         """LLM model to use"""
         pass
 
+    _speculation = None
+
     ############## Provided methods ###################
     def reset(self):
         pass
 
+    def speculate(
+        self,
+        text: Optional[str],
+        decision_model: llm_model.LLMModel | None = None,
+        purpose: Optional[str] = None,
+    ):
+        """Start responding to speech heard before it has been recognised, if enabled.
+
+        The response is only used if take_speculation is passed a matching result.
+        """
+        self.cancel_speculation()
+        if CONFIG["SPECULATIVE_RESPONSES"] and text:
+            self._speculation = SPECULATIVE_RESPONSE.SpeculativeResponse(
+                self.DECISION_MODEL if decision_model is None else decision_model,
+                text,
+                purpose=purpose,
+            )
+
+    def cancel_speculation(self):
+        if self._speculation is not None:
+            self._speculation.cancel()
+            self._speculation = None
+
+    def take_speculation(
+        self, message: dict, decision_model: llm_model.LLMModel | None = None
+    ) -> Optional[AsyncIterator[dict]]:
+        """The speculative response to a speech_recognized message, if it matches.
+
+        Otherwise any speculation is cancelled, and None returned.
+        """
+        speculation, self._speculation = self._speculation, None
+        if speculation is None:
+            return None
+        decision_model = (
+            self.DECISION_MODEL if decision_model is None else decision_model
+        )
+        if speculation.decision_model is decision_model and speculation.matches(
+            message.get("text", ""), message.get("speaker", None)
+        ):
+            return speculation.commit(message.get("id", None))
+        speculation.cancel()
+        return None
+
     async def on_message(self, channel: str, message: Any):
         """Called when a system message is received.
 
@@ -40,12 +90,17 @@ class LLMDeciderMode(mode.Mode):
             channel (str): the channel the message was sent on
             message (Any): the message content
         """
-        if channel == "speech_recognized":
+        if channel == "speech_heard":
+            self.speculate(message, purpose="process ASR")
+        elif channel in ("speech_started", "no_speech_heard"):
+            self.cancel_speculation()
+        elif channel == "speech_recognized":
             robot_state.set_thinking(True)
             robot_state.start_response_task(
                 self.recursively_call_llm(
                     parent_item_id=message.get("id", None),
                     purpose="process ASR",
+                    first_response_stream=self.take_speculation(message),
                 )
             )
 
@@ -185,6 +240,7 @@ class LLMDeciderMode(mode.Mode):
         max_recursion: int = 5,
         parent_item_id: Optional[str] = None,
         purpose: Optional[str] = None,
+        first_response_stream: Optional[AsyncIterator[dict]] = None,
     ):
         decision_model = (
             self.DECISION_MODEL if decision_model is None else decision_model
@@ -192,39 +248,68 @@ class LLMDeciderMode(mode.Mode):
         last_parent_item_id = parent_item_id
 
         async def call_llm():
-            nonlocal last_parent_item_id
-            messages = (
-                await decision_model.get_message_prompt()
-                if specified_message_prompt is None
-                else await decision_model.get_specified_message_prompt(
-                    *specified_message_prompt
-                )
+            nonlocal last_parent_item_id, first_response_stream
+            # Vision models reply to what they see as well as what they hear
+            cache_key = (
+                RESPONSE_CACHE.CACHE.key(decision_model)
+                if CONFIG["RESPONSE_CACHE"]
+                and specified_message_prompt is None
+                and not isinstance(decision_model, llm_model.LLMVisionModel)
+                else None
             )
-
-            if CONFIG["LLM_LOGGING"]:
-                log_lines = (
-                    ["[LLM Call] - Messages:"]
-                    + [str(message) for message in messages]
-                    + ["", "[LLM Call] - Functions:"]
+            requested = monotonic()
+            if first_response_stream is not None:
+                # Already requested, such as a committed speculative response
+                response_stream, first_response_stream = first_response_stream, None
+            elif cache_key is not None and (
+                cached_reply := RESPONSE_CACHE.CACHE.get(cache_key)
+            ):
+                for chunk in cached_reply:
+                    await output_stream(
+                        chunk["content"],
+                        {
+                            "lang_code": chunk["lang_code"],
+                            "parent_item_id": last_parent_item_id,
+                        },
+                    )
+                system.messaging.post("llm_finished", "LLM Finished")
+                robot_state.set_thinking(False)
+                return False
+            else:
+                messages = (
+                    await decision_model.get_message_prompt()
+                    if specified_message_prompt is None
+                    else await decision_model.get_specified_message_prompt(
+                        *specified_message_prompt
+                    )
                 )
-                if decision_model.full_map:
-                    log_lines.append(f"{list(decision_model.full_map.keys())}")
-                else:
-                    log_lines.append("None")
-
-                log.info("\n".join(log_lines))
 
-            # Wait for the decision model to run
-            response_stream = await decision_model(
-                messages,
-                parent_item_id=last_parent_item_id,
-                purpose=purpose,
-            )
+                if CONFIG["LLM_LOGGING"]:
+                    log_lines = (
+                        ["[LLM Call] - Messages:"]
+                        + [str(message) for message in messages]
+                        + ["", "[LLM Call] - Functions:"]
+                    )
+                    if decision_model.full_map:
+                        log_lines.append(f"{list(decision_model.full_map.keys())}")
+                    else:
+                        log_lines.append("None")
+
+                    log.info("\n".join(log_lines))
+
+                # Wait for the decision model to run
+                response_stream = await decision_model(
+                    messages,
+                    parent_item_id=last_parent_item_id,
+                    purpose=purpose,
+                )
             if response_stream is None:
                 return False
             should_call_again = False
             first_res: bool = True
+            first_chunk: bool = True
             active_index: int = 0
+            reply_chunks: list[dict] = []
             try:
                 async for response in response_stream:
 
@@ -240,10 +325,16 @@ class LLMDeciderMode(mode.Mode):
                             active_index = response["choice"]["index"]
                             first_res = False
 
+                    if first_chunk:
+                        TRACER.mark(last_parent_item_id, latency_tracer.LLM_FIRST_TOKEN)
+                        first_chunk = False
+                    TRACER.link(response.get("item_id", None), last_parent_item_id)
                     last_parent_item_id = response.get("item_id", None)
 
                     if ("index" not in response) or (response["index"] == active_index):
                         if tool_calls := response.get("tool_calls", False):
+                            # The tools must be called every time
+                            cache_key = None
                             for call in tool_calls:
                                 if call["type"] == "function":
                                     should_call_again = (
@@ -262,6 +353,9 @@ class LLMDeciderMode(mode.Mode):
                                     )
                         else:
                             lang_code = response.get("language", None)
+                            reply_chunks.append(
+                                {"content": response["content"], "lang_code": lang_code}
+                            )
                             await output_stream(
                                 response["content"],
                                 {
@@ -270,6 +364,10 @@ class LLMDeciderMode(mode.Mode):
                                 },
                             )
                 system.messaging.post("llm_finished", "LLM Finished")
+                if cache_key is not None:
+                    RESPONSE_CACHE.CACHE.put(
+                        cache_key, reply_chunks, monotonic() - requested
+                    )
             except (APITimeoutError, APIError) as e:
                 log.warning(f"OpenAI Error: {e}")
             robot_state.set_thinking(False)
@@ -6,6 +6,7 @@ from typing import List, Union, Callable, Iterable, Optional
 from collections import OrderedDict
 from dataclasses import dataclass
 
+import numpy as np
 from tritium.world.geom import Ray3, Point2, Point3
 
 sh_obj = system.import_library("./shared_objects.py")
@@ -50,6 +51,10 @@ class WorldLookupItemPosition:
     TODO: Can also be a boolean to ask the lookat engine to randomly saccade.
     """
     saccades: Optional[List[Point3]] = None
+    """
+    The sample_time_ns of the item when it was converted
+    """
+    sample_time_ns: Optional[int] = None
 
 
 @dataclass
@@ -176,11 +181,14 @@ class HasConverters:
             saccades = (
                 [s.point(item.distance) for s in saccades] if item.saccades else None
             )
-        return WorldLookupItemPosition(position, saccades)
+        return WorldLookupItemPosition(position, saccades, item.sample_time_ns)
 
     def convert(self, item, reference_frame, saccade_index=None) -> Point3:
         world_position = item.world_position_cache
-        if world_position is None:
+        if (
+            world_position is None
+            or world_position.sample_time_ns != item.sample_time_ns
+        ):
             world_position = self.convert_item_to_world(item)
             item.world_position_cache = world_position
 
@@ -191,6 +199,10 @@ class HasConverters:
 
         if p is None:
             return None
+        if reference_frame == system.world.ROBOT_SPACE:
+            return p
+
+        # Converted as the robot is now, so consumers follow the head as it moves
         converter = self.converter(system.world.ROBOT_SPACE, reference_frame)
         r = converter.convert(p, None)
         if isinstance(r, Ray3):
@@ -198,8 +210,16 @@ class HasConverters:
             r = r.point(2)
         return r
 
+    def convert_many(
+        self, items: Iterable[LookAtItem], reference_frame, saccade_index=None
+    ) -> List[Optional[Point3]]:
+        """Convert several items into the same reference frame."""
+        return [self.convert(item, reference_frame, saccade_index) for item in items]
+
 
 class Consumer(HasConverters, sh_obj.SharedObject):
+    INITIAL_CAPACITY = 32
+
     def __init__(self, channel):
         self.contributors = sh_obj.SharedObjectSet(f"look-at-contrib-{channel}")
         self.deciders = sh_obj.SharedObjectSet(f"look-at-decider-{channel}")
@@ -209,7 +229,18 @@ class Consumer(HasConverters, sh_obj.SharedObject):
         self.active = None
         self.active_changed_at = monotonic()
         self._current_active_expiration_time = None
-        self.items = OrderedDict()
+
+        # Columnar item store. Each item keeps a stable slot (row) for as long as its
+        # (config.identifier, identifier) key is contributed, so scores can be cached per row.
+        self._slot_of: dict[tuple, int] = {}
+        self._slot_items: list[Optional[LookAtItem]] = [None] * self.INITIAL_CAPACITY
+        self._free_slots: list[int] = list(range(self.INITIAL_CAPACITY - 1, -1, -1))
+        self._live = np.zeros(self.INITIAL_CAPACITY, dtype=bool)
+        self._dirty = np.zeros(self.INITIAL_CAPACITY, dtype=bool)
+        # items x scorers
+        self._scores = np.zeros((self.INITIAL_CAPACITY, 0))
+        self._scored_by: Optional[tuple[int, ...]] = None
+        self._ranking: Optional[list[LookAtItem]] = None
 
     def _decider(self):
         return min(self.deciders.objects, key=lambda d: d.priority, default=None)
@@ -222,17 +253,91 @@ class Consumer(HasConverters, sh_obj.SharedObject):
         self.deciders.on_message(channel, message)
         sh_obj.SharedObject.on_message(self, channel, message)
 
+    @property
+    def items(self) -> OrderedDict:
+        """The current items keyed by (config.identifier, identifier), highest scoring first."""
+        return OrderedDict(
+            ((i.config.identifier, i.identifier), i) for i in self.ranked_items()
+        )
+
+    def ranked_items(self) -> list[LookAtItem]:
+        """The current items, highest scoring first. Only sorted when asked for."""
+        if self._ranking is None:
+            live_slots = np.flatnonzero(self._live)
+            totals = self._scores[live_slots].sum(axis=1)
+            order = live_slots[np.argsort(-totals, kind="stable")]
+            self._ranking = [self._slot_items[slot] for slot in order]
+        return self._ranking
+
+    def _grow(self):
+        capacity = len(self._slot_items)
+        self._slot_items.extend([None] * capacity)
+        self._free_slots.extend(range(2 * capacity - 1, capacity - 1, -1))
+        self._live = np.concatenate([self._live, np.zeros(capacity, dtype=bool)])
+        self._dirty = np.concatenate([self._dirty, np.zeros(capacity, dtype=bool)])
+        self._scores = np.concatenate(
+            [self._scores, np.zeros((capacity, self._scores.shape[1]))]
+        )
+
+    def _put(self, key: tuple, item: LookAtItem):
+        slot = self._slot_of.get(key)
+        if slot is None:
+            if not self._free_slots:
+                self._grow()
+            slot = self._slot_of[key] = self._free_slots.pop()
+            self._live[slot] = True
+            self._scores[slot] = 0
+        elif self._slot_items[slot] is item:
+            return
+        self._slot_items[slot] = item
+        self._dirty[slot] = True
+
+    def _drop(self, key: tuple):
+        slot = self._slot_of.pop(key)
+        self._slot_items[slot] = None
+        self._live[slot] = False
+        self._dirty[slot] = False
+        self._free_slots.append(slot)
+
+    def _rescore(self, d, probe_fn):
+        scorers = d._scorers if d is not None else []
+        scored_by = tuple(id(scorer) for scorer in scorers)
+        if scored_by != self._scored_by:
+            # The scorers changed, so none of the cached scores are valid
+            self._scored_by = scored_by
+            self._scores = np.zeros((len(self._slot_items), len(scorers)))
+            self._dirty[:] = self._live
+
+        live_slots = np.flatnonzero(self._live)
+        live_items = [self._slot_items[slot] for slot in live_slots]
+        dirty_slots = live_slots[self._dirty[live_slots]]
+        dirty_items = [self._slot_items[slot] for slot in dirty_slots]
+        for column, scorer in enumerate(scorers):
+            if scorer.STATIC:
+                slots, items = dirty_slots, dirty_items
+            else:
+                slots, items = live_slots, live_items
+            if len(slots) == 0:
+                continue
+            out = np.zeros(len(slots))
+            scorer.contrib_score(self, items, out, probe_fn)
+            self._scores[slots, column] = out
+        self._dirty[:] = False
+        self._ranking = None
+        return live_slots
+
     _max_probed = 0
 
     def update_choices(self, probe_fn=None):
-        old_item_identifiers = set(self.items.keys())
+        seen_keys = set()
         t_unix_ns = time_unix_ns()
+        self._ranking = None
         for c in self._contributors():
             expired = set()
             for key, item in c._items.items():
                 full_key = (c.identifier, item.identifier)
-                self.items[full_key] = item
-                old_item_identifiers.discard(full_key)
+                self._put(full_key, item)
+                seen_keys.add(full_key)
                 if (
                     # Expire items which have outlived their lifetimes
                     item.config.lifetime is not None
@@ -252,12 +357,13 @@ class Consumer(HasConverters, sh_obj.SharedObject):
 
         # Make sure we update the cached active object if the identifier is the same
         # but the LookAtItem object's identity changed
+        active_slot = None
         if self.active:
-            new_item = self.items.get(
+            active_slot = self._slot_of.get(
                 (self.active.config.identifier, self.active.identifier), None
             )
-            if new_item is not None:
-                self.active = new_item
+            if active_slot is not None:
+                self.active = self._slot_items[active_slot]
 
         # First check if we are still within the lookat period
         # If we are, we do not change the choice sorting at all
@@ -268,41 +374,38 @@ class Consumer(HasConverters, sh_obj.SharedObject):
         ):
             return
 
-        for key in old_item_identifiers:
-            self.items.pop(key)
-
-        # Select the decider to use
-        d = self._decider()
+        for key in [k for k in self._slot_of if k not in seen_keys]:
+            if self._slot_of[key] == active_slot:
+                active_slot = None
+            self._drop(key)
 
-        # SPEED: a 2d array here might make more sense, as we know the number of scorers
-        scores = [[] for _ in self.items]
-        if d is not None:
-            for scorer in d._scorers:
-                scorer.contrib_score(self, self.items.values(), scores, probe_fn)
-        else:
-            scores = [[0] for _ in self.items]
+        live_slots = self._rescore(self._decider(), probe_fn)
 
-        sorted_scores = sorted(
-            zip(self.items.values(), scores), key=lambda x: sum(x[1]), reverse=True
-        )
-        self.items = OrderedDict(
-            ((i.config.identifier, i.identifier), i) for i, _score in sorted_scores
-        )
         if probe_fn:
-            item_length = len(sorted_scores)
+            ranked = self.ranked_items()
+            item_length = len(ranked)
             if item_length > self._max_probed:
                 self._max_probed = item_length
-            for i, (item, s) in enumerate(sorted_scores):
-                probe_fn(f"#{i}", [item.identifier, item.config.name, s])
+            for i, item in enumerate(ranked):
+                slot = self._slot_of[(item.config.identifier, item.identifier)]
+                probe_fn(
+                    f"#{i}",
+                    [item.identifier, item.config.name, self._scores[slot].tolist()],
+                )
             for i in range(item_length, self._max_probed):
                 probe_fn(f"#{i}", [])
 
-        if not sorted_scores:
+        if len(live_slots) == 0:
             self.active = None
             return
 
-        # Update active
-        top = sorted_scores[0][0]
+        # Update active. Ties are kept on the current item to avoid flicking between equals
+        totals = self._scores[live_slots].sum(axis=1)
+        best = int(np.argmax(totals))
+        top_slot = live_slots[best]
+        if active_slot is not None and self._scores[active_slot].sum() >= totals[best]:
+            top_slot = active_slot
+        top = self._slot_items[top_slot]
         if self.active != top:
             self.active = top
             self.active_changed_at = t_monotonic
@@ -337,7 +440,7 @@ class ConsumerRef(sh_obj.SharedObjectRef):
         active = None
         if tag is not None:
             # Skip items missing the requested tags (no tags = all tags)
-            for item in c.items.values():
+            for item in c.ranked_items():
                 if not item.config.only_tags or tag in item.config.only_tags:
                     active = item
                     break
@@ -345,7 +448,7 @@ class ConsumerRef(sh_obj.SharedObjectRef):
             # Skip items tagged solely with the given tag
             # This is to support some consumers wanting to ignore eyes-only items
             tag_tuple = (ignore_exclusive_tag,)
-            for item in c.items.values():
+            for item in c.ranked_items():
                 if (
                     not item.config.only_tags
                     or tuple(item.config.only_tags) == tag_tuple
@@ -373,8 +476,19 @@ class ConsumerRef(sh_obj.SharedObjectRef):
 
 
 class Scorer(HasConverters):
+    # Set on scorers whose score for an item depends only on that item, so the consumer
+    # only rescores items which have been added or replaced since the last update
+    STATIC = False
+
     @abstractmethod
-    def contrib_score(self, items: Iterable[LookAtItem]) -> Iterable[int]:
+    def contrib_score(
+        self,
+        consumer: Consumer,
+        items: List[LookAtItem],
+        out: np.ndarray,
+        probe_fn: Optional[Callable],
+    ):
+        """Write the score of each item into the matching element of out."""
         pass
 
 
@@ -391,12 +505,11 @@ class ListScorer(Scorer):
     def contrib_score(
         self,
         consumer: Consumer,
-        items: Iterable[LookAtItem],
-        out: List[List[int]],
+        items: List[LookAtItem],
+        out: np.ndarray,
         probe_fn: Callable,
     ):
-        for o, s in zip(out, self.score(consumer, items, probe_fn)):
-            o.append(s)
+        out[:] = list(self.score(consumer, items, probe_fn))
 
 
 class MapScorer(Scorer):
@@ -409,12 +522,12 @@ class MapScorer(Scorer):
     def contrib_score(
         self,
         consumer: Consumer,
-        items: Iterable[LookAtItem],
-        out: List[List[int]],
+        items: List[LookAtItem],
+        out: np.ndarray,
         probe_fn,
     ):
-        for o, item in zip(out, items):
-            o.append(self.score(consumer, item, probe_fn))
+        for i, item in enumerate(items):
+            out[i] = self.score(consumer, item, probe_fn)
 
 
 class Decider(sh_obj.SharedObject):
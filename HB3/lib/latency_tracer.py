@@ -0,0 +1,195 @@
+"""Trace the latency of conversational turns from the end of the user's speech to the robot's reply.
+
+A trace is started when speech is recognised, keyed on the id of the speech_recognized
+event. Everything downstream carries that id (or the id of an item derived from it) as its
+parent_item_id. Derived items are linked to their parent so that their milestones land on
+the original trace.
+
+Milestones, in the order they are expected:
+    vad_end           voice activity detection saw the user stop talking
+    asr_final         the final speech recognition result was posted
+    llm_first_token   the first chunk of the LLM response arrived
+    tts_first_chunk   the first chunk of the reply finished synthesizing
+    first_audio       the first chunk of the reply started playing
+
+Tracing is disabled by default, in which case marking is a single flag check.
+Tests/Get_Chat_Times.py enables it, reports each turn and exports the session for
+comparison between releases.
+"""
+
+import os
+import json
+from time import time
+from collections import OrderedDict
+from dataclasses import field, dataclass
+from typing import Callable, Optional
+
+import numpy as np
+
+VAD_END = "vad_end"
+ASR_FINAL = "asr_final"
+LLM_FIRST_TOKEN = "llm_first_token"
+TTS_FIRST_CHUNK = "tts_first_chunk"
+FIRST_AUDIO = "first_audio"
+MILESTONES = (VAD_END, ASR_FINAL, LLM_FIRST_TOKEN, TTS_FIRST_CHUNK, FIRST_AUDIO)
+
+EXPORT_DIRECTORY = "/var/opt/tritium/profiles/chat_latency"
+
+# A VAD end is only attributed to speech recognised within this long of it
+MAX_VAD_TO_ASR_S = 10.0
+
+# Bounds on the number of open traces and linked items which are remembered
+MAX_OPEN_TRACES = 32
+MAX_LINKS = 512
+
+PERCENTILES = (50, 90, 99)
+
+
+@dataclass
+class Trace:
+    trace_id: str
+    # Milestone name -> unix time in seconds
+    marks: dict[str, float] = field(default_factory=dict)
+
+    @property
+    def complete(self) -> bool:
+        return FIRST_AUDIO in self.marks
+
+    @property
+    def reference(self) -> Optional[float]:
+        """The time latencies are measured from: the end of speech, falling back to the ASR result."""
+        return self.marks.get(VAD_END, self.marks.get(ASR_FINAL))
+
+    def latencies(self) -> dict[str, float]:
+        """Seconds from the reference to each later milestone."""
+        reference = self.reference
+        if reference is None:
+            return {}
+        return {
+            name: self.marks[name] - reference
+            for name in MILESTONES
+            if name in self.marks and name != VAD_END
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "marks": self.marks,
+            "latencies": self.latencies(),
+        }
+
+
+class LatencyTracer:
+    def __init__(self):
+        self.enabled = False
+        self.on_complete: Optional[Callable[[Trace], None]] = None
+        self.reset()
+
+    def reset(self):
+        self.session_started = time()
+        self.completed: list[Trace] = []
+        self._open: OrderedDict[str, Trace] = OrderedDict()
+        self._roots: OrderedDict[str, str] = OrderedDict()
+        self._last_vad_end: Optional[float] = None
+
+    def enable(self, enabled: bool = True):
+        if enabled and not self.enabled:
+            self.reset()
+        self.enabled = enabled
+
+    def vad_end(self, t: Optional[float] = None):
+        if self.enabled:
+            self._last_vad_end = time() if t is None else t
+
+    def start(self, trace_id: Optional[str], t: Optional[float] = None):
+        """Start a trace when the final speech recognition result is posted."""
+        if not self.enabled or trace_id is None:
+            return
+        t = time() if t is None else t
+        trace = Trace(trace_id)
+        if (
+            self._last_vad_end is not None
+            and 0 <= t - self._last_vad_end <= MAX_VAD_TO_ASR_S
+        ):
+            trace.marks[VAD_END] = self._last_vad_end
+        self._last_vad_end = None
+        trace.marks[ASR_FINAL] = t
+        self._open[trace_id] = trace
+        self._roots[trace_id] = trace_id
+        while len(self._open) > MAX_OPEN_TRACES:
+            self._open.popitem(last=False)
+
+    def link(self, item_id: Optional[str], parent_item_id: Optional[str]):
+        """Record that item_id was derived from parent_item_id."""
+        if not self.enabled or item_id is None or item_id == parent_item_id:
+            return
+        if (root := self._roots.get(parent_item_id)) is not None:
+            self._roots[item_id] = root
+            while len(self._roots) > MAX_LINKS:
+                self._roots.popitem(last=False)
+
+    def mark(self, item_id: Optional[str], milestone: str, t: Optional[float] = None):
+        """Record a milestone for the trace item_id belongs to. Only the first of each is kept."""
+        if not self.enabled:
+            return
+        if (root := self._roots.get(item_id)) is None:
+            return
+        if (trace := self._open.get(root)) is None or milestone in trace.marks:
+            return
+        trace.marks[milestone] = time() if t is None else t
+        if trace.complete:
+            del self._open[root]
+            self.completed.append(trace)
+            if self.on_complete is not None:
+                self.on_complete(trace)
+
+    def summary(self) -> dict:
+        """Percentiles (in seconds) of the latency to each milestone over completed traces."""
+        summary = {"n_traces": len(self.completed)}
+        for name in MILESTONES[1:]:
+            values = [
+                latency
+                for trace in self.completed
+                if (latency := trace.latencies().get(name)) is not None
+            ]
+            if values:
+                summary[name] = {
+                    f"p{q}": float(p)
+                    for q, p in zip(PERCENTILES, np.percentile(values, PERCENTILES))
+                }
+                summary[name]["mean"] = float(np.mean(values))
+        return summary
+
+    def export(self, path: Optional[str] = None, label: Optional[str] = None) -> str:
+        """Write the session summary and traces as JSON. Returns the path written to."""
+        if path is None:
+            path = os.path.join(EXPORT_DIRECTORY, f"{int(self.session_started)}.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "label": label,
+                    "session_started": self.session_started,
+                    "summary": self.summary(),
+                    "traces": [trace.to_dict() for trace in self.completed],
+                },
+                f,
+                indent=2,
+            )
+        return path
+
+
+def compare(summary: dict, baseline: dict) -> dict:
+    """The change in each percentile from a baseline summary, in seconds."""
+    return {
+        name: {
+            stat: value - baseline[name][stat]
+            for stat, value in stats.items()
+            if stat in baseline.get(name, {})
+        }
+        for name, stats in summary.items()
+        if isinstance(stats, dict) and name in baseline
+    }
+
+
+TRACER = LatencyTracer()
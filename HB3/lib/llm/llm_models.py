@@ -74,6 +74,9 @@ class LLMModel:
             self.functions_map = FUNCTION_PARSER.get_functions_prompt_map(functions)
         else:
             self.functions_map = None
+        self._full_map = None
+        self._full_map_functions = None
+        self._functions_prompt = None
 
     def set_model(self, model: str) -> None:
         """
@@ -99,20 +102,27 @@ class LLMModel:
         # This assumes none of the functions have the same name (should be a safe assumption)
         factory_funcs = []
         for builder in self.action_builders:
-            factory_funcs.extend(builder.factory())
+            factory_funcs.extend(builder.actions())
+        # Builders return the same functions until their state changes, so the map can be reused
+        if self._full_map is not None and factory_funcs == self._full_map_functions:
+            return self._full_map
         factory_function_map = FUNCTION_PARSER.get_functions_prompt_map(factory_funcs)
         # merge the dicts
         if self.functions_map is not None:
-            return factory_function_map | self.functions_map
+            self._full_map = factory_function_map | self.functions_map
         else:
-            return factory_function_map
+            self._full_map = factory_function_map
+        self._full_map_functions = factory_funcs
+        self._functions_prompt = None
+        return self._full_map
 
     @property
     def functions_prompt(self):
-        ret = []
-        ret.extend(fun["prompt"] for fun in self.full_map.values())
-        if ret:
-            return ret
+        full_map = self.full_map
+        if self._functions_prompt is None:
+            self._functions_prompt = [fun["prompt"] for fun in full_map.values()]
+        if self._functions_prompt:
+            return self._functions_prompt
 
     async def get_message_prompt(self) -> list[dict]:
         """Get the prompt from the interaction history, profiles etc.
@@ -206,7 +216,7 @@ class LLMVisionModel(LLMModel):
         Returns:
             a list of messages to be passed to the openai api
         """
-        image_b64 = await get_image_b64()
+        image_b64 = await get_image_b64(turn_id=ACTION_UTIL.PARENT_ITEM_ID.get(None))
 
         # Vision models do not support function calling!
         messages = [
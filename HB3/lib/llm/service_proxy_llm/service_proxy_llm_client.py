@@ -1,7 +1,9 @@
 import json
 import uuid
 import asyncio
+import itertools
 import dataclasses
+from contextlib import aclosing
 from random import randrange
 from typing import Optional, AsyncGenerator
 
@@ -12,20 +14,60 @@ from websockets.exceptions import InvalidURI, InvalidHandshake
 
 RAGResources = system.import_library("../../../robot_state/RAGCollectionInfo.py")
 
+# Requests are sent in order of the priority of their purpose, lowest first, and then in
+# the order they were made, so that replies aren't queued behind background requests
+PURPOSE_PRIORITIES: dict[Optional[str], int] = {
+    "process ASR": 0,
+    "verbal interaction": 0,
+    "non-verbal interaction": 0,
+    "handle interruption": 0,
+    "determine turn to speak": 0,
+    "speculative process ASR": 1,
+    "speculative verbal interaction": 1,
+    "keep talking": 1,
+    "silent mode": 1,
+    "vision": 1,
+    "detect language": 2,
+    "facial expression": 2,
+    "update profile": 3,
+}
+DEFAULT_PRIORITY = 1
+# Cancellations are sent before any request
+CANCEL_PRIORITY = -1
+
+# Requests are cancelled if this many of their responses are waiting to be read
+MAX_BUFFERED_RESPONSES = 1000
+# The most cancelled requests whose late responses are ignored, rather than treated as
+# unexpected
+MAX_CANCELLED_ITEMS = 256
+
+
+def purpose_priority(purpose: Optional[str]) -> int:
+    return PURPOSE_PRIORITIES.get(purpose, DEFAULT_PRIORITY)
+
 
 @dataclasses.dataclass
 class RequestStatus:
     item_id: str
     responses: asyncio.Queue[dict] = dataclasses.field(default_factory=asyncio.Queue)
+    # Whether the request has been sent, so the server needs to be told if it is cancelled
+    sent: bool = False
 
 
 class ServiceProxyLLMClient:
 
     MAX_RESPONSE_WAIT_TIME_SECONDS = 30
 
-    def __init__(self, url, system_id, credentials) -> None:
+    def __init__(self, url, system_id, credentials, send_cancellations=False) -> None:
         self.llm_items: dict[str, RequestStatus] = {}
-        self.request_queue: asyncio.Queue[str] = asyncio.Queue()
+        # (priority, order, item_id, message)
+        self.request_queue: asyncio.PriorityQueue[tuple[int, int, str, str]] = (
+            asyncio.PriorityQueue()
+        )
+        self._request_order = itertools.count()
+        # Requests cancelled after they were sent, which may still get responses
+        self._cancelled: dict[str, None] = {}
+        self.send_cancellations = send_cancellations
         self.url = url
         self.system_id = system_id
         self.credentials = credentials
@@ -110,6 +152,7 @@ class ServiceProxyLLMClient:
                 await cancel_task_log_exceptions(requests_loop)
 
             self.llm_items.clear()
+            self._cancelled.clear()
             await asyncio.sleep(
                 randrange(10, 50) / 10
             )  # wait 1-5 seconds before trying to reconnect
@@ -122,7 +165,15 @@ class ServiceProxyLLMClient:
         ) -> None:
             while True:
                 try:
-                    request = await self.request_queue.get()
+                    priority, _, item_id, request = await self.request_queue.get()
+                    if priority == CANCEL_PRIORITY:
+                        if item_id not in self._cancelled:
+                            continue  # Sent on an earlier connection
+                    elif (request_status := self.llm_items.get(item_id)) is None:
+                        log.info(f"Request cancelled before it was sent: {item_id}")
+                        continue
+                    else:
+                        request_status.sent = True
                     await ws.send(request)
                     log.info(f"Request sent: {request}")
                 except websockets.exceptions.WebSocketException:
@@ -191,9 +242,22 @@ class ServiceProxyLLMClient:
                             if response_id is None:
                                 log.error(f"Error response: {response['message']}")
                                 return  # reconnect
-                            try:
-                                await self.llm_items[response_id].responses.put(payload)
-                            except KeyError:
+                            request_status = self.llm_items.get(response_id)
+                            if request_status is not None:
+                                request_status.responses.put_nowait(payload)
+                                if (
+                                    request_status.responses.qsize()
+                                    > MAX_BUFFERED_RESPONSES
+                                ):
+                                    log.warning(
+                                        f"Cancelling request {response_id}, its responses aren't being read"
+                                    )
+                                    self.cancel(response_id)
+                            elif response_id in self._cancelled:
+                                # Sent before the server received the cancellation
+                                if response_type != "llm_chunk":
+                                    del self._cancelled[response_id]
+                            else:
                                 log.error(
                                     f"No matching `item_id` found for res: {response}\n {self.llm_items.keys()}"
                                 )
@@ -271,7 +335,9 @@ class ServiceProxyLLMClient:
         try:
             msg: str = json.dumps(request)
             self.llm_items[request_id] = RequestStatus(request_id)
-            await self.request_queue.put(msg)
+            self.request_queue.put_nowait(
+                (purpose_priority(purpose), next(self._request_order), request_id, msg)
+            )
         except Exception:
             log.exception(
                 "Failed to send LLM request",
@@ -280,80 +346,117 @@ class ServiceProxyLLMClient:
             log.error(f"request the caused the error: {request}")
             raise
 
-    async def run_chat_streamed(
-        self,
-        model: str,
-        messages: list[dict],
-        functions: Optional[list[dict]] = None,
-        parent_item_id: Optional[str] = None,
-        purpose: Optional[str] = None,
-        **kwargs,
-    ) -> Optional[AsyncGenerator[dict[str, str], None]]:
-        request_id = str(uuid.uuid4())
-        backend: dict[str, any] = kwargs
-        try:
-            await self._request(
-                request_id,
-                model=model,
-                message=messages,
-                function=functions,
-                backend=backend,
-                parent_item_id=parent_item_id,
-                purpose=purpose,
-            )
-        except asyncio.TimeoutError as e:
-            log.error(f"{e}: {request_id}: \n {messages}")
+    def cancel(self, request_id: str):
+        """Stop waiting for the responses to a request, and tell the server to stop it.
+
+        Any response still being waited for ends, and later responses are ignored.
+        """
+        request_status = self.llm_items.pop(request_id, None)
+        if request_status is None:
+            return
+        request_status.responses.put_nowait(
+            {"response": {"type": "cancelled", "item_id": request_id}}
+        )
+        if not request_status.sent or self._disconnect.is_set():
             return
+        self._cancelled[request_id] = None
+        while len(self._cancelled) > MAX_CANCELLED_ITEMS:
+            del self._cancelled[next(iter(self._cancelled))]
+        if self.send_cancellations:
+            msg = json.dumps({"type": "cancel", "item_id": request_id})
+            self.request_queue.put_nowait(
+                (CANCEL_PRIORITY, next(self._request_order), request_id, msg)
+            )
 
-        request_status = self.llm_items[request_id]
+    async def _responses(
+        self, request_status: RequestStatus, messages: list[dict]
+    ) -> AsyncGenerator[dict, None]:
+        """The chunks of the response to a request, and then its `llm_done` item.
 
-        async def response_generator():
+        The request is cancelled if this is closed before the response is done.
+        """
+        request_id = request_status.item_id
+        try:
             while True:
                 # Create two tasks: one for the response and one for self._disconnect.wait()
                 response_task = asyncio.create_task(request_status.responses.get())
                 disconnect_task = asyncio.create_task(self._disconnect.wait())
 
                 # Wait for either the response or the disconnect.
-                done, _ = await asyncio.wait(
-                    [response_task, disconnect_task],
-                    timeout=ServiceProxyLLMClient.MAX_RESPONSE_WAIT_TIME_SECONDS,
-                    return_when=asyncio.FIRST_COMPLETED,
-                )
+                try:
+                    done, _ = await asyncio.wait(
+                        [response_task, disconnect_task],
+                        timeout=ServiceProxyLLMClient.MAX_RESPONSE_WAIT_TIME_SECONDS,
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+                finally:
+                    disconnect_task.cancel()
+                    if not response_task.done():
+                        response_task.cancel()
 
                 if disconnect_task in done:
                     log.warning(
                         "Disconnect event set during wait; stopping response generation."
                     )
-                    # Cancel the other pending task.
-                    if not response_task.done():
-                        response_task.cancel()
                     return
 
                 if response_task not in done:
                     log.error(f"service proxy LLM timeout: {request_id}: \n {messages}")
-                    self.llm_items.pop(request_id, None)
-                    disconnect_task.cancel()
                     return
 
                 # Response is ready.
-                response = response_task.result()
-                disconnect_task.cancel()
-                item: dict = response["response"]
-
-                res_type: str = item.get("type")
+                item: dict = response_task.result()["response"]
 
-                match res_type:
+                match item.get("type"):
                     case "llm_chunk":
-                        yield item.copy()
+                        yield item
                     case "llm_done":
                         self.llm_items.pop(request_id, None)
+                        yield item
                         return
                     case "error":
                         log.error(f"Error: {item}")
                         self.llm_items.pop(request_id, None)
                         return
+                    case "cancelled":
+                        return
                     case _:
                         log.warning(f"Unhandled item: {item}")
+        finally:
+            self.cancel(request_id)
+
+    async def run_chat_streamed(
+        self,
+        model: str,
+        messages: list[dict],
+        functions: Optional[list[dict]] = None,
+        parent_item_id: Optional[str] = None,
+        purpose: Optional[str] = None,
+        **kwargs,
+    ) -> Optional[AsyncGenerator[dict[str, str], None]]:
+        request_id = str(uuid.uuid4())
+        backend: dict[str, any] = kwargs
+        try:
+            await self._request(
+                request_id,
+                model=model,
+                message=messages,
+                function=functions,
+                backend=backend,
+                parent_item_id=parent_item_id,
+                purpose=purpose,
+            )
+        except asyncio.TimeoutError as e:
+            log.error(f"{e}: {request_id}: \n {messages}")
+            return
+
+        request_status = self.llm_items[request_id]
+
+        async def response_generator():
+            async with aclosing(self._responses(request_status, messages)) as responses:
+                async for item in responses:
+                    if item["type"] == "llm_chunk":
+                        yield item.copy()
 
         return response_generator()
 
@@ -384,64 +487,22 @@ class ServiceProxyLLMClient:
             return
 
         request_status = self.llm_items[request_id]
-
-        while True:
-            # Create two tasks: one for the response and one for self._disconnect.wait()
-            response_task = asyncio.create_task(request_status.responses.get())
-            disconnect_task = asyncio.create_task(self._disconnect.wait())
-
-            # Wait for either the response or the disconnect.
-            done, _ = await asyncio.wait(
-                [response_task, disconnect_task],
-                timeout=ServiceProxyLLMClient.MAX_RESPONSE_WAIT_TIME_SECONDS,
-                return_when=asyncio.FIRST_COMPLETED,
-            )
-
-            if disconnect_task in done:
-                log.warning(
-                    "Disconnect event set during wait; stopping response generation."
-                )
-                # Cancel the other pending task.
-                if not response_task.done():
-                    response_task.cancel()
-                return
-
-            if response_task not in done:
-                log.error(f"service proxy LLM timeout: {request_id}: \n {messages}")
-                self.llm_items.pop(request_id, None)
-                disconnect_task.cancel()
-                return
-
-            # Response is ready.
-            response = response_task.result()
-            disconnect_task.cancel()
-            item: dict = response["response"]
-
-            res_type: str = item.get("type")
-
-            match (res_type):
-                case "llm_chunk":
-                    pass
-                case "llm_done":
-                    choices: list[dict] = item["choices"]
-                    index: Optional[int] = None
-                    role: Optional[str] = None
-                    content: str = ""
-                    for c in choices:
-                        delta = c["delta"]
-                        index = c["index"] if index is None else index
-                        role = delta["role"] if role is None else role
-                        if index == c["index"] and isinstance(delta["content"], str):
-                            content += delta["content"]
-
-                    self.llm_items.pop(request_id)
-                    return {"content": content, "role": role}
-                case "error":
-                    log.error(f"Error: {item}")
-                    self.llm_items.pop(request_id)
-                    return
-                case _:
-                    log.warning(f"Unhandled item: {item}")
+        async with aclosing(self._responses(request_status, messages)) as responses:
+            async for item in responses:
+                if item["type"] != "llm_done":
+                    continue
+                choices: list[dict] = item["choices"]
+                index: Optional[int] = None
+                role: Optional[str] = None
+                content: str = ""
+                for c in choices:
+                    delta = c["delta"]
+                    index = c["index"] if index is None else index
+                    role = delta["role"] if role is None else role
+                    if index == c["index"] and isinstance(delta["content"], str):
+                        content += delta["content"]
+
+                return {"content": content, "role": role}
 
     async def run_completion(self, **kwargs) -> Optional[dict[str, any]]:
         """Run the completion mode, with no streaming."""
@@ -26,7 +26,12 @@ else:
         if CONFIG["SERVICE_PROXY_LLM_URL_OVERRIDE"]
         else config.url
     )
-    client = ServiceProxyLLMClient(service_proxy_url, config.identifier, config.token)
+    client = ServiceProxyLLMClient(
+        service_proxy_url,
+        config.identifier,
+        config.token,
+        send_cancellations=CONFIG["SERVICE_PROXY_LLM_SEND_CANCELLATIONS"],
+    )
 
 
 async def start():
@@ -0,0 +1,305 @@
+"""A low overhead profiler for the HB3 scripts.
+
+Scripts opt their tick and message handlers in with decorators:
+
+    @system.tick(fps=60)
+    @profiler.profiled_tick(__file__, fps=60)
+    def on_tick(self):
+        ...
+
+    @profiler.profiled_messages(__file__)
+    def on_message(self, channel, message):
+        ...
+
+While profiling is disabled the decorated handlers only pay for one flag check per call.
+While enabled, the profiler records per script tick duration histograms, overruns (ticks
+taking longer than their period) and late ticks (started well after their period), the
+time spent handling each messaging channel, the event loop lag, and the interpreter's
+allocation rate. HB3_Controller runs the monitor, which reports through probes and
+periodically dumps everything to PROFILE_DUMP_PATH as JSON.
+"""
+
+import gc
+import os
+import sys
+import json
+import asyncio
+import inspect
+import functools
+from bisect import bisect_left
+from time import perf_counter, time
+from typing import Callable, Optional
+
+PROFILE_DUMP_PATH = "/var/opt/tritium/profiles/hb3_profile.json"
+
+# Upper edges of the histogram buckets in milliseconds. The last bucket is unbounded.
+HISTOGRAM_EDGES_MS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 33, 66, 100, 250)
+
+# A tick is late if it starts this fraction of a period after it was due
+LATE_TOLERANCE = 0.5
+
+LOOP_LAG_PERIOD_S = 0.05
+REPORT_PERIOD_S = 1.0
+DUMP_PERIOD_S = 30.0
+
+
+def script_name(path: str) -> str:
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+class Histogram:
+    __slots__ = ("counts", "n", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.counts = [0] * (len(HISTOGRAM_EDGES_MS) + 1)
+        self.n = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms: float):
+        self.counts[bisect_left(HISTOGRAM_EDGES_MS, ms)] += 1
+        self.n += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def percentile(self, q: float) -> Optional[float]:
+        """The upper edge of the bucket holding the qth percentile (capped at the max), in milliseconds."""
+        if self.n == 0:
+            return None
+        target = q / 100 * self.n
+        seen = 0
+        for edge, count in zip(HISTOGRAM_EDGES_MS, self.counts):
+            seen += count
+            if seen >= target:
+                return min(edge, self.max_ms)
+        return self.max_ms
+
+    def summary(self) -> dict:
+        return {
+            "n": self.n,
+            "mean_ms": self.total_ms / self.n if self.n else None,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "max_ms": self.max_ms,
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            **self.summary(),
+            "edges_ms": list(HISTOGRAM_EDGES_MS),
+            "counts": list(self.counts),
+        }
+
+
+class TickStats:
+    def __init__(self, fps: float):
+        self.period_s = 1 / fps
+        self.durations = Histogram()
+        self.overruns = 0
+        self.late = 0
+        self.net_blocks = 0
+        self._last_start: Optional[float] = None
+
+    def record(self, start: float, duration: float, blocks: int):
+        self.durations.add(duration * 1e3)
+        if duration > self.period_s:
+            self.overruns += 1
+        if (
+            self._last_start is not None
+            and start - self._last_start > (1 + LATE_TOLERANCE) * self.period_s
+        ):
+            self.late += 1
+        self._last_start = start
+        self.net_blocks += blocks
+
+    def summary(self, elapsed_s: float) -> dict:
+        return {
+            **self.durations.summary(),
+            "overruns": self.overruns,
+            "late": self.late,
+            # Fraction of wall time spent in this tick
+            "load": self.durations.total_ms / 1e3 / elapsed_s if elapsed_s else None,
+            "net_blocks_per_tick": (
+                self.net_blocks / self.durations.n if self.durations.n else None
+            ),
+        }
+
+    def to_dict(self, elapsed_s: float) -> dict:
+        return {
+            **self.summary(elapsed_s),
+            "fps": 1 / self.period_s,
+            "histogram": self.durations.to_dict(),
+        }
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self.reset()
+
+    def reset(self):
+        self.started_at = perf_counter()
+        self.ticks: dict[str, TickStats] = {}
+        self.messages: dict[str, dict[str, Histogram]] = {}
+        self.loop_lag = Histogram()
+        self.allocations: dict[str, float] = {}
+
+    def enable(self, enabled: bool = True):
+        if enabled and not self.enabled:
+            self.reset()
+        self.enabled = enabled
+
+    def tick(self, name: str, fps: float) -> Callable:
+        """Decorate a tick handler to record its duration."""
+
+        def decorator(fn):
+            def get_stats():
+                if (stats := self.ticks.get(name)) is None:
+                    stats = self.ticks[name] = TickStats(fps)
+                return stats
+
+            if inspect.iscoroutinefunction(fn):
+
+                @functools.wraps(fn)
+                async def wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        return await fn(*args, **kwargs)
+                    blocks = sys.getallocatedblocks()
+                    start = perf_counter()
+                    try:
+                        return await fn(*args, **kwargs)
+                    finally:
+                        get_stats().record(
+                            start,
+                            perf_counter() - start,
+                            sys.getallocatedblocks() - blocks,
+                        )
+
+            else:
+
+                @functools.wraps(fn)
+                def wrapper(*args, **kwargs):
+                    if not self.enabled:
+                        return fn(*args, **kwargs)
+                    blocks = sys.getallocatedblocks()
+                    start = perf_counter()
+                    try:
+                        return fn(*args, **kwargs)
+                    finally:
+                        get_stats().record(
+                            start,
+                            perf_counter() - start,
+                            sys.getallocatedblocks() - blocks,
+                        )
+
+            return wrapper
+
+        return decorator
+
+    def message_handler(self, name: str) -> Callable:
+        """Decorate an on_message(self, channel, message) handler to record time spent per channel."""
+
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(activity, channel, message):
+                if not self.enabled:
+                    return fn(activity, channel, message)
+                start = perf_counter()
+                try:
+                    return fn(activity, channel, message)
+                finally:
+                    channels = self.messages.setdefault(name, {})
+                    if (histogram := channels.get(channel)) is None:
+                        histogram = channels[channel] = Histogram()
+                    histogram.add((perf_counter() - start) * 1e3)
+
+            return wrapper
+
+        return decorator
+
+    async def monitor(self, probe_fn: Callable, dump_path: str = PROFILE_DUMP_PATH):
+        """Measure event loop lag and allocation rates, reporting to probes and dumping periodically."""
+        last_report = last_dump = perf_counter()
+        blocks = sys.getallocatedblocks()
+        collections = [s["collections"] for s in gc.get_stats()]
+        while True:
+            expected = perf_counter() + LOOP_LAG_PERIOD_S
+            await asyncio.sleep(LOOP_LAG_PERIOD_S)
+            t = perf_counter()
+            if not self.enabled:
+                last_report = last_dump = t
+                continue
+            self.loop_lag.add(max(0.0, t - expected) * 1e3)
+
+            if t - last_report >= REPORT_PERIOD_S:
+                elapsed = t - last_report
+                new_blocks = sys.getallocatedblocks()
+                new_collections = [s["collections"] for s in gc.get_stats()]
+                self.allocations = {
+                    "net_blocks_per_s": (new_blocks - blocks) / elapsed,
+                    # Every generation 0 collection follows threshold0 container allocations
+                    "gc_allocations_per_s": (new_collections[0] - collections[0])
+                    * gc.get_threshold()[0]
+                    / elapsed,
+                    "gc_collections_per_s": [
+                        (new - old) / elapsed
+                        for new, old in zip(new_collections, collections)
+                    ],
+                }
+                blocks, collections = new_blocks, new_collections
+                last_report = t
+                self.report(probe_fn)
+
+            if t - last_dump >= DUMP_PERIOD_S:
+                last_dump = t
+                self.dump(dump_path)
+
+    def report(self, probe_fn: Callable):
+        elapsed = perf_counter() - self.started_at
+        probe_fn("profiler.loop_lag", self.loop_lag.summary())
+        probe_fn("profiler.allocations", self.allocations)
+        for name, stats in self.ticks.items():
+            probe_fn(f"profiler.tick.{name}", stats.summary(elapsed))
+        for name, channels in self.messages.items():
+            probe_fn(
+                f"profiler.messages.{name}",
+                {channel: h.summary() for channel, h in channels.items()},
+            )
+
+    def to_dict(self) -> dict:
+        elapsed = perf_counter() - self.started_at
+        return {
+            "time": time(),
+            "elapsed_s": elapsed,
+            "loop_lag": self.loop_lag.to_dict(),
+            "allocations": self.allocations,
+            "ticks": {
+                name: stats.to_dict(elapsed) for name, stats in self.ticks.items()
+            },
+            "messages": {
+                name: {channel: h.to_dict() for channel, h in channels.items()}
+                for name, channels in self.messages.items()
+            },
+        }
+
+    def dump(self, path: str = PROFILE_DUMP_PATH):
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(self.to_dict(), f, indent=2)
+        except OSError as e:
+            log.warning(f"Unable to write profile to {path}: {e}")
+
+
+PROFILER = Profiler()
+
+
+def profiled_tick(path: str, fps: float) -> Callable:
+    """Profile a tick handler of the script at path. Goes below @system.tick."""
+    return PROFILER.tick(script_name(path), fps)
+
+
+def profiled_messages(path: str) -> Callable:
+    """Profile the on_message handler of the script at path."""
+    return PROFILER.message_handler(script_name(path))
@@ -8,10 +8,20 @@ embeddings = system.import_library("./llm/openai/embeddings.py")
 CONFIG = system.import_library("../../Config/Chat.py").CONFIG
 
 EMBEDDING_MODEL = "text-embedding-ada-002"
+# Most sentences embedded in one request
+EMBEDDING_BATCH_SIZE = 512
 CACHE_DIR = "/home/tritium/vector_search_cache"
 if not os.path.isdir(CACHE_DIR):
     os.makedirs(CACHE_DIR)
 
+# Rows the index matrix starts with, doubled whenever it is full
+INITIAL_CAPACITY = 256
+
+# Distances of the metrics an index can use, smaller being closer:
+# "l2" is the euclidean distance, "cosine" one minus the cosine similarity and
+# "inner_product" the negative inner product
+METRICS = ("l2", "cosine", "inner_product")
+
 
 def load_from_cache(sentence):
     cache_path = os.path.join(CACHE_DIR, sentence + ".npy")
@@ -30,73 +40,151 @@ def save_to_cache(sentence, embeds):
 
 
 async def get_embeds(sentence):
-    loaded_vec, loaded = load_from_cache(sentence)
-    if loaded:
-        return loaded_vec
+    return (await get_embeds_batch([sentence]))[0:1]
+
+
+async def get_embeds_batch(sentences: list[str]) -> np.ndarray:
+    """The embeddings of sentences, as rows, requesting those not cached in batches."""
+    rows: list[np.ndarray | None] = []
+    missing: list[int] = []
+    for idx, sentence in enumerate(sentences):
+        loaded_vec, loaded = load_from_cache(sentence)
+        rows.append(loaded_vec.reshape(-1) if loaded else None)
+        if not loaded:
+            missing.append(idx)
     # If not cached, regenerate
-    res = await embeddings.get_embedding(
-        input_str=sentence,
-        engine=EMBEDDING_MODEL,
-    )
-    embeds = [record.embedding for record in res.data]
-    embeds = np.array(embeds, dtype=np.float32)
-    # Save to cache
-    save_to_cache(sentence, embeds)
-    return embeds
+    for start in range(0, len(missing), EMBEDDING_BATCH_SIZE):
+        batch = missing[start : start + EMBEDDING_BATCH_SIZE]
+        res = await embeddings.get_embedding(
+            input_str=[sentences[idx] for idx in batch],
+            engine=EMBEDDING_MODEL,
+        )
+        if res is None:
+            raise Exception(f"Failed to embed {len(batch)} sentences")
+        for record in res.data:
+            idx = batch[record.index]
+            embeds = np.array([record.embedding], dtype=np.float32)
+            # Save to cache
+            save_to_cache(sentences[idx], embeds)
+            rows[idx] = embeds[0]
+    return np.stack(rows).astype(np.float32, copy=False)
 
 
 class L2_String_Vector_Index:
     embedding_tasks = set()
 
-    def __init__(self, dimension=1536):
-        self._index = []
+    def __init__(self, dimension=1536, metric="l2"):
+        """An index of sentences, searched by the distance between their embeddings.
+
+        Args:
+            dimension: the size of the embeddings.
+            metric: the distance to search by, one of METRICS.
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric {metric!r}, expected one of {METRICS}")
+        self.metric = metric
+        # Embeddings are the first `len(self)` rows, normalised for the cosine metric
+        self._index = np.zeros((INITIAL_CAPACITY, dimension), dtype=np.float32)
+        # Squared norms of the rows, for the l2 metric
+        self._norms = np.zeros(INITIAL_CAPACITY, dtype=np.float32)
         self._contents = []
         self._meta_data = []
-
-    async def fetch_embeds_and_add(self, sentence, meta_data):
-        embeds = await get_embeds(sentence)
-        self._contents.append(sentence)
-        self._meta_data.append(meta_data)
-        self._index.append(embeds)
+        # Sentences added or being embedded
+        self._sentences = set()
+
+    def __len__(self):
+        return len(self._contents)
+
+    def _prepare(self, embeds: np.ndarray) -> np.ndarray:
+        embeds = np.atleast_2d(np.asarray(embeds, dtype=np.float32))
+        if self.metric == "cosine":
+            norms = np.linalg.norm(embeds, axis=1, keepdims=True)
+            embeds = embeds / np.where(norms == 0, 1, norms)
+        return embeds
+
+    def add_embeddings(self, sentences: list[str], embeds: np.ndarray, meta_data: list):
+        """Add sentences with their embeddings (as rows) and meta data."""
+        embeds = self._prepare(embeds)
+        count, new_count = len(self), len(self) + len(sentences)
+        if new_count > len(self._index):
+            capacity = max(new_count, 2 * len(self._index))
+            index = np.zeros((capacity, self._index.shape[1]), dtype=np.float32)
+            index[:count] = self._index[:count]
+            norms = np.zeros(capacity, dtype=np.float32)
+            norms[:count] = self._norms[:count]
+            self._index, self._norms = index, norms
+        self._index[count:new_count] = embeds
+        self._norms[count:new_count] = np.einsum("ij,ij->i", embeds, embeds)
+        self._contents.extend(sentences)
+        self._meta_data.extend(meta_data)
+        self._sentences.update(sentences)
+
+    async def fetch_embeds_and_add(self, sentences, meta_data):
+        try:
+            embeds = await get_embeds_batch(sentences)
+        except Exception:
+            # So they can be added again
+            self._sentences.difference_update(sentences)
+            raise
+        self.add_embeddings(sentences, embeds, meta_data)
 
     def add(self, *items):
-        # TODO: Batch the embeds
+        sentences = []
+        meta_data = []
         for item in items:
             sentence = item["sentence"]
-            meta_data = item["meta_data"]
-            if sentence in self._contents:
+            if sentence in self._sentences:
                 continue
-            loop = asyncio.get_event_loop()
-            task = loop.create_task(self.fetch_embeds_and_add(sentence, meta_data))
-            self.embedding_tasks.add(task)
-            task.add_done_callback(lambda _: self.embedding_tasks.remove(task))
+            self._sentences.add(sentence)
+            sentences.append(sentence)
+            meta_data.append(item["meta_data"])
+        if not sentences:
+            return
+        loop = asyncio.get_event_loop()
+        task = loop.create_task(self.fetch_embeds_and_add(sentences, meta_data))
+        self.embedding_tasks.add(task)
+        task.add_done_callback(self.embedding_tasks.discard)
 
     def remove(self):
         pass
 
-    async def query(self, query, k=1):
-        def L2(a, b):
-            return np.sqrt(np.sum(np.power(a - b, 2)))
+    def search(self, embeds: np.ndarray, k=1) -> list[dict]:
+        """The k sentences closest to an embedding, closest first."""
+        count = len(self)
+        k = min(k, count)
+        if k <= 0:
+            return []
+        query = self._prepare(embeds)[0]
+        index = self._index[:count]
+        scores = index @ query
+        match self.metric:
+            case "l2":
+                # Squared distances, without the query's own norm
+                distances = self._norms[:count] - 2 * scores
+            case _:
+                distances = -scores
+        nearest = (
+            np.argpartition(distances, k - 1)[:k] if k < count else np.arange(count)
+        )
+        nearest = nearest[np.argsort(distances[nearest])]
+        match self.metric:
+            case "l2":
+                distances = np.sqrt(
+                    np.maximum(distances[nearest] + np.dot(query, query), 0)
+                )
+            case "cosine":
+                distances = 1 + distances[nearest]
+            case _:
+                distances = distances[nearest]
+        return [
+            {
+                "content": self._contents[indx],
+                "meta_data": self._meta_data[indx],
+                "distance": float(distance),
+            }
+            for indx, distance in zip(nearest, distances)
+        ]
 
+    async def query(self, query, k=1):
         embeds = await get_embeds(query)
-        distances_and_indices = sorted(
-            [[L2(embeds, I), idx] for idx, I in enumerate(self._index)]
-        )[:k]
-        query_results = []
-        result = []
-        for idx, (distance, indx) in enumerate(distances_and_indices):
-            try:
-                indx = int(indx)
-            except OverflowError:
-                continue
-            if indx == -1:
-                continue
-            result.append(
-                {
-                    "content": self._contents[indx],
-                    "meta_data": self._meta_data[indx],
-                    "distance": distance,
-                }
-            )
-        query_results.append(result)
-        return query_results
\ No newline at end of file
+        return [self.search(embeds, k)]
@@ -1,5 +1,6 @@
 """Keeps track of the robot's state."""
 
+import os
 import asyncio
 from typing import Optional, Awaitable
 from itertools import count
@@ -15,7 +16,9 @@ TYPES = system.import_library("./lib/types.py")
 
 loop = asyncio.get_event_loop()
 
-interaction_history = INTERACTION_HISTORY.InteractionHistory()
+interaction_history = INTERACTION_HISTORY.InteractionHistory(
+    archive_path=os.path.join(INTERACTION_HISTORY.ARCHIVE_DIRECTORY, "robot.jsonl")
+)
 interaction_history.register_hooks(
     ["ASR", "TTS", "non_verbal"]
 )  # ASR, TTS, and non_verbal events will be automatic added to this history
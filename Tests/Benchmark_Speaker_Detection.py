@@ -0,0 +1,200 @@
+"""
+Benchmark speaker attribution on a recording of microphone and face data.
+
+Compares the old mode-of-DOA speaker attribution with the decaying DOA histogram used by
+HB3/Perception/Do_Speaker_Detection.py, reporting the fraction of labelled ticks attributed
+to the right person and the CPU time spent per tick.
+
+The recording is a JSON lines file, one line per microphone sample:
+{"t": <seconds>, "direction": <microphone direction or null>, "voice_activity": <bool>,
+ "faces": {"<face id>": [x, y], ...}, "speaker": "<face id of the person talking or null>"}
+
+Without a recording at RECORDING_PATH, a synthetic one is generated from SYNTHETIC_SEED:
+three people taking turns to speak, with noisy directions, reflections and false voice
+activity, so the results can be reproduced anywhere.
+"""
+
+import os
+import json
+import math
+from time import process_time
+from collections import defaultdict
+
+import numpy as np
+
+doa_histogram = system.import_library("../HB3/Perception/lib/doa_histogram.py")
+
+RECORDING_PATH = "/var/opt/tritium/recordings/speaker_detection.jsonl"
+TICK_PERIOD_S = 0.25  # Do_Speaker_Detection ticks at 4 fps
+MATCHING_FACE_ANGLE = 20
+
+SYNTHETIC_SEED = 0
+SYNTHETIC_DURATION_S = 600
+SYNTHETIC_SAMPLE_RATE_HZ = 20
+# Azimuths of the synthetic people (degrees, positive to the robot's left), 1.5 m away
+SYNTHETIC_FACE_AZIMUTHS = {"1": -40, "2": 5, "3": 45}
+SYNTHETIC_FACE_DISTANCE_M = 1.5
+# Standard deviation of the direction of the speaker's voice, in degrees
+SYNTHETIC_DOA_NOISE_DEG = 8
+# Chance of a sample while someone speaks coming from a random direction, or being silent
+SYNTHETIC_REFLECTION_PROB = 0.15
+SYNTHETIC_DROPOUT_PROB = 0.1
+# Chance of voice activity from a random direction while nobody speaks
+SYNTHETIC_FALSE_ACTIVITY_PROB = 0.05
+
+
+def generate_recording(seed: int = SYNTHETIC_SEED) -> list[dict]:
+    """A synthetic recording of people at fixed positions taking turns to speak."""
+    rng = np.random.default_rng(seed)
+    face_ids = list(SYNTHETIC_FACE_AZIMUTHS)
+    faces = {
+        face_id: [
+            SYNTHETIC_FACE_DISTANCE_M * math.cos(math.radians(azimuth)),
+            SYNTHETIC_FACE_DISTANCE_M * math.sin(math.radians(azimuth)),
+        ]
+        for face_id, azimuth in SYNTHETIC_FACE_AZIMUTHS.items()
+    }
+    samples = []
+    speaker = None
+    turn_end = 0.0
+    for i in range(SYNTHETIC_DURATION_S * SYNTHETIC_SAMPLE_RATE_HZ):
+        t = i / SYNTHETIC_SAMPLE_RATE_HZ
+        if t >= turn_end:
+            # Turns of 2 to 8 s, with pauses of 0.5 to 2 s between them
+            if speaker is None:
+                speaker = face_ids[rng.integers(len(face_ids))]
+                turn_end = t + rng.uniform(2, 8)
+            else:
+                speaker = None
+                turn_end = t + rng.uniform(0.5, 2)
+        azimuth = rng.uniform(-180, 180)
+        if speaker is not None:
+            voice_activity = rng.random() >= SYNTHETIC_DROPOUT_PROB
+            if rng.random() >= SYNTHETIC_REFLECTION_PROB:
+                azimuth = SYNTHETIC_FACE_AZIMUTHS[speaker] + rng.normal(
+                    0, SYNTHETIC_DOA_NOISE_DEG
+                )
+        else:
+            voice_activity = rng.random() < SYNTHETIC_FALSE_ACTIVITY_PROB
+        samples.append(
+            {
+                "t": t,
+                "direction": int(round((90 - azimuth + 180) % 360 - 180)),
+                "voice_activity": bool(voice_activity),
+                "faces": faces,
+                "speaker": speaker,
+            }
+        )
+    return samples
+
+
+class ModeAttributor:
+    """The attribution Do_Speaker_Detection used before the DOA histogram."""
+
+    def __init__(self):
+        self.doa_bin = defaultdict(lambda: 0)
+
+    def on_sample(self, sample, speaking):
+        if sample["voice_activity"] and sample["direction"] is not None:
+            self.doa_bin[90 - sample["direction"]] += 1
+        elif not speaking:
+            self.doa_bin.clear()
+
+    def get_speaker(self, faces, t):
+        doas_sans_0 = {d: n for d, n in self.doa_bin.items() if not d == 0}
+        if not doas_sans_0:
+            return None
+        mode_doa = max(doas_sans_0.items(), key=lambda item: item[1])[0]
+        best_possible_match = None
+        for face_id, (x, y) in faces.items():
+            distance = abs(math.degrees(math.atan2(y, x)) - mode_doa)
+            if distance < MATCHING_FACE_ANGLE:
+                if not best_possible_match or distance < best_possible_match[0]:
+                    best_possible_match = (distance, face_id)
+        return best_possible_match[1] if best_possible_match else None
+
+
+class HistogramAttributor:
+    def __init__(self):
+        self.histogram = doa_histogram.DOAHistogram()
+        self.speaking = False
+
+    def _decay(self, t):
+        self.histogram.decay(
+            t,
+            (
+                doa_histogram.SPEAKING_DECAY_S
+                if self.speaking
+                else doa_histogram.SILENT_DECAY_S
+            ),
+        )
+
+    def on_sample(self, sample, speaking):
+        self.speaking = speaking
+        self._decay(sample["t"])
+        if sample["voice_activity"] and sample["direction"] is not None:
+            self.histogram.add(90 - sample["direction"])
+
+    def get_speaker(self, faces, t):
+        self._decay(t)
+        peaks = self.histogram.peaks(1)
+        if not peaks or not faces:
+            return None
+        face_ids = list(faces)
+        positions = np.array([faces[face_id] for face_id in face_ids])
+        angles = np.degrees(np.arctan2(positions[:, 1], positions[:, 0]))
+        (index,) = doa_histogram.match_peaks_to_angles(
+            peaks, angles, MATCHING_FACE_ANGLE
+        )
+        return face_ids[index] if index is not None else None
+
+
+def run(samples, attributor):
+    correct = 0
+    labelled = 0
+    cpu_time = 0.0
+    n_ticks = 0
+    next_tick = samples[0]["t"] if samples else 0
+    for sample in samples:
+        speaking = sample["speaker"] is not None
+        start = process_time()
+        attributor.on_sample(sample, speaking)
+        cpu_time += process_time() - start
+        while sample["t"] >= next_tick:
+            next_tick += TICK_PERIOD_S
+            start = process_time()
+            speaker = attributor.get_speaker(sample["faces"], sample["t"])
+            cpu_time += process_time() - start
+            n_ticks += 1
+            if speaking:
+                labelled += 1
+                correct += speaker == sample["speaker"]
+    return {
+        "accuracy": correct / labelled if labelled else None,
+        "labelled_ticks": labelled,
+        "cpu_time_per_tick_us": 1e6 * cpu_time / n_ticks if n_ticks else None,
+    }
+
+
+class Activity:
+    def on_start(self):
+        if os.path.isfile(RECORDING_PATH):
+            try:
+                with open(RECORDING_PATH, "r") as f:
+                    samples = [json.loads(line) for line in f if line.strip()]
+            except IOError as e:
+                log.error(f"Unable to read recording: {e}")
+                self.stop()
+                return
+        else:
+            log.info(f"No recording at {RECORDING_PATH}, using a synthetic one")
+            samples = generate_recording()
+
+        for name, attributor in (
+            ("mode", ModeAttributor()),
+            ("histogram", HistogramAttributor()),
+        ):
+            result = run(samples, attributor)
+            probe(name, result)
+            print(f"SPEAKER_DETECTION,{name},", result)
+        self.stop()
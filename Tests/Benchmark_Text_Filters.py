@@ -0,0 +1,105 @@
+"""
+Benchmark the text filters HB3/chat/lib/stream_outputs.py applies to each streamed chunk
+before it is spoken.
+
+A paragraph is streamed in sentence chunks, as the LLM would, and each chunk filtered for
+the robot's name and emojis and its pronunciations remapped for the voice of the default
+language. This is timed as it was done before the filters were compiled once, with the
+compiled filters cleared before every chunk, and with them kept.
+"""
+
+import re
+from time import perf_counter
+
+import numpy as np
+
+stream_outputs = system.import_library("../HB3/chat/lib/stream_outputs.py")
+PERSONA_UTIL = system.import_library("../HB3/lib/persona_util.py")
+robot_state = system.import_library("../HB3/robot_state.py").state
+
+N_REPEATS = 200
+
+PARAGRAPH = (
+    "Ameca: Hello there! I'm Ameca, a humanoid robot built in Cornwall 🤖. "
+    "Some people think my name sounds like Azi or Ami, but it doesn't. "
+    "I love talking about cyclical patterns in nature, like the seasons and the tides 🌊. "
+    "Did you know that the moon pulls on the oceans twice a day? "
+    "It's one of my favourite facts, and I could talk about it for hours. "
+    "What would you like to chat about today? "
+    "We could talk about robots, space, music, or anything else you like 😊."
+)
+CHUNKS = re.findall(r"[^.!?]+[.!?]\s*", PARAGRAPH)
+
+
+def previous_filters(msg: str, lang: str) -> str:
+    """The filters as they were: every pattern compiled again for every chunk."""
+    robot_name_colon = [
+        n + ":"
+        for n in stream_outputs.generate_string_cases(PERSONA_UTIL.get_robot_name())
+    ]
+    filtered_msg = stream_outputs.remove_patterns(msg, robot_name_colon)
+    filtered_msg = stream_outputs.emoji.replace_emoji(filtered_msg, "")
+
+    voice = robot_state.get_voice_for_language(lang)
+    backend = stream_outputs.PRONUNCIATION_BACKENDS.get(voice.backend)
+    specialized_pronunciations = {
+        k.lower(): v
+        for k, v in stream_outputs.BACKEND_SPECIALIZED_PRONUNCIATIONS.get(
+            backend, {}
+        ).items()
+    }
+    if not specialized_pronunciations:
+        return filtered_msg
+    pattern = "|".join(map(re.escape, specialized_pronunciations.keys()))
+    return re.sub(
+        pattern,
+        lambda m: specialized_pronunciations.get(m.group(0).lower(), m.group(0)),
+        filtered_msg,
+        flags=re.IGNORECASE,
+    )
+
+
+def compiled_filters(msg: str, lang: str) -> str:
+    return stream_outputs.remap_pronunciations(
+        stream_outputs.filter_text(msg),
+        stream_outputs.BACKEND_SPECIALIZED_PRONUNCIATIONS,
+        lang,
+    )
+
+
+def run(filters, clear: bool, lang: str) -> dict:
+    times_us = []
+    for _ in range(N_REPEATS):
+        for chunk in CHUNKS:
+            if clear:
+                stream_outputs.clear_cache()
+            start = perf_counter()
+            filters(chunk, lang)
+            times_us.append((perf_counter() - start) * 1e6)
+    return {
+        "mean_us_per_chunk": float(np.mean(times_us)),
+        "p50_us": float(np.percentile(times_us, 50)),
+        "max_us": float(np.max(times_us)),
+        "paragraph_us": float(np.mean(times_us)) * len(CHUNKS),
+    }
+
+
+class Activity:
+    def on_start(self):
+        lang = robot_state.default_language
+        voice = robot_state.get_voice_for_language(lang)
+        print(
+            f"TEXT_FILTERS,chunks,{len(CHUNKS)},language,{lang},backend,{voice.backend}"
+        )
+        for chunk in CHUNKS:
+            if previous_filters(chunk, lang) != compiled_filters(chunk, lang):
+                log.warning(f"Filters differ for {chunk!r}")
+        for name, filters, clear in (
+            ("previous", previous_filters, True),
+            ("compiled_cleared", compiled_filters, True),
+            ("compiled", compiled_filters, False),
+        ):
+            result = run(filters, clear, lang)
+            probe(name, result)
+            print(f"TEXT_FILTERS,{name},", result)
+        self.stop()
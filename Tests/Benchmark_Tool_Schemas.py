@@ -0,0 +1,64 @@
+"""
+Benchmark producing the tool list sent with each LLM request.
+
+Builds an LLMModel with every registered action and action builder, then times
+LLMModel.functions_prompt followed by a full_map lookup (what one turn of
+HB3/chat/modes/llm_decider_mode.py does) with the schema caches cleared before every
+turn, as before they existed, and with them kept.
+"""
+
+from time import perf_counter
+
+import numpy as np
+
+ACTION_UTIL = system.import_library("../HB3/chat/actions/action_util.py")
+FUNCTION_PARSER = system.import_library("../HB3/lib/llm/function_parser.py")
+llm_models = system.import_library("../HB3/lib/llm/llm_models.py")
+# Register the actions
+system.import_library("../HB3/chat/actions/system_actions.py")
+system.import_library("../HB3/chat/actions/interaction_actions.py")
+system.import_library("../HB3/chat/actions/vision_actions.py")
+
+N_TURNS = 50
+
+
+def clear_caches(model):
+    FUNCTION_PARSER.clear_cache()
+    for builder in model.action_builders:
+        builder.invalidate()
+    model._full_map = None
+
+
+def run(model, cached: bool) -> dict:
+    clear_caches(model)
+    times_ms = []
+    for _ in range(N_TURNS):
+        if not cached:
+            clear_caches(model)
+        start = perf_counter()
+        model.functions_prompt
+        model.full_map
+        times_ms.append((perf_counter() - start) * 1e3)
+    return {
+        "mean_ms": float(np.mean(times_ms)),
+        "p50_ms": float(np.percentile(times_ms, 50)),
+        "max_ms": float(np.max(times_ms)),
+    }
+
+
+class Activity:
+    def on_start(self):
+        model = llm_models.LLMModel(
+            model="benchmark",
+            system_message="",
+            history=None,
+            action_registry=ACTION_UTIL.ActionRegistry(
+                ACTION_UTIL.ActionRegistry.get_ids()
+            ),
+        )
+        print(f"TOOL_SCHEMAS,n_tools,{len(model.full_map)}")
+        for name, cached in (("uncached", False), ("cached", True)):
+            result = run(model, cached)
+            probe(name, result)
+            print(f"TOOL_SCHEMAS,{name},", result)
+        self.stop()
@@ -0,0 +1,68 @@
+"""
+Benchmark querying HB3/lib/string_vector_search.py's L2_String_Vector_Index.
+
+Indexes of 1k, 10k and 100k random embeddings of the size the embedding model makes are
+queried for their nearest 5, as it was done before the index was a matrix (a distance
+computed per embedding, then sorted) and as it is now, for each metric. No embeddings
+are requested, so the times are of the search alone.
+"""
+
+from time import perf_counter
+
+import numpy as np
+
+string_vector_search = system.import_library("../HB3/lib/string_vector_search.py")
+
+DIMENSION = 1536
+SIZES = (1_000, 10_000, 100_000)
+K = 5
+N_QUERIES = 10
+
+
+def previous_search(index: list[np.ndarray], embeds: np.ndarray, k: int) -> list:
+    """The search as it was: a list of distances, fully sorted."""
+
+    def L2(a, b):
+        return np.sqrt(np.sum(np.power(a - b, 2)))
+
+    return sorted([[L2(embeds, I), idx] for idx, I in enumerate(index)])[:k]
+
+
+def time_queries(search, queries: np.ndarray) -> dict:
+    times_ms = []
+    for query in queries:
+        start = perf_counter()
+        search(query[None, :])
+        times_ms.append((perf_counter() - start) * 1e3)
+    return {
+        "mean_ms": float(np.mean(times_ms)),
+        "p50_ms": float(np.percentile(times_ms, 50)),
+        "max_ms": float(np.max(times_ms)),
+    }
+
+
+class Activity:
+    def on_start(self):
+        rng = np.random.default_rng(0)
+        print(f"VECTOR_INDEX,dimension,{DIMENSION},k,{K},queries,{N_QUERIES}")
+        for size in SIZES:
+            embeds = rng.standard_normal((size, DIMENSION), dtype=np.float32)
+            queries = rng.standard_normal((N_QUERIES, DIMENSION), dtype=np.float32)
+            sentences = [str(i) for i in range(size)]
+
+            rows = [row[None, :] for row in embeds]
+            result = time_queries(lambda q: previous_search(rows, q, K), queries)
+            probe(f"previous_{size}", result)
+            print(f"VECTOR_INDEX,{size},previous,", result)
+
+            for metric in string_vector_search.METRICS:
+                index = string_vector_search.L2_String_Vector_Index(
+                    dimension=DIMENSION, metric=metric
+                )
+                index.add_embeddings(sentences, embeds, sentences)
+                result = time_queries(lambda q: index.search(q, K), queries)
+                probe(f"{metric}_{size}", result)
+                print(f"VECTOR_INDEX,{size},{metric},", result)
+                # The largest indexes take hundreds of megabytes each
+                del index
+        self.stop()
@@ -0,0 +1,65 @@
+"""
+Record the inputs of the perception pipeline for replay with Tests/Replay_Perception.py.
+
+Writes face_detections, the microphone direction of arrival and speech messages to a
+recording in HB3/Perception/lib/perception_recording.py's format, until the script is
+stopped. The camera pose is recorded with each frame it moves on, so the replay does not
+need the robot's reference frames.
+"""
+
+perception_recording = system.import_library(
+    "../HB3/Perception/lib/perception_recording.py"
+)
+
+SUB_NAME = "face_detections"
+SPEECH_CHANNELS = (
+    "speech_started",
+    "speech_heard",
+    "no_speech_heard",
+    "speech_recognized",
+)
+# Where to write the recording. A new file in RECORDING_DIRECTORY by default.
+RECORDING_PATH = None
+
+microphone = system.control(
+    "Microphone Array", None, acquire=["direction", "voice_activity"]
+)
+
+
+class Activity:
+    writer = None
+
+    async def on_start(self):
+        try:
+            self.writer = perception_recording.RecordingWriter(RECORDING_PATH)
+        except OSError as e:
+            log.error(f"Unable to create recording: {e}")
+            self.stop()
+            return
+        print(f"Recording perception to {self.writer.path}")
+
+        async with system.world.query_features(name=SUB_NAME) as sub:
+            async for s in sub.async_iter():
+                if s is None:
+                    continue
+                converter = system.world.converter(s.frame, system.world.ROBOT_SPACE)
+                self.writer.write_faces(
+                    s, perception_recording.camera_pose(converter, s.time_ns)
+                )
+                probe("records", self.writer.n_records)
+
+    @system.watch(microphone)
+    def on_change(self, changed):
+        if self.writer is not None:
+            self.writer.write_doa(microphone.direction, microphone.voice_activity)
+
+    def on_message(self, channel, message):
+        if self.writer is not None and channel in SPEECH_CHANNELS:
+            self.writer.write_message(channel)
+
+    def on_stop(self):
+        if self.writer is not None:
+            self.writer.close()
+            print(
+                f"Recorded {self.writer.n_records} perception records to {self.writer.path}"
+            )
@@ -0,0 +1,253 @@
+"""
+Replay a perception recording through face tracking and speaker detection, and report how
+they did.
+
+Recordings are made with Tests/Record_Perception.py. Face detections are fed to
+HB3/Perception/Process_Faces.py, with a pinhole camera fitted to the recorded camera pose
+standing in for the system.world converters, and microphone samples to
+HB3/Perception/Do_Speaker_Detection.py. Replay runs as fast as possible, or at the
+recorded pace if REAL_TIME is set.
+
+The replay drives the shared perception state, so stop the live perception scripts first.
+
+Reported once the recording has been replayed:
+    tracks            faces created, and how many of them matured
+    id_switches       with labelled recordings, how often a label moved to another track.
+                      Otherwise, how often a track started close to where another was lost
+                      shortly before.
+    cpu_ms_per_frame  CPU time spent processing each frame of face detections
+    speaker           ticks while someone was speaking, how many were attributed to a
+                      track, and the CPU time per tick
+"""
+
+import asyncio
+from time import monotonic, process_time
+from collections import defaultdict
+
+import numpy as np
+
+perception_recording = system.import_library(
+    "../HB3/Perception/lib/perception_recording.py"
+)
+doa_histogram = system.import_library("../HB3/Perception/lib/doa_histogram.py")
+perception_state = system.import_library(
+    "../HB3/Perception/perception_state.py"
+).perception_state
+process_faces = system.import_library("../HB3/Perception/Process_Faces.py")
+speaker_detection = system.import_library("../HB3/Perception/Do_Speaker_Detection.py")
+
+# The recording to replay. The most recent in RECORDING_DIRECTORY by default.
+RECORDING_PATH = None
+REAL_TIME = False
+
+SPEAKER_TICK_PERIOD_S = 0.25  # Do_Speaker_Detection ticks at up to 4 fps
+
+# Without labels, a track starting within this distance and time of where another was
+# lost counts as an ID switch
+SWITCH_DISTANCE_M = 0.5
+SWITCH_TIME_S = 1.0
+
+
+class Capture:
+    """Stands in for a world publisher, keeping the last value written."""
+
+    last = None
+
+    def write(self, value):
+        self.last = value
+
+
+class ReplayFaces(process_faces.Activity):
+    def __init__(self, camera):
+        self.camera = camera
+        self.object_counter = 0
+        self.pub_2d = Capture()
+        self.pub_3d = Capture()
+
+    def converter(self, from_frame, to_frame):
+        return self.camera.converter(from_frame, to_frame)
+
+
+class ReplaySpeakers(speaker_detection.Activity):
+    def __init__(self):
+        self._person_speaking = False
+        self._doa_histogram = doa_histogram.DOAHistogram()
+        self._speaker_votes = defaultdict(lambda: 0)
+        self._mystery_speakers = []
+
+    def _set_person_speaking(self, speaking: bool):
+        # Leave the live scheduler alone
+        self._person_speaking = speaking
+
+
+def percentiles_ms(seconds: list[float]) -> dict:
+    if not seconds:
+        return {}
+    ms = 1e3 * np.asarray(seconds)
+    return {
+        "mean": float(ms.mean()),
+        "p50": float(np.percentile(ms, 50)),
+        "p95": float(np.percentile(ms, 95)),
+        "max": float(ms.max()),
+    }
+
+
+class Replay:
+    def __init__(self):
+        self.camera = perception_recording.ReplayCamera()
+        self.faces = ReplayFaces(self.camera)
+        self.speakers = ReplaySpeakers()
+
+        self.n_frames = 0
+        self.n_detections = 0
+        self.frame_cpu_s: list[float] = []
+        self.matured: set[int] = set()
+        self.id_switches = 0
+        self.labelled = False
+        # Label -> the track it was last seen on
+        self._label_tracks: dict[str, int] = {}
+        # Face id -> (time lost, position) of recently lost tracks
+        self._lost: dict[int, tuple[float, np.ndarray]] = {}
+        self._seen: set[int] = set()
+
+        self.speaker_cpu_s: list[float] = []
+        self.speaking_ticks = 0
+        self.attributed_ticks = 0
+        self._next_tick = None
+
+    def on_record(self, record: dict):
+        t = record["t"] / 1e9
+        match record["k"]:
+            case perception_recording.FACES:
+                self.on_faces(record, t)
+            case perception_recording.DOA:
+                self.speakers._add_doa_sample(record["d"], record["v"], t)
+            case perception_recording.MESSAGE:
+                self.speakers._set_person_speaking(record["c"] == "speech_started")
+
+        if self._next_tick is None:
+            self._next_tick = t
+        while t >= self._next_tick:
+            self._next_tick += SPEAKER_TICK_PERIOD_S
+            self.on_speaker_tick(t)
+
+    def on_faces(self, record: dict, t: float):
+        if "c" in record:
+            self.camera.set_pose(record["c"])
+        if self.camera.camera is None:
+            return
+        face_detection = perception_recording.decode_faces(record)
+        before = {face.id: face for face in perception_state.world_faces}
+
+        start = process_time()
+        self.faces.process_camera_observations(face_detection)
+        self.frame_cpu_s.append(process_time() - start)
+        self.n_frames += 1
+        self.n_detections += len(face_detection.detections)
+
+        after = {face.id: face for face in perception_state.world_faces}
+        for face in after.values():
+            if face.observations_to_mature == 0:
+                self.matured.add(face.id)
+        for face_id in before.keys() - after.keys():
+            self._lost[face_id] = (t, np.array(before[face_id].position.elements))
+
+        if "l" in record:
+            self.labelled = True
+            self._count_label_switches(face_detection, record["l"])
+        elif not self.labelled:
+            self._count_fragmentations(after, t)
+
+    def _count_label_switches(self, face_detection, labels):
+        filtered = self.faces.pub_2d.last
+        if filtered is None:
+            return
+        index_of_rect = {id(d.rect): i for i, d in enumerate(face_detection.detections)}
+        for tracked in filtered.detections:
+            i = index_of_rect.get(id(tracked.rect))
+            if i is None or labels[i] is None:
+                continue
+            previous = self._label_tracks.get(labels[i])
+            if previous is not None and previous != tracked.identifier:
+                self.id_switches += 1
+            self._label_tracks[labels[i]] = tracked.identifier
+
+    def _count_fragmentations(self, faces: dict, t: float):
+        self._lost = {
+            face_id: lost
+            for face_id, lost in self._lost.items()
+            if t - lost[0] <= SWITCH_TIME_S
+        }
+        for face_id in faces.keys() - self._seen:
+            position = np.array(faces[face_id].position.elements)
+            for lost_id, (_, lost_position) in list(self._lost.items()):
+                if np.linalg.norm(position - lost_position) < SWITCH_DISTANCE_M:
+                    self.id_switches += 1
+                    del self._lost[lost_id]
+                    break
+        self._seen.update(faces)
+
+    def on_speaker_tick(self, t: float):
+        start = process_time()
+        self.speakers._decay_doa_histogram(t)
+        speaker = (
+            self.speakers.get_speaker() if self.speakers._person_speaking else None
+        )
+        self.speaker_cpu_s.append(process_time() - start)
+        if self.speakers._person_speaking:
+            self.speaking_ticks += 1
+            self.attributed_ticks += speaker is not None
+
+    def report(self) -> dict:
+        return {
+            "frames": self.n_frames,
+            "detections": self.n_detections,
+            "tracks": self.faces.object_counter,
+            "matured_tracks": len(self.matured),
+            "id_switches": self.id_switches,
+            "id_switches_from": "labels" if self.labelled else "fragmentation",
+            "cpu_ms_per_frame": percentiles_ms(self.frame_cpu_s),
+            "speaker": {
+                "speaking_ticks": self.speaking_ticks,
+                "attributed_ticks": self.attributed_ticks,
+                "cpu_ms_per_tick": percentiles_ms(self.speaker_cpu_s),
+            },
+        }
+
+
+class Activity:
+    async def on_start(self):
+        path = RECORDING_PATH or perception_recording.latest_recording()
+        if path is None:
+            log.error("No perception recording to replay")
+            self.stop()
+            return
+
+        perception_state.world_faces = set()
+        perception_state.rebuild_face_index()
+        replay = Replay()
+        started = monotonic()
+        first_t = None
+        try:
+            for n, record in enumerate(perception_recording.read_recording(path)):
+                if first_t is None:
+                    first_t = record["t"]
+                if REAL_TIME:
+                    wait = (record["t"] - first_t) / 1e9 - (monotonic() - started)
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                elif n % 100 == 0:
+                    # Let dropped faces clean up
+                    await asyncio.sleep(0)
+                replay.on_record(record)
+        except (OSError, ValueError) as e:
+            log.error(f"Unable to read recording {path}: {e}")
+
+        result = replay.report()
+        result["wall_time_s"] = monotonic() - started
+        probe("replay", result)
+        print(f"PERCEPTION_REPLAY,{path},", result)
+
+        perception_state.world_faces = set()
+        perception_state.rebuild_face_index()
+        self.stop()
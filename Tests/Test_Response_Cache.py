@@ -0,0 +1,51 @@
+"""
+Check HB3/chat/lib/response_cache.py replies to speech it has heard before.
+
+A reply to speech added to an interaction history is cached, and the same speech, a
+rephrasing of it, a different question and the negated question are looked up again.
+"""
+
+from types import SimpleNamespace
+
+INTERACTION_HISTORY = system.import_library(
+    "../HB3/chat/knowledge/interaction_history.py"
+)
+RESPONSE_CACHE = system.import_library("../HB3/chat/lib/response_cache.py")
+
+REPLY = [{"content": "My name is Ameca.", "lang_code": "eng"}]
+
+LOOKUPS = (
+    ("what's your name", True),
+    ("What is your name?", True),
+    ("how old are you", False),
+    ("is your name not Ameca", False),
+)
+
+
+def key_for(speech: str):
+    history = INTERACTION_HISTORY.InteractionHistory()
+    history.add_to_memory(
+        INTERACTION_HISTORY.SpeechRecognisedEvent(speech), skip_emit=True
+    )
+    model = SimpleNamespace(
+        model="test",
+        system_messages=[{"role": "system", "content": "persona"}],
+        interaction_history=history,
+    )
+    return RESPONSE_CACHE.CACHE.key(model)
+
+
+class Activity:
+    def on_start(self):
+        cache = RESPONSE_CACHE.ResponseCache(16, 60, 0.92)
+        key = key_for("what's your name")
+        if key is None:
+            log.error("FAIL: no cache key for a single utterance")
+            self.stop()
+            return
+        cache.put(key, REPLY, 1.0)
+        for speech, expect_hit in LOOKUPS:
+            hit = cache.get(key_for(speech)) == REPLY
+            result = "PASS" if hit == expect_hit else "FAIL"
+            print(f"RESPONSE_CACHE,{result},{speech!r},hit,{hit}")
+        self.stop()